@@ -4,10 +4,15 @@ ABM & Asset Intelligence Layer - Backend API Testing Suite
 Tests all endpoints and verification pipeline functionality
 """
 
+import argparse
+import asyncio
 import requests
 import json
+import re
 import time
 import sys
+import uuid
+from collections import defaultdict
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 
@@ -331,12 +336,9 @@ class ABMAPITester:
                 data if not expected_success else None
             )
 
-    def test_consensus_rules(self):
-        """Test consensus scoring rules with different scenarios"""
-        print("\n🔍 Testing Consensus Rules...")
-        
-        # Create submissions with different characteristics to test consensus
-        test_scenarios = [
+    def consensus_scenarios(self) -> List[Dict[str, Any]]:
+        """Submissions with different characteristics to test consensus"""
+        return [
             {
                 "name": "High Value Asset",
                 "modifications": {
@@ -370,8 +372,12 @@ class ABMAPITester:
                 }
             }
         ]
+
+    def test_consensus_rules(self):
+        """Test consensus scoring rules with different scenarios"""
+        print("\n🔍 Testing Consensus Rules...")
         
-        for scenario in test_scenarios:
+        for scenario in self.consensus_scenarios():
             # Create modified submission
             test_submission = {**self.sample_submission}
             test_submission.update(scenario["modifications"])
@@ -574,13 +580,191 @@ class ABMAPITester:
         
         return len(self.failed_tests) == 0
 
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class AsyncABMAPITester(ABMAPITester):
+    """
+    Runs the verification pipeline (create -> verify -> progress -> oracle/abm/
+    fraud/consensus/full results) for many independent scenarios concurrently
+    over one pooled httpx.AsyncClient, recording per-endpoint latency alongside
+    pass/fail. With enough scenarios this doubles as a smoke load test.
+    """
+
+    RESULT_ENDPOINTS = ('oracle', 'abm', 'fraud', 'consensus', 'full')
+
+    def __init__(self, base_url: str = "http://localhost:3000", concurrency: int = 8,
+                 timeout: float = 30.0):
+        super().__init__(base_url)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.client = None
+        self.duration = 0.0
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def endpoint_name(method: str, endpoint: str) -> str:
+        """Group latencies by route, not by submission id"""
+        return f"{method} " + re.sub(r'^/abm/submissions/[^/]+', '/abm/submissions/{id}', endpoint)
+
+    async def make_request_async(self, method: str, endpoint: str, data: Dict = None) -> tuple[bool, Dict, int]:
+        """Async counterpart of make_request; also records the request latency"""
+        name = self.endpoint_name(method, endpoint)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, endpoint, json=data)
+        except Exception as e:
+            self.latencies[name].append(time.perf_counter() - started)
+            self.errors[name] += 1
+            return False, {"error": str(e)}, 0
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            self.errors[name] += 1
+
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {"raw_response": response.text}
+        return response.status_code < 400, response_data, response.status_code
+
+    def scenario_submissions(self, count: int) -> List[tuple[str, Dict[str, Any]]]:
+        """count (name, submission) pairs cycling through the baseline and consensus scenarios"""
+        variants = [{"name": "Baseline", "modifications": {}}] + self.consensus_scenarios()
+        scenarios = []
+        for i in range(count):
+            variant = variants[i % len(variants)]
+            submission = {**self.sample_submission, **variant["modifications"]}
+            submission["submitterId"] = f"load_{i}_{uuid.uuid4().hex[:12]}"
+            scenarios.append((f"{variant['name']} #{i + 1}", submission))
+        return scenarios
+
+    async def run_scenario(self, name: str, submission: Dict[str, Any]):
+        """One full pipeline; its steps run in order, other scenarios run alongside"""
+        success, data, status = await self.make_request_async('POST', '/abm/submissions', submission)
+        submission_id = data.get('data', {}).get('submissionId') if success else None
+        self.log_test(f"[{name}] Create Submission", status == 201 and bool(submission_id),
+                      f"Status: {status}, ID: {submission_id}", data if not success else None)
+        if not submission_id:
+            return
+        self.submission_ids.append(submission_id)
+
+        success, data, status = await self.make_request_async('POST', f'/abm/submissions/{submission_id}/verify')
+        self.log_test(f"[{name}] Run Verification Pipeline", success and status == 200,
+                      f"Status: {status}, Eligible: {data.get('data', {}).get('eligible', 'N/A')}",
+                      data if not success else None)
+
+        success, data, status = await self.make_request_async('GET', f'/abm/submissions/{submission_id}/progress')
+        self.log_test(f"[{name}] Get Verification Progress", success and status == 200,
+                      f"Status: {status}, Stage: {data.get('data', {}).get('currentStage', 'Unknown')}",
+                      data if not success else None)
+
+        # Result endpoints are independent of each other
+        results = await asyncio.gather(*(
+            self.make_request_async('GET', f'/abm/submissions/{submission_id}/{endpoint}')
+            for endpoint in self.RESULT_ENDPOINTS
+        ))
+        for endpoint, (success, data, status) in zip(self.RESULT_ENDPOINTS, results):
+            self.log_test(f"[{name}] Get {endpoint.capitalize()} Results", success and status == 200,
+                          f"Status: {status}", data if not success else None)
+
+    async def run_scenarios(self, count: int) -> bool:
+        import httpx  # only needed for the concurrent mode
+
+        print(f"🚀 Running {count} verification pipelines, {self.concurrency} at a time")
+        print("=" * 60)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Each pipeline fetches its results in parallel; size the pool so requests never queue client-side
+        connections = self.concurrency * len(self.RESULT_ENDPOINTS)
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+        async def limited(name: str, submission: Dict[str, Any]):
+            async with semaphore:
+                await self.run_scenario(name, submission)
+
+        start_time = time.time()
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout) as client:
+            self.client = client
+            await asyncio.gather(*(limited(name, submission) for name, submission in self.scenario_submissions(count)))
+        self.client = None
+        duration = self.duration = time.time() - start_time
+
+        self.print_latency_report(duration)
+        print(f"Total Tests: {self.tests_run}")
+        print(f"Passed: {self.tests_passed}")
+        print(f"Failed: {len(self.failed_tests)}")
+        print(f"Duration: {duration:.2f} seconds")
+        if self.failed_tests:
+            print(f"\n❌ FAILED TESTS ({len(self.failed_tests)}):")
+            for i, failure in enumerate(self.failed_tests, 1):
+                print(f"{i}. {failure['test']}: {failure['details']}")
+        return len(self.failed_tests) == 0
+
+    def latency_report(self, duration: float) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint request count, server/transport errors and latency percentiles (ms)"""
+        report = {}
+        for name in sorted(self.latencies):
+            values = sorted(v * 1000 for v in self.latencies[name])
+            report[name] = {
+                'requests': len(values),
+                'errors': self.errors[name],
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+                'max_ms': values[-1],
+                'rps': len(values) / duration if duration > 0 else 0.0,
+            }
+        return report
+
+    def print_latency_report(self, duration: float):
+        print("\n" + "=" * 60)
+        print("⏱️  ENDPOINT LATENCY")
+        print("=" * 60)
+        print(f"{'endpoint':<44}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for name, stats in self.latency_report(duration).items():
+            print(f"{name:<44}{stats['requests']:>6}{stats['errors']:>5}{stats['p50_ms']:>9.1f}"
+                  f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\n{total} requests in {duration:.2f}s ({total / duration if duration > 0 else 0:.1f} req/s)\n")
+
+
 def main():
     """Main test execution"""
+    parser = argparse.ArgumentParser(description="ABM & Asset Intelligence Layer - Backend API Test Suite")
+    parser.add_argument('--base-url', default="http://localhost:3000")
+    parser.add_argument('--concurrent', action='store_true',
+                        help="run independent verification pipelines concurrently (httpx) instead of the sequential suite")
+    parser.add_argument('--scenarios', type=int, default=20, help="pipelines to run in --concurrent mode")
+    parser.add_argument('--concurrency', type=int, default=8, help="pipelines in flight at once")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument('--report', help="write the per-endpoint latency report as JSON to this path")
+    args = parser.parse_args()
+
     print("ABM & Asset Intelligence Layer - Backend API Test Suite")
     print("Testing comprehensive asset verification pipeline...")
     
+    if args.concurrent:
+        tester = AsyncABMAPITester(args.base_url, concurrency=args.concurrency, timeout=args.timeout)
+        success = asyncio.run(tester.run_scenarios(args.scenarios))
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({
+                    'scenarios': args.scenarios,
+                    'concurrency': args.concurrency,
+                    'passed': tester.tests_passed,
+                    'failed': len(tester.failed_tests),
+                    'endpoints': tester.latency_report(tester.duration),
+                }, f, indent=2)
+        sys.exit(0 if success else 1)
+
     # Initialize tester
-    tester = ABMAPITester()
+    tester = ABMAPITester(args.base_url)
     
     # Run tests
     success = tester.run_all_tests()
@@ -0,0 +1,129 @@
+"""
+Revalue a whole submissions export offline, without going through HTTP.
+
+    python batch_revalue.py --input submissions.parquet --output revaluation.parquet --workers 8
+
+Chunks of the export are fanned out to a process pool running the market and
+fraud engines (the same tasks.py entry points the API uses, configured from the
+same ABM_* settings). Results are written to Parquet in input order as chunks
+complete, and at most 2 x workers chunks are in flight, so memory stays flat
+however large the export is.
+
+With --snapshot-dir every chunk also writes a replay snapshot of both engines'
+runs (see engines.snapshot and replay_snapshots.py).
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+import tasks
+from config import settings
+from engines.duplicate_index import SubmissionIndex, submission_id
+from submissions import analysis_inputs, read_submissions
+
+
+def output_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.string()),
+        ('nav_min', pa.float64()),
+        ('nav_max', pa.float64()),
+        ('nav_mean', pa.float64()),
+        ('downside_nav', pa.float64()),
+        ('stress_cvar', pa.float64()),
+        ('stress_tail_loss', pa.float64()),
+        ('tail_risk', pa.string()),
+        ('yield_min', pa.float64()),
+        ('yield_max', pa.float64()),
+        ('trailing_noi', pa.float64()),
+        ('noi_volatility', pa.float64()),
+        ('income_spike', pa.float64()),
+        ('fraud_likelihood', pa.float64()),
+        ('anomaly_count', pa.int32()),
+        ('anomaly_types', pa.list_(pa.string())),
+        ('anomaly_model_score', pa.float64()),
+        ('duplicate_ids', pa.list_(pa.string())),
+        ('passed', pa.bool_()),
+    ])
+
+
+def revalue_chunk(submissions: List[Dict[str, Any]], duplicates: Optional[List[List[Dict[str, Any]]]],
+                  snapshot_dir: Optional[str] = None) -> Dict[str, list]:
+    """
+    Pool worker: run both engines over one chunk and return it column-wise
+    (cheaper to pickle back than a list of nested result dicts)
+    """
+    inputs = [analysis_inputs(s) for s in submissions]
+    asset_data, locations, financials, oracle_data = (list(column) for column in zip(*inputs))
+    market, _ = tasks.analyze_market_batch(asset_data, locations, financials, oracle_data, snapshot_dir)
+    fraud, _, _ = tasks.detect_fraud_batch(asset_data, financials, oracle_data, duplicates, snapshot_dir)
+    return {
+        'id': [submission_id(s) for s in submissions],
+        'nav_min': [m['expected_nav']['min'] for m in market],
+        'nav_max': [m['expected_nav']['max'] for m in market],
+        'nav_mean': [m['expected_nav']['mean'] for m in market],
+        'downside_nav': [m['downside_nav'] for m in market],
+        'stress_cvar': [m['stress']['cvar'] for m in market],
+        'stress_tail_loss': [m['stress']['tail_loss'] for m in market],
+        'tail_risk': [m['tail_risk'] for m in market],
+        'yield_min': [m['yield_band']['min'] for m in market],
+        'yield_max': [m['yield_band']['max'] for m in market],
+        'trailing_noi': [m['cash_flow']['trailing_noi'] for m in market],
+        'noi_volatility': [m['cash_flow']['noi_volatility'] for m in market],
+        'income_spike': [m['cash_flow']['income_spike'] for m in market],
+        'fraud_likelihood': [f['fraud_likelihood'] for f in fraud],
+        'anomaly_count': [f['anomaly_score'] for f in fraud],
+        'anomaly_types': [[a['type'] for a in f['anomalies']] for f in fraud],
+        'anomaly_model_score': [f['anomaly_model_score'] for f in fraud],
+        'duplicate_ids': [[d['submission_id'] for d in f['duplicates']] for f in fraud],
+        'passed': [f['passed'] for f in fraud],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Revalue a submissions export with the ABM engines')
+    parser.add_argument('--input', required=True, help='CSV/Parquet export with a submissions `data` column')
+    parser.add_argument('--output', required=True, help='Parquet file to write')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=5000, help='submissions per worker task')
+    parser.add_argument('--no-duplicates', action='store_true',
+                        help='skip the cross-submission duplicate index (it runs in the parent process)')
+    parser.add_argument('--snapshot-dir', help='also write replay snapshots of every chunk here')
+    args = parser.parse_args()
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = output_schema()
+    index = None if args.no_duplicates else SubmissionIndex(radius_m=settings.duplicate_radius_m)
+    pending: Deque[Future] = deque()
+    rows = 0
+    started = time.perf_counter()
+
+    def write_next(writer: 'pq.ParquetWriter'):
+        nonlocal rows
+        columns = pending.popleft().result()
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        rows += len(columns['id'])
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=tasks.warmup) as pool, \
+            pq.ParquetWriter(args.output, schema, compression='zstd') as writer:
+        for chunk in read_submissions(args.input, chunk_size=args.chunk_size):
+            duplicates = [index.check_and_add(s, s.get('location')) for s in chunk] if index is not None else None
+            pending.append(pool.submit(revalue_chunk, chunk, duplicates, args.snapshot_dir))
+            # Bounded in-flight work keeps memory flat; writing the oldest chunk keeps input order
+            if len(pending) >= 2 * args.workers:
+                write_next(writer)
+        while pending:
+            write_next(writer)
+
+    elapsed = time.perf_counter() - started
+    print(f'Revalued {rows} submissions in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f}/s) -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Run the ABM engine benchmarks.
+
+    python -m benchmarks engines --output bench/engines.json
+    python -m benchmarks load --requests 500 --concurrency 32
+    python -m benchmarks startup --runs 10 --import-budget 1.0
+    python -m benchmarks comparables --comparables-rows 1000000
+    python -m benchmarks all --save-baseline
+
+Results are written as JSON. When a baseline file exists the run is compared
+against it and the command exits non-zero on a regression (p95 latency or
+throughput worse than --tolerance), or when importing main takes longer than
+--import-budget seconds at p95.
+"""
+import argparse
+import os
+import shutil
+import sys
+
+from benchmarks import common
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='ABM engine benchmarks')
+    parser.add_argument('suite', choices=('engines', 'load', 'startup', 'comparables', 'all'))
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file to write')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing (0.2 = 20%%)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-sizes', default='1,10,100,1000', help='engine batch sizes, comma-separated')
+    parser.add_argument('--min-assets', type=int, default=2000, help='assets per engine batch size')
+    parser.add_argument('--requests', type=int, default=500, help='HTTP requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=50, help='assets per batch-endpoint request')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters for the startup suite')
+    parser.add_argument('--import-budget', type=float, default=1.0, help='seconds allowed to import main (p95)')
+    parser.add_argument('--comparables-rows', type=int, default=1_000_000, help='synthetic geo comparables dataset size')
+    args = parser.parse_args()
+
+    results = {}
+    if args.suite in ('engines', 'all'):
+        from benchmarks import engines
+
+        sizes = [int(s) for s in args.batch_sizes.split(',') if s]
+        results.update(engines.run(sizes, min_assets=args.min_assets, seed=args.seed))
+    if args.suite in ('load', 'all'):
+        from benchmarks import load
+
+        results.update(load.run(requests=args.requests, concurrency=args.concurrency,
+                                batch_size=args.batch_size, seed=args.seed))
+    if args.suite in ('startup', 'all'):
+        from benchmarks import startup
+
+        results.update(startup.run(runs=args.runs, import_budget=args.import_budget))
+    if args.suite in ('comparables', 'all'):
+        from benchmarks import comparables
+
+        results.update(comparables.run(rows=args.comparables_rows, seed=args.seed))
+
+    common.write_results(args.output, args.suite, results)
+    print(f'Wrote {len(results)} results to {args.output}')
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f'Saved baseline to {args.baseline}')
+        return
+    regressions = common.compare(results, args.baseline, args.tolerance) or []
+    if not results.get('startup.import', {}).get('within_budget', True):
+        regressions.append(f'startup.import: p95 over the {args.import_budget:g}s import budget')
+    if regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
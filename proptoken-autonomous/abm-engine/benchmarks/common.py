@@ -0,0 +1,131 @@
+import json
+import os
+import platform
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+
+CITIES = (
+    ('Bengaluru', '560001', 12.9716, 77.5946),
+    ('Mumbai', '400001', 19.0760, 72.8777),
+    ('Delhi', '110001', 28.6139, 77.2090),
+    ('Pune', '411001', 18.5204, 73.8567),
+    ('New York', '10001', 40.7128, -74.0060),
+)
+TYPES = ('commercial', 'residential', 'industrial', 'mixed-use')
+CONDITIONS = ('excellent', 'good', 'fair', 'poor')
+HISTORY_MONTHS = 24
+
+
+def make_assets(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Deterministic synthetic AnalysisRequest payloads with HISTORY_MONTHS of
+    cash-flow history and a satellite existence oracle result each. Every asset is distinct, so the result cache does
+    not short-circuit the engines.
+    """
+    rng = np.random.default_rng(seed)
+    assets = []
+    for i in range(n):
+        city, postal, lat, lng = CITIES[i % len(CITIES)]
+        size = float(rng.integers(500, 80000))
+        expected_yield = float(np.round(rng.uniform(3, 24), 2))
+        monthly_rent = float(np.round(size * rng.uniform(2, 12), 2))
+        incomes = np.round(monthly_rent * rng.normal(1.0, 0.05, HISTORY_MONTHS), 2).tolist()
+        assets.append({
+            'asset_data': {
+                'id': f'bench-{seed}-{i}',
+                'specifications': {'size': size, 'type': TYPES[i % len(TYPES)], 'age': int(rng.integers(0, 40))},
+                'claimedValue': float(np.round(size * rng.uniform(3000, 9000), 2)),
+                'registryIds': [f'BENCH/{seed}/{i}'],
+                'spv': {'spvRegistrationNumber': f'U{seed:03d}{i:08d}', 'directors': [f'Director {i}']},
+            },
+            'location': {
+                'city': city,
+                'postalCode': postal,
+                'coordinates': {'lat': lat + float(rng.normal(0, 0.05)), 'lng': lng + float(rng.normal(0, 0.05))},
+            },
+            'financials': {
+                'expectedYield': expected_yield,
+                'currentRent': monthly_rent,
+                'cashFlow': monthly_rent * 0.8,
+                'occupancyRate': float(np.round(rng.uniform(60, 100), 1)),
+                'annualExpenses': float(np.round(monthly_rent * 12 * rng.uniform(0.1, 0.3), 2)),
+                'historicalCashFlow': [
+                    {'month': f'{2023 + m // 12}-{m % 12 + 1:02d}', 'income': income,
+                     'expenses': round(income * 0.2, 2)}
+                    for m, income in enumerate(incomes)
+                ],
+            },
+            'oracle_data': {
+                'existence': {
+                    'score': 0.9,
+                    'satellite': {'estimated_size': float(np.round(size * rng.uniform(0.7, 1.3))),
+                                  'condition': CONDITIONS[i % len(CONDITIONS)]},
+                },
+            },
+        })
+    return assets
+
+
+def summarize(latencies_s: Sequence[float], elapsed_s: float, items: int, unit: str) -> Dict[str, Any]:
+    """
+    Latency percentiles in milliseconds plus throughput in `unit` per second
+    """
+    ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        'samples': int(len(ms)),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(ms.mean()), 4) if len(ms) else 0.0,
+        'throughput': round(items / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        'unit': f'{unit}/s',
+    }
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_results(path: str, suite: str, results: Dict[str, Dict[str, Any]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'suite': suite, 'environment': environment(), 'results': results}, f, indent=2)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str,
+            tolerance: float = 0.2) -> Optional[List[str]]:
+    """
+    Print each benchmark against the baseline file and return the regressions:
+    p95 latency more than `tolerance` slower, or throughput more than `tolerance`
+    lower. Returns None when there is no baseline to compare with.
+    """
+    if not os.path.exists(baseline_path):
+        print(f'No baseline at {baseline_path}; run with --save-baseline to create one')
+        return None
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    print(f'\n{"benchmark":<32}{"p95 ms":>12}{"base":>10}{"throughput":>14}{"base":>12}')
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f'{name:<32}{current["p95_ms"]:>12.3f}{"-":>10}{current["throughput"]:>14.1f}{"-":>12}')
+            continue
+        flags = []
+        if base['p95_ms'] > 0 and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            flags.append(f'p95 {current["p95_ms"] / base["p95_ms"]:.2f}x')
+        if base['throughput'] > 0 and current['throughput'] < base['throughput'] * (1 - tolerance):
+            flags.append(f'throughput {current["throughput"] / base["throughput"]:.2f}x')
+        print(f'{name:<32}{current["p95_ms"]:>12.3f}{base["p95_ms"]:>10.3f}'
+              f'{current["throughput"]:>14.1f}{base["throughput"]:>12.1f}  {", ".join(flags)}')
+        regressions.extend(f'{name}: {flag}' for flag in flags)
+    return regressions
@@ -0,0 +1,62 @@
+"""
+Geo comparables benchmark: a synthetic dataset of `rows` comparables around the
+benchmark cities is written to a temporary CSV and loaded through
+DatasetComparablesProvider, so the timings cover the real load path.
+
+  comparables.build        - reading the file and building the tables and geo index
+  comparables.nearby_<n>   - one nearby() call for n asset coordinates
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from typing import Any, Dict, Sequence
+
+from benchmarks.common import CITIES, summarize
+from engines.comparables import DatasetComparablesProvider
+
+SPREAD_DEG = 0.1  # std of comparable coordinates around each city centre
+
+
+def write_dataset(path: str, rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    city = rng.integers(0, len(CITIES), rows)
+    centres = np.array([(lat, lng) for _, _, lat, lng in CITIES])[city]
+    lats = centres[:, 0] + rng.normal(0, SPREAD_DEG, rows)
+    lngs = centres[:, 1] + rng.normal(0, SPREAD_DEG, rows)
+    prices = rng.lognormal(8.5, 0.3, rows)
+    with open(path, 'w') as f:
+        f.write('city,postal_code,price_per_sqft,lat,lng\n')
+        for i in range(rows):
+            name, postal, _, _ = CITIES[city[i]]
+            f.write(f'{name},{postal},{prices[i]:.2f},{lats[i]:.6f},{lngs[i]:.6f}\n')
+
+
+def run(rows: int = 1_000_000, batch_sizes: Sequence[int] = (1, 100, 1000), iterations: int = 20,
+        seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'comparables.csv')
+        write_dataset(path, rows, seed)
+        started = time.perf_counter()
+        provider = DatasetComparablesProvider(path, refresh_interval=0)
+        build = time.perf_counter() - started
+    results['comparables.build'] = summarize([build], build, rows, 'rows')
+    print(f'comparables.build: {rows} rows in {build:.2f}s')
+
+    rng = np.random.default_rng(seed + 1)
+    for size in batch_sizes:
+        city = rng.integers(0, len(CITIES), size)
+        centres = np.array([(lat, lng) for _, _, lat, lng in CITIES])[city]
+        lats = centres[:, 0] + rng.normal(0, SPREAD_DEG, size)
+        lngs = centres[:, 1] + rng.normal(0, SPREAD_DEG, size)
+        provider.nearby(lats, lngs)
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            provider.nearby(lats, lngs)
+            latencies.append(time.perf_counter() - started)
+        summary = summarize(latencies, sum(latencies), size * iterations, 'assets')
+        results[f'comparables.nearby_{size}'] = summary
+        print(f'comparables.nearby_{size}: p50 {summary["p50_ms"]:.2f} ms over {rows} rows')
+    return results
@@ -0,0 +1,60 @@
+"""
+Engine microbenchmarks: MarketIntelligenceEngine and FraudDetectionEngine called
+directly (no HTTP, no executor), across batch sizes. Batch size 1 goes through the
+single-asset analyze()/detect() entry points; larger sizes through *_batch().
+"""
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Sequence
+
+import tasks
+from benchmarks.common import make_assets, summarize
+
+DEFAULT_BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def _columns(assets: List[Dict[str, Any]], fields: Sequence[str]) -> List[List[Dict[str, Any]]]:
+    return [[a[f] for a in assets] for f in fields]
+
+
+def _time_calls(call: Callable[[], Any], iterations: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        call()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES, min_assets: int = 2000,
+        warmup: int = 3, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Each batch size runs enough iterations to push at least `min_assets` assets
+    through the engine. Latency is per call (per batch); throughput is assets/s.
+    """
+    market, fraud = tasks.market_engine(), tasks.fraud_engine()
+    results = {}
+    for size in batch_sizes:
+        assets = make_assets(size, seed=seed)
+        market_args = _columns(assets, ('asset_data', 'location', 'financials', 'oracle_data'))
+        fraud_args = _columns(assets, ('asset_data', 'financials', 'oracle_data'))
+        iterations = max(5, -(-min_assets // size))
+
+        if size == 1:
+            market_call = lambda: market.analyze(*(column[0] for column in market_args))
+            fraud_call = lambda: fraud.detect(*(column[0] for column in fraud_args))
+        else:
+            market_call = lambda: market.analyze_batch(*market_args)
+            fraud_call = lambda: fraud.detect_batch(*fraud_args)
+
+        for name, call in (('market', market_call), ('fraud', fraud_call)):
+            started = time.perf_counter()
+            latencies = _time_calls(call, iterations, warmup)
+            elapsed = time.perf_counter() - started
+            # Throughput from the median call, so a single GC pause does not swing the comparison
+            typical = float(np.median(latencies)) * iterations
+            results[f'engine.{name}.batch_{size}'] = summarize(latencies, typical, size * iterations, 'assets')
+            print(f'engine.{name}.batch_{size}: {iterations} calls in {elapsed:.2f}s')
+    return results
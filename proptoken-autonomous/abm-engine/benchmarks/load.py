@@ -0,0 +1,61 @@
+"""
+In-process load generator: drives main.app through httpx's ASGI transport, so the
+whole request path (validation, cache, executor, engines, serialization) is
+measured without a network or a running server.
+"""
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+import httpx
+
+import main
+from benchmarks.common import make_assets, summarize
+
+DEFAULT_ENDPOINTS = ('/analyze/market', '/analyze/fraud', '/analyze/market/batch', '/analyze/fraud/batch')
+
+
+async def _drive(client: httpx.AsyncClient, endpoint: str, payloads: List[Dict[str, Any]],
+                 concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def one(payload: Dict[str, Any]):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(endpoint, json=payload)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    return {'latencies': latencies, 'elapsed': time.perf_counter() - started, 'statuses': statuses}
+
+
+async def run_async(endpoints: Sequence[str] = DEFAULT_ENDPOINTS, requests: int = 500,
+                    concurrency: int = 32, batch_size: int = 50, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport does not send lifespan events; run the app's lifespan ourselves
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://abm-engine', timeout=60) as client:
+            for n, endpoint in enumerate(endpoints):
+                # Distinct payloads per endpoint so the result cache never answers
+                assets = make_assets(requests * (batch_size if endpoint.endswith('/batch') else 1), seed=seed + n + 1)
+                if endpoint.endswith('/batch'):
+                    payloads = [{'assets': assets[i:i + batch_size]} for i in range(0, len(assets), batch_size)]
+                else:
+                    payloads = assets
+                run = await _drive(client, endpoint, payloads, concurrency)
+                summary = summarize(run['latencies'], run['elapsed'], len(payloads), 'requests')
+                summary['statuses'] = {str(code): count for code, count in sorted(run['statuses'].items())}
+                results[f'http.{endpoint.strip("/").replace("/", ".")}'] = summary
+                print(f'{endpoint}: {len(payloads)} requests at concurrency {concurrency} '
+                      f'in {run["elapsed"]:.2f}s, statuses {summary["statuses"]}')
+    return results
+
+
+def run(**kwargs: Any) -> Dict[str, Dict[str, Any]]:
+    return asyncio.run(run_async(**kwargs))
@@ -0,0 +1,55 @@
+"""
+Cold-start benchmark: each run is a fresh interpreter that imports main, runs
+the app's lifespan and polls readiness, so nothing is shared with a warm
+process. Two timings per run, both from the start of `import main`:
+
+  startup.import - main imported, i.e. the replica can answer /health/live
+  startup.ready  - engines warmed, i.e. /health/ready returns 200
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.common import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = '''
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+
+async def ready():
+    async with main.lifespan(main.app):
+        while not main.engine_warmup.done():
+            await asyncio.sleep(0.002)
+        main.engine_warmup.result()
+        return time.perf_counter() - started
+
+print(json.dumps({'import': imported, 'ready': asyncio.run(ready())}))
+'''
+
+
+def probe() -> Dict[str, float]:
+    output = subprocess.run([sys.executable, '-c', _PROBE], cwd=ROOT, check=True, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': ROOT}).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs: int = 5, import_budget: float = 1.0) -> Dict[str, Dict[str, Any]]:
+    samples: Dict[str, List[float]] = {'import': [], 'ready': []}
+    for _ in range(runs):
+        for name, seconds in probe().items():
+            samples[name].append(seconds)
+
+    results = {}
+    for name, seconds in samples.items():
+        summary = summarize(seconds, sum(seconds), len(seconds), 'starts')
+        results[f'startup.{name}'] = summary
+        print(f'startup.{name}: p50 {summary["p50_ms"]:.0f} ms, p95 {summary["p95_ms"]:.0f} ms over {runs} runs')
+    results['startup.import']['budget_ms'] = import_budget * 1000
+    results['startup.import']['within_budget'] = results['startup.import']['p95_ms'] <= import_budget * 1000
+    return results
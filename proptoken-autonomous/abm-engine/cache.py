@@ -0,0 +1,197 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from serialization import dumps, loads
+
+
+def request_key(namespace: str, payload: Any, salt: str = '') -> str:
+    """
+    Content address for a request: sha256 over canonical JSON (sorted keys, no
+    whitespace), so dict ordering and formatting never cause spurious misses
+    """
+    digest = hashlib.sha256(f'{namespace}|{salt}|'.encode())
+    digest.update(dumps(payload, sort_keys=True))
+    return f'{namespace}:{digest.hexdigest()}'
+
+
+def _namespace(key: str) -> str:
+    return key.split(':', 1)[0]
+
+
+class SQLiteCacheTier:
+    """
+    Shared on-disk tier so several uvicorn workers on one host reuse each
+    other's results. Uses WAL mode; each process opens its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT value FROM results WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO results (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)',
+                (key, _namespace(key), value, expires_at)
+            )
+
+    def invalidate(self, namespace: Optional[str] = None):
+        with self._lock:
+            conn = self._connection()
+            if namespace is None:
+                conn.execute('DELETE FROM results')
+            else:
+                conn.execute('DELETE FROM results WHERE namespace = ?', (namespace,))
+
+    def prune(self):
+        with self._lock:
+            self._connection().execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+
+
+class ResultCache:
+    """
+    In-process LRU cache with TTL, bounded by entry count and by the size of the
+    stored results, with an optional shared disk tier.
+
+    Entries are kept as their serialized JSON, and every hit decodes a fresh
+    copy, so a caller mutating a result cannot change what later hits see.
+    With a disk tier, get/set do SQLite I/O: async callers should run them
+    (or get_many/set_many) in a thread, see blocking().
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 300, disk: Optional[SQLiteCacheTier] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self._entries: 'OrderedDict[str, Tuple[bytes, float]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._disk_writes = 0
+
+    def blocking(self) -> bool:
+        """
+        Whether get/set may block on disk I/O
+        """
+        return self.disk is not None
+
+    def _drop(self, key: str):
+        encoded, _ = self._entries.pop(key)
+        self._bytes -= len(encoded)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return loads(entry[0])
+                self._drop(key)
+                self.expirations += 1
+
+        if self.disk is not None:
+            stored = self.disk.get(key)
+            if stored is not None:
+                encoded = stored.encode()
+                self._store(key, encoded, now + self.ttl_seconds)
+                with self._lock:
+                    self.disk_hits += 1
+                return loads(encoded)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: Any):
+        encoded = dumps(value)
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, encoded, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, encoded.decode(), expires_at)
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes % 1000 == 0
+            if prune:
+                self.disk.prune()
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]):
+        for key, value in items:
+            self.set(key, value)
+
+    def _store(self, key: str, encoded: bytes, expires_at: float):
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (encoded, expires_at)
+            self._bytes += len(encoded)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """
+        Drop every entry, or only those of one namespace (e.g. 'market')
+        """
+        with self._lock:
+            keys = [k for k in self._entries if namespace is None or _namespace(k) == namespace]
+            for key in keys:
+                self._drop(key)
+        if self.disk is not None:
+            self.disk.invalidate(namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_tier': self.disk.path if self.disk is not None else None,
+            }
@@ -0,0 +1,127 @@
+import os
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.strip().lower() in ('1', 'true', 'yes', 'on') if value else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Runtime configuration for the ABM engine, read from ABM_* environment variables
+    """
+    executor_mode: str = 'thread'        # inline | thread | process
+    executor_workers: int = os.cpu_count() or 1
+    executor_max_queue: int = 64         # requests allowed to wait beyond the busy workers
+    retry_after_seconds: int = 1
+    comparables_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'comparables.csv')
+    comparables_seed: int = 0
+    comparables_sample_size: int = 0     # 0 = use every comparable row
+    comparables_refresh_seconds: int = 30
+    comparables_k: int = 20              # nearest comparables used around the asset's coordinates
+    comparables_radius_m: int = 2000
+    comparables_min_nearby: int = 3      # fewer within the radius -> postal code / city group instead
+    comparables_cell_m: int = 250        # geo index grid cell size
+    valuation_adjustments_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                                                   'valuation_adjustments.json')
+    stress_paths: int = 2000
+    stress_time_budget_ms: int = 20
+    stress_seed: int = 0
+    fraud_rules_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'fraud_rules.json')
+    fraud_rules_refresh_seconds: int = 5
+    anomaly_model_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'isolation_forest')
+    submissions_export_path: str = ''    # CSV/Parquet export seeding the duplicate index; empty = start empty
+    duplicate_radius_m: int = 100
+    cache_enabled: bool = True
+    cache_max_entries: int = 10000
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_ttl_seconds: int = 300
+    cache_disk_path: str = ''            # SQLite file shared by workers; empty = memory only
+    stream_chunk_size: int = 256         # assets per engine call on the NDJSON stream endpoint
+    stream_max_line_bytes: int = 1024 * 1024
+    stage_memo_entries: int = 50000      # (stage, asset) outputs kept for /reanalyze, per engine process
+    portfolio_max_holdings: int = 20000
+    sensitivity_max_cells: int = 100000  # grid points per sensitivity request
+    results_store_url: str = ''          # postgresql://... or a SQLite path; empty = results are not persisted
+    results_store_pool_size: int = 4
+    results_store_batch_size: int = 500  # rows per bulk insert
+    results_store_flush_ms: int = 1000   # longest a result waits before it is written
+    results_store_cache_entries: int = 10000
+    submission_catalog_entries: int = 100000  # submissions kept by id for portfolio requests
+    snapshot_dir: str = ''  # when set, every engine batch writes a replay snapshot here (see engines.snapshot)
+    oracle_existence_url: str = ''       # provider endpoints for missing oracle_data; empty = not fetched
+    oracle_ownership_url: str = ''
+    oracle_activity_url: str = ''
+    oracle_existence_timeout_ms: int = 2000
+    oracle_ownership_timeout_ms: int = 2000
+    oracle_activity_timeout_ms: int = 2000
+    oracle_required: str = 'existence'   # comma-separated providers analysis waits for
+    oracle_max_connections: int = 100
+    oracle_pool_timeout_ms: int = 1000   # longest a fetch waits for a free connection, on top of its timeout
+    oracle_cache_seconds: int = 300      # how long a provider's answer is reused for the same submission
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        return cls(
+            executor_mode=os.getenv('ABM_EXECUTOR_MODE', cls.executor_mode).lower(),
+            executor_workers=_env_int('ABM_EXECUTOR_WORKERS', cls.executor_workers),
+            executor_max_queue=_env_int('ABM_EXECUTOR_MAX_QUEUE', cls.executor_max_queue),
+            retry_after_seconds=_env_int('ABM_RETRY_AFTER_SECONDS', cls.retry_after_seconds),
+            comparables_path=os.getenv('ABM_COMPARABLES_PATH', cls.comparables_path),
+            comparables_seed=_env_int('ABM_COMPARABLES_SEED', cls.comparables_seed),
+            comparables_sample_size=_env_int('ABM_COMPARABLES_SAMPLE_SIZE', cls.comparables_sample_size),
+            comparables_refresh_seconds=_env_int('ABM_COMPARABLES_REFRESH_SECONDS', cls.comparables_refresh_seconds),
+            comparables_k=_env_int('ABM_COMPARABLES_K', cls.comparables_k),
+            comparables_radius_m=_env_int('ABM_COMPARABLES_RADIUS_M', cls.comparables_radius_m),
+            comparables_min_nearby=_env_int('ABM_COMPARABLES_MIN_NEARBY', cls.comparables_min_nearby),
+            comparables_cell_m=_env_int('ABM_COMPARABLES_CELL_M', cls.comparables_cell_m),
+            valuation_adjustments_path=os.getenv('ABM_VALUATION_ADJUSTMENTS_PATH', cls.valuation_adjustments_path),
+            stress_paths=_env_int('ABM_STRESS_PATHS', cls.stress_paths),
+            stress_time_budget_ms=_env_int('ABM_STRESS_TIME_BUDGET_MS', cls.stress_time_budget_ms),
+            stress_seed=_env_int('ABM_STRESS_SEED', cls.stress_seed),
+            fraud_rules_path=os.getenv('ABM_FRAUD_RULES_PATH', cls.fraud_rules_path),
+            fraud_rules_refresh_seconds=_env_int('ABM_FRAUD_RULES_REFRESH_SECONDS', cls.fraud_rules_refresh_seconds),
+            anomaly_model_path=os.getenv('ABM_ANOMALY_MODEL_PATH', cls.anomaly_model_path),
+            submissions_export_path=os.getenv('ABM_SUBMISSIONS_EXPORT_PATH', cls.submissions_export_path),
+            duplicate_radius_m=_env_int('ABM_DUPLICATE_RADIUS_M', cls.duplicate_radius_m),
+            cache_enabled=_env_bool('ABM_CACHE_ENABLED', cls.cache_enabled),
+            cache_max_entries=_env_int('ABM_CACHE_MAX_ENTRIES', cls.cache_max_entries),
+            cache_max_bytes=_env_int('ABM_CACHE_MAX_BYTES', cls.cache_max_bytes),
+            cache_ttl_seconds=_env_int('ABM_CACHE_TTL_SECONDS', cls.cache_ttl_seconds),
+            cache_disk_path=os.getenv('ABM_CACHE_DISK_PATH', cls.cache_disk_path),
+            stream_chunk_size=_env_int('ABM_STREAM_CHUNK_SIZE', cls.stream_chunk_size),
+            stream_max_line_bytes=_env_int('ABM_STREAM_MAX_LINE_BYTES', cls.stream_max_line_bytes),
+            stage_memo_entries=_env_int('ABM_STAGE_MEMO_ENTRIES', cls.stage_memo_entries),
+            portfolio_max_holdings=_env_int('ABM_PORTFOLIO_MAX_HOLDINGS', cls.portfolio_max_holdings),
+            sensitivity_max_cells=_env_int('ABM_SENSITIVITY_MAX_CELLS', cls.sensitivity_max_cells),
+            results_store_url=os.getenv('ABM_RESULTS_STORE_URL', cls.results_store_url),
+            results_store_pool_size=_env_int('ABM_RESULTS_STORE_POOL_SIZE', cls.results_store_pool_size),
+            results_store_batch_size=_env_int('ABM_RESULTS_STORE_BATCH_SIZE', cls.results_store_batch_size),
+            results_store_flush_ms=_env_int('ABM_RESULTS_STORE_FLUSH_MS', cls.results_store_flush_ms),
+            results_store_cache_entries=_env_int('ABM_RESULTS_STORE_CACHE_ENTRIES', cls.results_store_cache_entries),
+            submission_catalog_entries=_env_int('ABM_SUBMISSION_CATALOG_ENTRIES', cls.submission_catalog_entries),
+            snapshot_dir=os.getenv('ABM_SNAPSHOT_DIR', cls.snapshot_dir),
+            oracle_existence_url=os.getenv('ABM_ORACLE_EXISTENCE_URL', cls.oracle_existence_url),
+            oracle_ownership_url=os.getenv('ABM_ORACLE_OWNERSHIP_URL', cls.oracle_ownership_url),
+            oracle_activity_url=os.getenv('ABM_ORACLE_ACTIVITY_URL', cls.oracle_activity_url),
+            oracle_existence_timeout_ms=_env_int('ABM_ORACLE_EXISTENCE_TIMEOUT_MS', cls.oracle_existence_timeout_ms),
+            oracle_ownership_timeout_ms=_env_int('ABM_ORACLE_OWNERSHIP_TIMEOUT_MS', cls.oracle_ownership_timeout_ms),
+            oracle_activity_timeout_ms=_env_int('ABM_ORACLE_ACTIVITY_TIMEOUT_MS', cls.oracle_activity_timeout_ms),
+            oracle_required=os.getenv('ABM_ORACLE_REQUIRED', cls.oracle_required),
+            oracle_max_connections=_env_int('ABM_ORACLE_MAX_CONNECTIONS', cls.oracle_max_connections),
+            oracle_pool_timeout_ms=_env_int('ABM_ORACLE_POOL_TIMEOUT_MS', cls.oracle_pool_timeout_ms),
+            oracle_cache_seconds=_env_int('ABM_ORACLE_CACHE_SECONDS', cls.oracle_cache_seconds),
+        )
+
+
+settings = Settings.from_env()
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+
+from engines.records import RecordBatch
+
+# (name, source, path, log-scale)
+FEATURES: Tuple[Tuple[str, str, str, bool], ...] = (
+    ('yield', 'financials', 'expectedYield', False),
+    ('size', 'asset_data', 'specifications.size', True),
+    ('rent', 'financials', 'currentRent', True),
+    ('occupancy', 'financials', 'occupancyRate', False),
+    ('expenses', 'financials', 'annualExpenses', True),
+    ('claimed_value', 'asset_data', 'claimedValue', True),
+)
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'leaf_value')
+
+
+def feature_matrix(batch: RecordBatch) -> np.ndarray:
+    """
+    (n, len(FEATURES)) model inputs. Monetary and size features are log1p-scaled
+    and everything is rounded through float32, matching how sklearn trees compare.
+    """
+    matrix = np.empty((len(batch), len(FEATURES)), dtype=np.float64)
+    for j, (_, source, path, log_scale) in enumerate(FEATURES):
+        values = batch.column(f'{source}.{path}')
+        matrix[:, j] = np.log1p(np.maximum(values, 0)) if log_scale else values
+    return matrix.astype(np.float32).astype(np.float64)
+
+
+def average_path_length(n: np.ndarray) -> np.ndarray:
+    """
+    Expected path length of an unsuccessful BST search over n points, c(n)
+    """
+    n = np.asarray(n, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+def compile_isolation_forest(model) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Flatten a fitted sklearn IsolationForest into padded (n_trees, max_nodes)
+    arrays. Leaves point at themselves and carry their full path-length value
+    (depth + c(leaf samples)), so scoring is a fixed number of gathers.
+    """
+    trees = [est.tree_ for est in model.estimators_]
+    n_features = model.n_features_in_
+    subsampled = model._max_features != n_features
+    max_nodes = max(tree.node_count for tree in trees)
+    shape = (len(trees), max_nodes)
+
+    arrays = {
+        'feature': np.zeros(shape, dtype=np.int32),
+        'threshold': np.full(shape, np.inf),
+        'left': np.tile(np.arange(max_nodes, dtype=np.int32), (len(trees), 1)),
+        'right': np.tile(np.arange(max_nodes, dtype=np.int32), (len(trees), 1)),
+        'leaf_value': np.zeros(shape),
+    }
+    max_depth = 0
+    for t, (tree, features) in enumerate(zip(trees, model.estimators_features_)):
+        n = tree.node_count
+        left, right = tree.children_left, tree.children_right
+        is_leaf = left == -1
+
+        depth = np.zeros(n, dtype=np.int64)
+        for node in range(n):  # children always have larger ids than their parent
+            if not is_leaf[node]:
+                depth[left[node]] = depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+        feature_map = np.asarray(features) if subsampled else np.arange(n_features)
+        internal = ~is_leaf
+        arrays['feature'][t, :n][internal] = feature_map[tree.feature[internal]]
+        arrays['threshold'][t, :n][internal] = tree.threshold[internal]
+        arrays['left'][t, :n][internal] = left[internal]
+        arrays['right'][t, :n][internal] = right[internal]
+        arrays['leaf_value'][t, :n][is_leaf] = depth[is_leaf] + average_path_length(tree.n_node_samples[is_leaf])
+
+    meta = {
+        'features': [name for name, *_ in FEATURES],
+        'n_trees': len(trees),
+        'max_depth': max_depth,
+        'normalizer': float(average_path_length(np.array([model._max_samples]))[0]),
+    }
+    return arrays, meta
+
+
+class IsolationForestScorer:
+    """
+    Inference-only isolation forest over FEATURES.
+
+    The forest is stored as plain .npy arrays plus meta.json and loaded with
+    mmap_mode='r', so every worker process on a host maps the same pages instead
+    of holding its own copy. Scoring walks all trees for the whole batch at once:
+    max_depth rounds of array gathers, no per-tree or per-sample Python loop.
+    Scores match sklearn's IsolationForest.score_samples negated: in (0, 1],
+    higher is more anomalous, ~0.5 is unremarkable.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.meta = meta
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.leaf_value = arrays['leaf_value']
+        self._trees = np.arange(self.feature.shape[0])[:, None]
+        digest = hashlib.sha1(json.dumps(meta, sort_keys=True).encode())
+        for name in ARRAYS:
+            digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, path: str) -> 'IsolationForestScorer':
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('features') != [name for name, *_ in FEATURES]:
+            raise ValueError(f'Anomaly model at {path} was trained on different features')
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        return cls(arrays, meta)
+
+    @classmethod
+    def load_optional(cls, path: Optional[str]) -> Optional['IsolationForestScorer']:
+        if not path or not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        return cls.load(path)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    def score(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        if n == 0:
+            return np.zeros(0)
+        rows = np.arange(n)[None, :]
+        node = np.zeros((self.feature.shape[0], n), dtype=np.int32)
+        for _ in range(self.meta['max_depth']):
+            goes_left = X[rows, self.feature[self._trees, node]] <= self.threshold[self._trees, node]
+            node = np.where(goes_left, self.left[self._trees, node], self.right[self._trees, node])
+        path_length = self.leaf_value[self._trees, node].mean(axis=0)
+        normalizer = self.meta['normalizer']
+        if normalizer == 0:
+            return np.ones(n)
+        return 2.0 ** (-path_length / normalizer)
+
+    def score_batch(self, batch: RecordBatch) -> np.ndarray:
+        return self.score(feature_matrix(batch))
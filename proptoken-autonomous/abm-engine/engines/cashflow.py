@@ -0,0 +1,185 @@
+"""
+Time-series analytics over financials.historicalCashFlow.
+
+Every asset's monthly series is packed into one right-aligned (n_assets,
+n_months) array, NaN-padded on the left, so each statistic is a masked
+reduction over the whole batch instead of a loop per asset or per month.
+"""
+import warnings
+import numpy as np
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Dict, List
+
+from engines.records import NAN, RecordBatch, _number
+
+DEFAULT_MAX_MONTHS = 120      # older history is dropped when packing
+TRAILING_MONTHS = 12          # window for trailing NOI
+SPIKE_RECENT_MONTHS = 3       # recent income compared against the earlier baseline
+MIN_TREND_MONTHS = 3
+MIN_SEASONAL_MONTHS = 24      # two full cycles before seasonality is estimated
+
+METRICS = ('months', 'trailing_noi', 'noi_volatility', 'noi_trend', 'seasonality', 'gap_months', 'income_spike')
+
+
+@dataclass
+class CashFlowSeries:
+    income: np.ndarray       # (n_assets, n_months), oldest first, NaN padding on the left
+    expenses: np.ndarray     # missing expenses are 0 where income was reported
+    months: np.ndarray       # month ordinals (year * 12 + month - 1); NaN for padding or undated rows
+    lengths: np.ndarray      # (n_assets,) entries per asset after truncation
+
+
+def _month(value: Any) -> float:
+    # 'YYYY-MM[-DD]' -> months since year 0, so consecutive months differ by 1
+    if isinstance(value, str) and len(value) >= 7 and value[4] == '-':
+        try:
+            year, month = int(value[:4]), int(value[5:7])
+        except ValueError:
+            return NAN
+        if 1 <= month <= 12:
+            return year * 12 + month - 1
+    return NAN
+
+
+def _numbers(values: List[Any]) -> np.ndarray:
+    # None becomes NaN in the fast path; anything else non-numeric falls back per value
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_number(v) for v in values], dtype=np.float64)
+
+
+def pack(batch: RecordBatch, max_months: int = DEFAULT_MAX_MONTHS) -> CashFlowSeries:
+    """
+    Pack the batch's cash-flow histories into padded arrays in chronological
+    order. A series with any unparseable month keeps its submitted order and
+    is treated as undated (no calendar-based metrics).
+    """
+    histories = [[e for e in r.cash_flow_history if isinstance(e, dict)] for r in batch.records]
+    n = len(histories)
+    lengths = np.fromiter(map(len, histories), dtype=np.int64, count=n)
+    total = int(lengths.sum())
+    width = int(lengths.max()) if total else 0
+    income, expenses, months = (np.full((n, width), np.nan) for _ in range(3))
+    if total:
+        entries = list(chain.from_iterable(histories))
+        # Flat values scattered into place; each row ends in the last column
+        rows = np.repeat(np.arange(n), lengths)
+        cols = np.arange(total) - np.repeat(np.cumsum(lengths) - width, lengths)
+        income[rows, cols] = _numbers([e.get('income') for e in entries])
+        expenses[rows, cols] = _numbers([e.get('expenses') for e in entries])
+        # Few distinct month strings per batch, so each is parsed once
+        month_values = [e.get('month') for e in entries]
+        try:
+            ordinals = {value: _month(value) for value in set(month_values)}
+            months[rows, cols] = np.fromiter(map(ordinals.__getitem__, month_values), dtype=np.float64, count=total)
+        except TypeError:  # unhashable junk in a raw export
+            months[rows, cols] = [_month(value) for value in month_values]
+
+        position = np.broadcast_to(np.arange(width, dtype=np.float64), (n, width))
+        padding = position < (width - lengths)[:, None]
+        dated = ~np.any(np.isnan(months) & ~padding, axis=1)
+        key = np.where(padding, -np.inf, np.where(dated[:, None], months, position))
+        order = np.argsort(key, axis=1, kind='stable')
+        income = np.take_along_axis(income, order, axis=1)
+        expenses = np.take_along_axis(expenses, order, axis=1)
+        months = np.where(dated[:, None], np.take_along_axis(months, order, axis=1), np.nan)
+        expenses = np.where(np.isnan(expenses) & ~np.isnan(income), 0.0, expenses)
+
+    if width > max_months:
+        income, expenses, months = income[:, -max_months:], expenses[:, -max_months:], months[:, -max_months:]
+        lengths = np.minimum(lengths, max_months)
+    return CashFlowSeries(income, expenses, months, lengths)
+
+
+def analyze(series: CashFlowSeries) -> Dict[str, np.ndarray]:
+    """
+    Per-asset cash-flow metrics, NaN where the history is too short:
+
+      months          monthly entries with a usable income figure
+      trailing_noi    annualised NOI over the last 12 months reported
+      noi_volatility  std / |mean| of monthly NOI (3+ months)
+      noi_trend       OLS slope of monthly NOI relative to its mean, per month (3+ months)
+      seasonality     share of detrended NOI variance explained by month of year (24+ dated months)
+      gap_months      calendar months missing between the first and last entry (dated series)
+      income_spike    mean income over the last 3 entries / median of the earlier ones (3+ earlier)
+    """
+    n, width = series.income.shape
+    noi = series.income - series.expenses
+    valid = ~np.isnan(noi)
+    count = valid.sum(axis=1)
+    metrics = {name: np.full(n, np.nan) for name in METRICS}
+    metrics['months'] = count.astype(np.float64)
+    if not count.any():
+        return metrics
+
+    dated = np.isfinite(series.months[:, -1])
+    position = np.broadcast_to(np.arange(width, dtype=np.float64), (n, width))
+    # Time axis: calendar months when dated, entry position otherwise
+    t = np.where(valid, np.where(dated[:, None], series.months, position), np.nan)
+    has_data = count > 0
+    safe_count = np.maximum(count, 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows in nanmax / nanmedian
+
+        latest = np.nanmax(t, axis=1)
+        window = valid & (t > (latest - TRAILING_MONTHS)[:, None])
+        window_count = window.sum(axis=1)
+        trailing = np.where(window, noi, 0.0).sum(axis=1) / np.maximum(window_count, 1) * 12
+        metrics['trailing_noi'] = np.where(window_count > 0, trailing, np.nan)
+
+        filled = np.where(valid, noi, 0.0)
+        mean = filled.sum(axis=1) / safe_count
+        deviation = np.where(valid, noi - mean[:, None], 0.0)
+        std = np.sqrt((deviation ** 2).sum(axis=1) / safe_count)
+        enough = has_data & (count >= MIN_TREND_MONTHS) & (mean != 0)
+        metrics['noi_volatility'] = np.where(enough, std / np.abs(mean), np.nan)
+
+        dt = np.where(valid, t - (np.where(valid, t, 0.0).sum(axis=1) / safe_count)[:, None], 0.0)
+        t_var = (dt ** 2).sum(axis=1)
+        slope = np.where(t_var > 0, (dt * deviation).sum(axis=1) / t_var, 0.0)
+        metrics['noi_trend'] = np.where(enough & (t_var > 0), slope / np.abs(mean), np.nan)
+
+        metrics['seasonality'] = _seasonality(series.months, deviation - slope[:, None] * dt,
+                                              valid & (dated & (count >= MIN_SEASONAL_MONTHS))[:, None], n)
+
+        # Months are sorted, so repeats are zero steps between neighbours
+        reported = ~np.isnan(series.months)
+        span = np.nanmax(series.months, axis=1) - np.nanmin(series.months, axis=1) + 1
+        repeats = (np.diff(series.months, axis=1) == 0).sum(axis=1)
+        metrics['gap_months'] = np.where(dated, span - (reported.sum(axis=1) - repeats), np.nan)
+
+        if width > SPIKE_RECENT_MONTHS:
+            recent = np.nanmean(series.income[:, -SPIKE_RECENT_MONTHS:], axis=1)
+            earlier = series.income[:, :-SPIKE_RECENT_MONTHS]
+            baseline = np.nanmedian(earlier, axis=1)
+            spiked = (np.sum(~np.isnan(earlier), axis=1) >= 3) & (baseline > 0)
+            metrics['income_spike'] = np.where(spiked, recent / baseline, np.nan)
+    return metrics
+
+
+def _seasonality(months: np.ndarray, residuals: np.ndarray, eligible: np.ndarray, n: int) -> np.ndarray:
+    """
+    Variance of the per-calendar-month residual means over the residual
+    variance, for the eligible entries of each row
+    """
+    rows, cols = np.nonzero(eligible)
+    strength = np.full(n, np.nan)
+    if not len(rows):
+        return strength
+    values = residuals[rows, cols]
+    bins = rows * 12 + (months[rows, cols] % 12).astype(np.int64)
+    sums = np.bincount(bins, weights=values, minlength=n * 12)
+    counts = np.bincount(bins, minlength=n * 12)
+    seasonal = (sums / np.maximum(counts, 1))[bins]
+    explained = np.bincount(rows, weights=seasonal ** 2, minlength=n)
+    total = np.bincount(rows, weights=values ** 2, minlength=n)
+    has_rows = np.bincount(rows, minlength=n) > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(has_rows & (total > 0), np.minimum(explained / total, 1.0), np.nan)
+
+
+def cash_flow_metrics(batch: RecordBatch, max_months: int = DEFAULT_MAX_MONTHS) -> Dict[str, np.ndarray]:
+    return analyze(pack(batch, max_months))
@@ -0,0 +1,22 @@
+import numpy as np
+from typing import Any, Dict, List
+
+
+def column(records: List[Dict], path: str, default: float = 0.0) -> np.ndarray:
+    """
+    Pull a dotted path (e.g. 'specifications.size') out of every record
+    into a float64 column. Missing or non-numeric values fall back to default.
+    """
+    keys = path.split('.')
+    out = np.empty(len(records), dtype=np.float64)
+    for i, record in enumerate(records):
+        value: Any = record
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+            if value is None:
+                break
+        try:
+            out[i] = default if value is None else float(value)
+        except (TypeError, ValueError):
+            out[i] = default
+    return out
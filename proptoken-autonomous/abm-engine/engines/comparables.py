@@ -0,0 +1,276 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import numpy as np
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from engines.geo_index import GeoGrid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'comparables.csv')
+FALLBACK_KEY = '*'
+MIN_WEIGHT_DISTANCE_M = 50.0  # nearer comparables all get the same (maximum) weight
+
+
+def location_keys(location: Dict) -> Tuple[str, str]:
+    """
+    Normalised (postal_code, city) lookup keys for a submission location
+    """
+    location = location if isinstance(location, dict) else {}
+    postal = str(location.get('postalCode') or '').strip()
+    city = str(location.get('city') or '').strip().lower()
+    return postal, city
+
+
+class ComparablesProvider(ABC):
+    """
+    Source of comparable transaction prices (per sqft) for a location
+    """
+
+    # Fingerprint of the loaded data; changes whenever the data does
+    version: str = ''
+
+    def __init__(self):
+        self._reload_listeners: List[Callable[['ComparablesProvider'], None]] = []
+
+    def add_reload_listener(self, callback: Callable[['ComparablesProvider'], None]):
+        """
+        Register a callback run after every reload that changed the data
+        """
+        self._reload_listeners.append(callback)
+
+    def _notify_reload(self):
+        for callback in self._reload_listeners:
+            callback(self)
+
+    def refresh_if_stale(self):
+        """
+        Cheap check for updated source data; reloads if needed
+        """
+
+    @abstractmethod
+    def lookup(self, location: Dict) -> np.ndarray:
+        """
+        Comparable prices per sqft for one location
+        """
+
+    def stats(self, locations: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean and standard deviation of comparable prices, one row per location
+        """
+        prices = [self.lookup(location) for location in locations]
+        return np.array([p.mean() for p in prices]), np.array([p.std() for p in prices])
+
+    def nearby(self, lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Distance-weighted mean and standard deviation of the comparables near
+        each point, plus how many were used. Mean and std are NaN where there
+        are too few nearby comparables (or no coordinates); callers fall back
+        to stats() there.
+        """
+        n = len(lats)
+        return np.full(n, np.nan), np.full(n, np.nan), np.zeros(n, dtype=np.int64)
+
+    def reload(self) -> bool:
+        """
+        Re-read the underlying data; returns True if anything changed
+        """
+        return False
+
+
+@dataclass(frozen=True)
+class _ComparablesTable:
+    prices: List[np.ndarray]  # per slot
+    means: np.ndarray
+    stds: np.ndarray
+    postal_slots: Dict[str, int]
+    city_slots: Dict[str, int]
+    fallback_slot: int
+    geo: Optional[GeoGrid]    # rows with coordinates
+    geo_prices: np.ndarray    # price per GeoGrid input row
+    version: str
+
+
+class DatasetComparablesProvider(ComparablesProvider):
+    """
+    Comparables loaded once from a local CSV/Parquet file with columns
+    city, postal_code, price_per_sqft and optionally lat, lng.
+
+    Rows are grouped into per-postal-code and per-city price arrays whose mean/std
+    are precomputed, so a lookup is a dict hit plus an array index. Rows with
+    city '*' form the fallback group for unknown locations (the whole dataset is
+    used if there are none). When sample_size is set, groups larger than that are
+    subsampled once at load time with the given seed, so results are reproducible.
+
+    Rows with coordinates also go into a GeoGrid. nearby() takes the k nearest
+    of them within radius_m of each point (all of them, never subsampled) and
+    weights their prices by inverse distance.
+
+    The file's mtime is checked at most every refresh_interval seconds. When it
+    changed, the tables and the geo index are rebuilt on a background thread and
+    swapped in once complete; lookups keep using the previous tables until then.
+    Every process picks the change up on its own.
+    """
+
+    def __init__(self, path: str = DEFAULT_DATASET, seed: int = 0,
+                 sample_size: Optional[int] = None, refresh_interval: float = 30.0,
+                 k: int = 20, radius_m: float = 2000.0, min_nearby: int = 3, cell_m: float = 250.0):
+        super().__init__()
+        self.path = path
+        self.seed = seed
+        self.sample_size = sample_size
+        self.refresh_interval = refresh_interval
+        self.k = k
+        self.radius_m = radius_m
+        self.min_nearby = min_nearby
+        self.cell_m = cell_m
+        self._lock = threading.Lock()
+        self._rebuilding: Optional[threading.Thread] = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._table = self._load()
+
+    @property
+    def version(self) -> str:
+        return self._table.version
+
+    def _read_frame(self):
+        import pandas as pd
+
+        if self.path.endswith('.parquet'):
+            frame = pd.read_parquet(self.path)
+        else:
+            frame = pd.read_csv(self.path, dtype={'city': str, 'postal_code': str})
+        frame['city'] = frame['city'].fillna('').astype(str).str.strip().str.lower()
+        frame['postal_code'] = frame['postal_code'].fillna('').astype(str).str.strip()
+        frame['price_per_sqft'] = frame['price_per_sqft'].astype(np.float64)
+        for name in ('lat', 'lng'):
+            frame[name] = pd.to_numeric(frame[name], errors='coerce') if name in frame else np.nan
+        return frame.dropna(subset=['price_per_sqft'])[['city', 'postal_code', 'price_per_sqft', 'lat', 'lng']]
+
+    def _load(self) -> _ComparablesTable:
+        self._mtime = os.path.getmtime(self.path)
+        self._checked_at = time.monotonic()
+        with open(self.path, 'rb') as f:
+            digest = hashlib.sha1(f.read())
+        digest.update(f'{self.seed}:{self.sample_size}:{self.k}:{self.radius_m}:{self.min_nearby}'.encode())
+
+        frame = self._read_frame()
+        if frame.empty:
+            raise ValueError(f'Comparables dataset {self.path} has no rows')
+        rng = np.random.default_rng(self.seed)
+
+        prices: List[np.ndarray] = []
+
+        def add_group(values: np.ndarray) -> int:
+            if self.sample_size and len(values) > self.sample_size:
+                values = rng.choice(values, size=self.sample_size, replace=False)
+            prices.append(np.ascontiguousarray(values, dtype=np.float64))
+            return len(prices) - 1
+
+        postal_slots = {
+            key: add_group(group.to_numpy())
+            for key, group in frame.groupby('postal_code', sort=True)['price_per_sqft'] if key
+        }
+        city_slots = {
+            key: add_group(group.to_numpy())
+            for key, group in frame.groupby('city', sort=True)['price_per_sqft'] if key and key != FALLBACK_KEY
+        }
+        fallback = frame.loc[frame['city'] == FALLBACK_KEY, 'price_per_sqft'].to_numpy()
+        fallback_slot = add_group(fallback if len(fallback) else frame['price_per_sqft'].to_numpy())
+
+        lats, lngs = frame['lat'].to_numpy(), frame['lng'].to_numpy()
+        located = (np.abs(lats) <= 90) & (np.abs(lngs) <= 180)
+        geo = GeoGrid(lats[located], lngs[located], self.cell_m) if located.any() else None
+
+        return _ComparablesTable(
+            prices=prices,
+            means=np.array([p.mean() for p in prices]),
+            stds=np.array([p.std() for p in prices]),
+            postal_slots=postal_slots,
+            city_slots=city_slots,
+            fallback_slot=fallback_slot,
+            geo=geo,
+            geo_prices=frame['price_per_sqft'].to_numpy()[located],
+            version=digest.hexdigest()[:16]
+        )
+
+    def refresh_if_stale(self):
+        if not self.refresh_interval or time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            changed = os.path.getmtime(self.path) != self._mtime
+        except OSError:
+            return
+        if changed:
+            self._reload_in_background()
+
+    def _reload_in_background(self):
+        # Building the geo index over a large dataset takes a while; requests keep
+        # the current table meanwhile
+        with self._lock:
+            if self._rebuilding is not None and self._rebuilding.is_alive():
+                return
+            self._rebuilding = threading.Thread(target=self._background_reload, name='comparables-reload', daemon=True)
+            self._rebuilding.start()
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        except Exception:
+            logger.exception('Comparables reload from %s failed, keeping previous data', self.path)
+
+    def reload(self) -> bool:
+        table = self._load()
+        with self._lock:
+            changed = table.version != self._table.version
+            self._table = table
+        if changed:
+            self._notify_reload()
+        return changed
+
+    def _slot(self, table: _ComparablesTable, location: Dict) -> int:
+        postal, city = location_keys(location)
+        slot = table.postal_slots.get(postal)
+        if slot is None:
+            slot = table.city_slots.get(city, table.fallback_slot)
+        return slot
+
+    def lookup(self, location: Dict) -> np.ndarray:
+        self.refresh_if_stale()
+        table = self._table
+        return table.prices[self._slot(table, location)]
+
+    def stats(self, locations: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        self.refresh_if_stale()
+        table = self._table
+        slots = np.fromiter((self._slot(table, location) for location in locations), dtype=np.intp, count=len(locations))
+        return table.means[slots], table.stds[slots]
+
+    def nearby(self, lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self.refresh_if_stale()
+        table = self._table
+        n = len(lats)
+        means, stds = np.full(n, np.nan), np.full(n, np.nan)
+        if table.geo is None:
+            return means, stds, np.zeros(n, dtype=np.int64)
+        located = np.flatnonzero((np.abs(lats) <= 90) & (np.abs(lngs) <= 180))
+        queries, rows, distances = table.geo.nearest_batch(lats[located], lngs[located], self.k, self.radius_m)
+        queries = located[queries]
+        counts = np.bincount(queries, minlength=n)
+
+        prices = table.geo_prices[rows]
+        weights = 1.0 / np.maximum(distances, MIN_WEIGHT_DISTANCE_M)
+        total = np.bincount(queries, weights=weights, minlength=n)
+        enough = (counts >= max(self.min_nearby, 1)) & (total > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(queries, weights=weights * prices, minlength=n) / total
+            variance = np.bincount(queries, weights=weights * (prices - mean[queries]) ** 2, minlength=n) / total
+        means[enough], stds[enough] = mean[enough], np.sqrt(variance[enough])
+        return means, stds, counts
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from engines.geo_index import EARTH_RADIUS_M, haversine_m
+
+# Identifying fields indexed for exact (normalised) matches. Shared registry ids or
+# SPV numbers point at the same asset; shared directors at related parties.
+KEY_KINDS = ('registry_id', 'spv_registration', 'director')
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+_SPACES = re.compile(r'\s+')
+
+
+def submission_id(asset_data: Dict[str, Any]) -> str:
+    """
+    The submission's own id, or a content hash when the payload carries none
+    (so re-analysing the same payload never matches itself)
+    """
+    for key in ('id', 'submissionId', 'assetId'):
+        if asset_data.get(key):
+            return str(asset_data[key])
+    canonical = json.dumps(asset_data, sort_keys=True, separators=(',', ':'), default=str)
+    return 'sha1:' + hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def coordinates(location: Any) -> Optional[Tuple[float, float]]:
+    """
+    (lat, lng) from {'coordinates': {'lat', 'lng'}} or {'coordinates': [lat, lng]}
+    """
+    coords = location.get('coordinates') if isinstance(location, dict) else None
+    try:
+        if isinstance(coords, dict):
+            lat, lng = float(coords['lat']), float(coords['lng'])
+        elif isinstance(coords, (list, tuple)) and len(coords) == 2:
+            lat, lng = float(coords[0]), float(coords[1])
+        else:
+            return None
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def identifying_keys(asset_data: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    keys = set()
+    for registry_id in asset_data.get('registryIds') or []:
+        normalised = _NON_ALNUM.sub('', str(registry_id).upper())
+        if normalised:
+            keys.add(('registry_id', normalised))
+    spv = asset_data.get('spv') or {}
+    if isinstance(spv, dict):
+        registration = _NON_ALNUM.sub('', str(spv.get('spvRegistrationNumber') or '').upper())
+        if registration:
+            keys.add(('spv_registration', registration))
+        for director in spv.get('directors') or []:
+            name = _SPACES.sub(' ', str(director).strip().lower())
+            if name:
+                keys.add(('director', name))
+    return keys
+
+
+class SubmissionIndex:
+    """
+    Cross-submission index for duplicate and collusion checks.
+
+    Identifying fields (registry ids, SPV registration number, directors) go into an
+    inverted index of normalised value -> submission ids. Coordinates go into a
+    uniform lat/lng grid whose cells are radius_m wide, so a proximity query only
+    looks at the few cells around the point. Both lookups are dict hits, so query
+    cost depends on the number of matches, not on the size of the registry.
+    Proximity wraps across the antimeridian; within about radius_m of a pole,
+    where a column span would circle the globe, the query scans the whole rows.
+
+    add() is incremental: re-adding a submission replaces its previous entries.
+    """
+
+    def __init__(self, radius_m: float = 100.0, max_matches: int = 20):
+        self.radius_m = radius_m
+        self.max_matches = max_matches
+        # One cell is radius_m of great-circle latitude, so matches are at most one row away
+        self._cell_deg = math.degrees(radius_m / EARTH_RADIUS_M)
+        self._n_cols = int(math.ceil(360 / self._cell_deg))
+        self._lock = threading.Lock()
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._grid: Dict[Tuple[int, int], Set[str]] = {}
+        self._docs: Dict[str, Tuple[Set[Tuple[str, str]], Optional[Tuple[float, float]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        # Columns count from lng -180, so the last one borders the first across the antimeridian
+        col = min(int(math.floor((lng + 180) / self._cell_deg)), self._n_cols - 1)
+        return int(math.floor((lat + 90) / self._cell_deg)), col
+
+    def add(self, sid: str, asset_data: Dict[str, Any], location: Any = None):
+        keys = identifying_keys(asset_data)
+        point = coordinates(location if location is not None else asset_data.get('location'))
+        with self._lock:
+            if self._docs.get(sid) == (keys, point):
+                return
+            self._remove_locked(sid)
+            for key in keys:
+                self._postings.setdefault(key, set()).add(sid)
+            if point is not None:
+                self._grid.setdefault(self._cell(*point), set()).add(sid)
+            self._docs[sid] = (keys, point)
+
+    def remove(self, sid: str):
+        with self._lock:
+            self._remove_locked(sid)
+
+    def _remove_locked(self, sid: str):
+        previous = self._docs.pop(sid, None)
+        if previous is None:
+            return
+        keys, point = previous
+        for key in keys:
+            postings = self._postings.get(key)
+            if postings is not None:
+                postings.discard(sid)
+                if not postings:
+                    del self._postings[key]
+        if point is not None:
+            cell = self._grid.get(self._cell(*point))
+            if cell is not None:
+                cell.discard(sid)
+                if not cell:
+                    del self._grid[self._cell(*point)]
+
+    def _nearby(self, point: Tuple[float, float], exclude: str) -> Dict[str, float]:
+        lat, lng = point
+        row, col = self._cell(lat, lng)
+        rows = (row - 1, row, row + 1)
+        # Longitude degrees shrink towards the poles: the widest longitude gap within
+        # radius_m is at the poleward edge of the rows searched
+        edge_lat = min(abs(lat) + self._cell_deg, 90.0)
+        reach = math.sin(self.radius_m / (2 * EARTH_RADIUS_M)) / max(math.cos(math.radians(edge_lat)), 1e-12)
+        lng_span = self._n_cols if reach >= 1 else int(math.ceil(math.degrees(2 * math.asin(reach)) / self._cell_deg))
+        if 2 * lng_span + 1 >= self._n_cols:
+            cells = [members for (r, _), members in self._grid.items() if r in rows]
+        else:
+            cells = [self._grid.get((r, c % self._n_cols), ()) for r in rows
+                     for c in range(col - lng_span, col + lng_span + 1)]
+        candidates = [sid for members in cells for sid in members if sid != exclude]
+        if not candidates:
+            return {}
+        points = np.array([self._docs[sid][1] for sid in candidates])
+        distances = haversine_m(lat, lng, points[:, 0], points[:, 1])
+        return {sid: d for sid, d in zip(candidates, distances.tolist()) if d <= self.radius_m}
+
+    def query(self, sid: str, asset_data: Dict[str, Any], location: Any = None) -> List[Dict[str, Any]]:
+        """
+        Other submissions sharing an identifying value with, or located within
+        radius_m of, this one; strongest matches first
+        """
+        keys = identifying_keys(asset_data)
+        point = coordinates(location if location is not None else asset_data.get('location'))
+        matches: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for kind, value in sorted(keys):
+                for other in self._postings.get((kind, value), ()):
+                    if other != sid:
+                        match = matches.setdefault(other, {'submission_id': other, 'reasons': []})
+                        match['reasons'].append(f'{kind}:{value}')
+            if point is not None:
+                for other, distance in self._nearby(point, sid).items():
+                    match = matches.setdefault(other, {'submission_id': other, 'reasons': []})
+                    match['reasons'].append('coordinates')
+                    match['distance_m'] = round(distance, 1)
+        ranked = sorted(matches.values(), key=lambda m: (-len(m['reasons']), m.get('distance_m', math.inf), m['submission_id']))
+        return ranked[:self.max_matches]
+
+    def check_and_add(self, asset_data: Dict[str, Any], location: Any = None) -> List[Dict[str, Any]]:
+        """
+        Query against everything seen so far, then index this submission
+        """
+        sid = submission_id(asset_data)
+        matches = self.query(sid, asset_data, location)
+        self.add(sid, asset_data, location)
+        return matches
+
+    def build(self, submissions: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for submission in submissions:
+            self.add(submission_id(submission), submission, submission.get('location'))
+            count += 1
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'submissions': len(self._docs),
+                'keys': len(self._postings),
+                'grid_cells': len(self._grid),
+                'radius_m': self.radius_m,
+            }
+
+
+def match_features(matches: List[List[Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Per-row match counts by reason, as index.* columns for the fraud rules
+    """
+    counts = {f'index.{kind}_matches': np.zeros(len(matches)) for kind in KEY_KINDS + ('nearby',)}
+    for i, row in enumerate(matches):
+        for match in row:
+            kinds = {reason.split(':', 1)[0] for reason in match['reasons']}
+            for kind in kinds:
+                counts[f'index.{"nearby" if kind == "coordinates" else kind}_matches'][i] += 1
+    return counts
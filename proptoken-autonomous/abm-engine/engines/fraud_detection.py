@@ -1,43 +1,224 @@
-from typing import Dict, Any, List
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+from engines.anomaly_model import FEATURES, IsolationForestScorer
+from engines.cashflow import cash_flow_metrics
+from engines.duplicate_index import SubmissionIndex, match_features
+from engines.fraud_rules import CompiledRuleSet, FraudRuleRegistry
+from engines.records import SOURCES, RecordBatch
+from engines.stage_graph import Columns, GraphRun, Stage, StageGraph, StageMemo
+from engines.timing import StageTimer
+from engines.versioning import provenance
 
 class FraudDetectionEngine:
     """
     Multi-layer fraud detection
     """
-    
+
+    DERIVED_SOURCES = ('model', 'index', 'cashflow', 'satellite')
+
+    def __init__(self, rules: Optional[FraudRuleRegistry] = None,
+                 anomaly_model: Optional[IsolationForestScorer] = None,
+                 duplicate_index: Optional[SubmissionIndex] = None):
+        self.rules = rules or FraudRuleRegistry()
+        self.anomaly_model = anomaly_model
+        self.duplicate_index = duplicate_index
+        self._graphs: Dict[str, Any] = {}
+
     def detect(self, asset_data: Dict, financials: Dict, oracle_data: Dict) -> Dict[str, Any]:
         """
         Run fraud detection checks
         """
-        anomalies = []
-        
-        # Check 1: Yield too high
-        claimed_yield = financials.get('expectedYield', 0)
-        if claimed_yield > 20: # Suspiciously high
-            anomalies.append({
-                'type': 'yield_anomaly',
-                'severity': 'high',
-                'detail': f'Claimed yield {claimed_yield}% is suspicious',
-                'score': 0.3
-            })
-            
-        # Check 2: Size mismatch (Mock logic)
-        claimed_size = asset_data.get('specifications', {}).get('size', 0)
-        # In real implementation we check oracle_data['existence']['satellite']['estimated_size']
-        # Mocking satellite size check
-        if claimed_size > 50000 and claimed_yield > 15:
-             anomalies.append({
-                'type': 'size_yield_mismatch',
-                'severity': 'medium',
-                'detail': 'Large size with high yield is rare',
-                'score': 0.2
+        return self.detect_batch([asset_data], [financials], [oracle_data])[0]
+
+    def detect_batch(self, asset_data: List[Dict], financials: List[Dict], oracle_data: List[Dict],
+                     duplicates: Optional[List[List[Dict[str, Any]]]] = None,
+                     timer: Optional[StageTimer] = None) -> List[Dict[str, Any]]:
+        """
+        Run fraud detection checks over a batch given as request dicts
+        """
+        timer = timer or StageTimer()
+        with timer.stage('records'):
+            batch = RecordBatch.from_dicts(asset_data, None, financials, oracle_data)
+        return self.detect_records(batch, duplicates, timer)
+
+    def detect_records(self, batch: RecordBatch, duplicates: Optional[List[List[Dict[str, Any]]]] = None,
+                       timer: Optional[StageTimer] = None, memo: Optional[StageMemo] = None) -> List[Dict[str, Any]]:
+        """
+        Run fraud detection checks over a RecordBatch. Each rule is evaluated as
+        a boolean mask over the whole batch; anomaly dicts are only built for hits.
+
+        duplicates are per-row SubmissionIndex matches. Callers that keep the
+        index themselves (the API process) pass them in; otherwise the engine's
+        own index, if any, is queried and updated here. Stage and per-rule wall
+        times are added to timer when one is passed.
+        """
+        timer = timer or StageTimer()
+
+        # Cross-submission layer: exposed as index.* match counts
+        if duplicates is None and self.duplicate_index is not None:
+            with timer.stage('duplicate_index'):
+                duplicates = [self.duplicate_index.check_and_add(r.asset_data, r.location) for r in batch.records]
+
+        ruleset = self.rules.active()
+        run = self.run_stages(batch, ruleset, duplicates, timer, memo)
+        with timer.stage('results'):
+            return self.build_results(ruleset, run, duplicates)
+
+    def run_stages(self, batch: RecordBatch, ruleset: CompiledRuleSet,
+                   duplicates: Optional[List[List[Dict[str, Any]]]] = None,
+                   timer: Optional[StageTimer] = None, memo: Optional[StageMemo] = None) -> GraphRun:
+        """
+        Run the stage graph: the derived layers (model, index, cashflow, satellite) and
+        then one stage per rule, keyed by that rule's own fields. With a memo,
+        only rules whose fields (or derived inputs) changed are re-evaluated.
+        """
+        return self._graph(ruleset, duplicates is not None).run(
+            batch, timer, memo, row_inputs={'duplicates': duplicates} if duplicates is not None else None
+        )
+
+    def replay_stages(self, batch: RecordBatch, ruleset: CompiledRuleSet, recorded: Dict[str, Columns],
+                      duplicates: Optional[List[List[Dict[str, Any]]]] = None,
+                      timer: Optional[StageTimer] = None) -> GraphRun:
+        """
+        Re-run each stage on the recorded outputs of its upstream stages (see StageGraph.replay)
+        """
+        return self._graph(ruleset, duplicates is not None).replay(
+            batch, recorded, timer, row_inputs={'duplicates': duplicates} if duplicates is not None else None
+        )
+
+    def provenance(self, ruleset: CompiledRuleSet) -> Dict[str, Any]:
+        """
+        Engine version and config hash of results under ruleset; the rules and
+        the anomaly model draw no random numbers, so there is no seed
+        """
+        return provenance({
+            'rules': ruleset.version,
+            'anomaly_model': self.anomaly_model.version if self.anomaly_model is not None else None,
+        }, None)
+
+    def build_results(self, ruleset: CompiledRuleSet, run: GraphRun,
+                      duplicates: Optional[List[List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        outputs, n = run.outputs, run.rows
+        masks = np.zeros((len(ruleset.rules), n), dtype=bool)
+        columns: Dict[str, np.ndarray] = {}
+        for i, rule in enumerate(ruleset.rules):
+            rule_outputs = outputs[f'rule.{rule.id}']
+            masks[i] = rule_outputs['hit']
+            columns.update((name, values) for name, values in rule_outputs.items() if name != 'hit')
+        evaluation = ruleset.evaluation(masks, columns)
+        fraud_scores = evaluation.scores * 10 # Scale 0-100 (roughly)
+        model_scores = outputs['model']['model.isolation_score'].tolist() if 'model' in outputs else [None] * n
+        return self._build_results(evaluation, fraud_scores, model_scores, duplicates, self.provenance(ruleset))
+
+    def _graph(self, ruleset: CompiledRuleSet, with_duplicates: bool) -> StageGraph:
+        # Rebuilt only when the rules are reloaded (or the index layer comes or goes)
+        key = (ruleset, with_duplicates)
+        graphs = self._graphs
+        if graphs.get('key') != key:
+            graphs = self._graphs = {'key': key, 'graph': self._build_graph(ruleset, with_duplicates)}
+        return graphs['graph']
+
+    def _build_graph(self, ruleset: CompiledRuleSet, with_duplicates: bool) -> StageGraph:
+        # Statistical layer: exposed to the rules as model.* columns
+        derived = []
+        if self.anomaly_model is not None:
+            model = self.anomaly_model
+            derived.append(Stage(
+                'model', lambda batch, inputs: {'model.isolation_score': model.score_batch(batch)},
+                inputs=tuple(f'{source}.{path}' for _, source, path, _ in FEATURES), version=lambda: model.version
+            ))
+        # Cross-submission layer: exposed as index.* match counts
+        if with_duplicates:
+            derived.append(Stage('index', lambda batch, inputs: match_features(inputs['duplicates']),
+                                 inputs=('duplicates',)))
+        # Time-series layer: cashflow.* metrics, only computed when a rule uses them
+        if any(f.startswith('cashflow.') for f in ruleset.fields):
+            derived.append(Stage(
+                'cashflow',
+                lambda batch, inputs: {f'cashflow.{name}': values for name, values in cash_flow_metrics(batch).items()},
+                inputs=('financials.historicalCashFlow',)
+            ))
+        # Oracle layer: claimed vs satellite-estimated size as satellite.size_ratio
+        if any(f.startswith('satellite.') for f in ruleset.fields):
+            derived.append(Stage(
+                'satellite', self._satellite_stage,
+                inputs=('asset_data.specifications.size', 'oracle_data.existence.satellite.estimated_size')
+            ))
+        available = {stage.name for stage in derived}
+
+        rules = []
+        for i, rule in enumerate(ruleset.rules):
+            fields = {c.field: c.default for c in rule.conditions}
+            sources = set()
+            for field_name in fields:
+                source = field_name.split('.', 1)[0]
+                if source not in SOURCES and source not in self.DERIVED_SOURCES:
+                    raise ValueError(f"Fraud rule field '{field_name}' references unknown source '{source}'")
+                sources.add(source)
+            rules.append(Stage(
+                f'rule.{rule.id}', self._rule_stage(ruleset, i, fields),
+                inputs=tuple(f for f in fields if f.split('.', 1)[0] in SOURCES),
+                depends=tuple(sorted(sources & available)),
+                version=lambda rule=rule: repr(rule)
+            ))
+        return StageGraph('fraud', derived + rules)
+
+    @staticmethod
+    def _satellite_stage(batch: RecordBatch, inputs: Dict[str, Any]) -> Columns:
+        # NaN (no rule hit) unless both the claimed and the estimated size are known
+        claimed, estimated = batch.array('size'), batch.array('satellite_size')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(estimated > 0, claimed / estimated, np.nan)
+        return {'satellite.size_ratio': ratio}
+
+    def _rule_stage(self, ruleset: CompiledRuleSet, rule_index: int, fields: Dict[str, float]):
+        def evaluate(batch: RecordBatch, inputs: Dict[str, Any]) -> Columns:
+            columns = self._build_columns(batch, inputs, fields)
+            return {'hit': ruleset.evaluate_rule(rule_index, columns, len(batch)), **columns}
+        return evaluate
+
+    def _build_results(self, evaluation, fraud_scores, model_scores, duplicates, stamp) -> List[Dict[str, Any]]:
+        results = []
+        hit_rows, hit_cols = np.nonzero(evaluation.masks.T)
+        hits_by_row: Dict[int, List[int]] = {}
+        for row, rule_index in zip(hit_rows.tolist(), hit_cols.tolist()):
+            hits_by_row.setdefault(row, []).append(rule_index)
+
+        for i, (fraud_score, model_score) in enumerate(zip(fraud_scores.tolist(), model_scores)):
+            anomalies = [
+                {
+                    'type': evaluation.rules[r].anomaly_type,
+                    'severity': evaluation.rules[r].severity,
+                    'detail': evaluation.detail(r, i),
+                    'score': evaluation.rules[r].score
+                }
+                for r in hits_by_row.get(i, [])
+            ]
+
+            results.append({
+                'fraud_likelihood': fraud_score,
+                'anomaly_score': len(anomalies),
+                'anomalies': anomalies,
+                'anomaly_model_score': model_score,
+                'duplicates': duplicates[i] if duplicates is not None else [],
+                'passed': fraud_score <= 5.0,
+                'provenance': stamp
             })
+        return results
 
-        fraud_score = sum(a['score'] for a in anomalies) * 10 # Scale 0-100 (roughly)
-        
-        return {
-            'fraud_likelihood': fraud_score,
-            'anomaly_score': len(anomalies),
-            'anomalies': anomalies,
-            'passed': fraud_score <= 5.0
-        }
+    def _build_columns(self, batch: RecordBatch, inputs: Dict[str, Any],
+                       fields: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """
+        One float64 column per rule field. Derived columns come from the
+        upstream stage outputs and fall back to the rule default when absent.
+        """
+        n = len(batch)
+        columns = {}
+        for field_name, default in fields.items():
+            source = field_name.split('.', 1)[0]
+            if source in self.DERIVED_SOURCES:
+                columns[field_name] = inputs.get(source, {}).get(field_name, np.full(n, default))
+                continue
+            columns[field_name] = batch.column(field_name, default=default)
+        return columns
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from engines.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rules', 'fraud_rules.json')
+
+OPERATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+
+@dataclass(frozen=True)
+class Condition:
+    field: str               # '<source>.<dotted.path>', e.g. 'financials.expectedYield'
+    op: str
+    threshold: float
+    default: float = 0.0     # value used when the field is missing or not numeric
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    severity: str
+    score: float
+    detail: str              # str.format template; {0}, {1}, ... are the condition field values
+    conditions: Tuple[Condition, ...]
+    type: str = ''
+
+    @property
+    def anomaly_type(self) -> str:
+        return self.type or self.id
+
+
+@dataclass
+class RuleStats:
+    evaluations: int = 0
+    rows: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: 'RuleStats'):
+        self.evaluations += other.evaluations
+        self.rows += other.rows
+        self.hits += other.hits
+        self.seconds += other.seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'evaluations': self.evaluations,
+            'rows': self.rows,
+            'hits': self.hits,
+            'total_ms': self.seconds * 1000,
+            'mean_us_per_row': self.seconds * 1e6 / self.rows if self.rows else 0.0,
+        }
+
+
+@dataclass
+class RuleEvaluation:
+    rules: Tuple[Rule, ...]
+    masks: np.ndarray                   # (n_rules, n_rows) bool
+    scores: np.ndarray                  # (n_rows,) sum of hit rule scores
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def detail(self, rule_index: int, row: int) -> str:
+        rule = self.rules[rule_index]
+        values = [self.columns[c.field][row] for c in rule.conditions]
+        return rule.detail.format(*values)
+
+
+def parse_rules(document: Dict[str, Any]) -> Tuple[Rule, ...]:
+    """
+    Validate a {"rules": [...]} document into Rule objects
+    """
+    rules = []
+    seen = set()
+    for raw in document.get('rules', []):
+        rule_id = raw['id']
+        if rule_id in seen:
+            raise ValueError(f"Duplicate fraud rule id '{rule_id}'")
+        seen.add(rule_id)
+        severity = raw.get('severity', 'medium')
+        if severity not in SEVERITIES:
+            raise ValueError(f"Rule '{rule_id}': unknown severity '{severity}'")
+        conditions = []
+        for cond in raw['when']:
+            if cond['op'] not in OPERATORS:
+                raise ValueError(f"Rule '{rule_id}': unknown operator '{cond['op']}'")
+            if '.' not in cond['field']:
+                raise ValueError(f"Rule '{rule_id}': field '{cond['field']}' must be '<source>.<path>'")
+            conditions.append(Condition(cond['field'], cond['op'], float(cond['threshold']), float(cond.get('default', 0.0))))
+        if not conditions:
+            raise ValueError(f"Rule '{rule_id}' has no conditions")
+        rules.append(Rule(
+            id=rule_id,
+            severity=severity,
+            score=float(raw['score']),
+            detail=raw.get('detail', rule_id),
+            conditions=tuple(conditions),
+            type=raw.get('type', '')
+        ))
+    return tuple(rules)
+
+
+def load_rules_file(path: str) -> Tuple[Tuple[Rule, ...], str]:
+    """
+    Parse a rules file; returns the rules and a content fingerprint
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if path.endswith(('.yaml', '.yml')):
+        import yaml
+
+        try:
+            document = yaml.safe_load(raw)
+        except yaml.YAMLError as e:
+            raise ValueError(f'Invalid YAML in {path}: {e}') from None
+    else:
+        document = json.loads(raw)
+    return parse_rules(document), hashlib.sha1(raw).hexdigest()[:16]
+
+
+class CompiledRuleSet:
+    """
+    Rules compiled into column lookups and comparison ufuncs.
+
+    Every distinct field referenced by any rule is pulled into one float64 column
+    per batch, then each rule is a handful of vectorized comparisons AND-ed into a
+    boolean mask over the whole batch. Per-rule stats go to stats (shared with
+    the registry) under stats_lock, as evaluations run on several threads.
+    """
+
+    def __init__(self, rules: Tuple[Rule, ...], version: str = '',
+                 stats: Optional[Dict[str, RuleStats]] = None, stats_lock: Optional[threading.Lock] = None):
+        self.rules = rules
+        self.version = version
+        self.stats = stats
+        self._stats_lock = stats_lock or threading.Lock()
+        self.fields: Dict[str, float] = {}
+        for rule in rules:
+            for cond in rule.conditions:
+                self.fields.setdefault(cond.field, cond.default)
+        self._compiled = [
+            [(cond.field, OPERATORS[cond.op], cond.threshold) for cond in rule.conditions]
+            for rule in rules
+        ]
+        self.score_vector = np.array([rule.score for rule in rules], dtype=np.float64)
+
+    def evaluate_rule(self, rule_index: int, columns: Dict[str, np.ndarray], n_rows: int) -> np.ndarray:
+        """
+        Boolean hit mask of one rule; columns must hold that rule's fields
+        """
+        started = time.perf_counter()
+        mask = np.ones(n_rows, dtype=bool)
+        for field_name, op, threshold in self._compiled[rule_index]:
+            mask &= op(columns[field_name], threshold)
+        if self.stats is not None:
+            call = RuleStats(1, n_rows, int(mask.sum()), time.perf_counter() - started)
+            with self._stats_lock:
+                self.stats.setdefault(self.rules[rule_index].id, RuleStats()).add(call)
+        return mask
+
+    def evaluate(self, columns: Dict[str, np.ndarray], n_rows: int,
+                 timer: Optional[StageTimer] = None) -> RuleEvaluation:
+        masks = np.zeros((len(self.rules), n_rows), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            started = time.perf_counter()
+            masks[i] = self.evaluate_rule(i, columns, n_rows)
+            if timer is not None:
+                timer.add(f'rule.{rule.id}', time.perf_counter() - started)
+        return self.evaluation(masks, columns)
+
+    def evaluation(self, masks: np.ndarray, columns: Dict[str, np.ndarray]) -> RuleEvaluation:
+        scores = self.score_vector @ masks if len(self.rules) else np.zeros(masks.shape[1])
+        return RuleEvaluation(self.rules, masks, scores, columns)
+
+
+class FraudRuleRegistry:
+    """
+    Loads fraud rules from a JSON (or YAML) file and keeps them compiled.
+
+    The file's mtime is checked at most every refresh_interval seconds and the
+    rules are recompiled when it changes, so edits take effect without a restart.
+    A file that fails to parse is logged and the previous rule set stays active.
+
+    Rule stats count the evaluations made in this process. Process-pool workers
+    hand theirs to the API process with their results (drain_stats, then
+    merge_stats there), so /fraud/rules covers every executor mode.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULES, refresh_interval: float = 5.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._stats: Dict[str, RuleStats] = {}
+        self._stats_lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._compiled = self._compile()
+
+    @property
+    def rules(self) -> Tuple[Rule, ...]:
+        return self._compiled.rules
+
+    @property
+    def fields(self) -> Dict[str, float]:
+        return self._compiled.fields
+
+    @property
+    def version(self) -> str:
+        return self._compiled.version
+
+    def _compile(self) -> CompiledRuleSet:
+        self._mtime = os.path.getmtime(self.path)
+        self._checked_at = time.monotonic()
+        rules, version = load_rules_file(self.path)
+        return CompiledRuleSet(rules, version, self._stats, self._stats_lock)
+
+    def reload(self) -> bool:
+        """
+        Recompile from disk; returns False (keeping the active rules) if the file is invalid
+        """
+        with self._lock:
+            try:
+                self._compiled = self._compile()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error('Fraud rules reload from %s failed, keeping previous rules: %s', self.path, e)
+                return False
+            active = {rule.id for rule in self._compiled.rules}
+            with self._stats_lock:
+                for rule_id in [r for r in self._stats if r not in active]:
+                    del self._stats[rule_id]
+        return True
+
+    def refresh_if_stale(self):
+        if not self.refresh_interval or time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            changed = os.path.getmtime(self.path) != self._mtime
+        except OSError:
+            return
+        if changed:
+            self.reload()
+
+    def active(self) -> CompiledRuleSet:
+        """
+        The current compiled rule set. Callers should build their columns from
+        its fields and evaluate on the same object, so a concurrent reload
+        cannot swap the rules in between.
+        """
+        self.refresh_if_stale()
+        return self._compiled
+
+    def drain_stats(self) -> Dict[str, RuleStats]:
+        """
+        The stats gathered since the last drain, resetting them
+        """
+        with self._stats_lock:
+            drained = dict(self._stats)
+            self._stats.clear()
+        return drained
+
+    def merge_stats(self, stats: Dict[str, RuleStats]):
+        """
+        Add stats drained in another process; rules no longer active are skipped
+        """
+        active = {rule.id for rule in self.rules}
+        with self._stats_lock:
+            for rule_id, rule_stats in stats.items():
+                if rule_id in active:
+                    self._stats.setdefault(rule_id, RuleStats()).add(rule_stats)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counts = {rule_id: rule_stats.as_dict() for rule_id, rule_stats in self._stats.items()}
+        return {
+            'path': self.path,
+            'version': self.version,
+            'rules': [
+                {
+                    'id': rule.id,
+                    'severity': rule.severity,
+                    'score': rule.score,
+                    'conditions': [f'{c.field} {c.op} {c.threshold:g}' for c in rule.conditions],
+                    **counts.get(rule.id, RuleStats().as_dict())
+                }
+                for rule in self.rules
+            ]
+        }
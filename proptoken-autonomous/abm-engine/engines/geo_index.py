@@ -0,0 +1,151 @@
+"""
+Static nearest-neighbour index over lat/lng points.
+
+Points are bucketed into a uniform grid of cell_m wide cells and stored sorted
+by (row, column) cell key. Inside one grid row the cells of a query box are
+contiguous in that order, so a box query is one slice per row, found with
+searchsorted. There are no per-cell Python objects, which keeps a million-point
+index to a few arrays that build in well under a second.
+"""
+import math
+import numpy as np
+from typing import Tuple
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE = 111_320.0
+
+
+def haversine_m(lat, lng, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances in meters; lat/lng may be scalars or arrays matching lats/lngs
+    """
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGrid:
+    """
+    k-nearest-within-radius search over a fixed set of points
+    """
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, cell_m: float = 250.0, max_candidates: int = 256):
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_m = cell_m
+        self.max_candidates = max_candidates
+        self._cell_deg = cell_m / METERS_PER_DEGREE
+        self._n_cols = int(math.ceil(360 / self._cell_deg))
+        keys = self._rows(lats) * self._n_cols + self._cols(lngs)
+        self.order = np.argsort(keys, kind='stable')    # grid position -> input row
+        self._keys = keys[self.order]
+        self._lats = lats[self.order]
+        self._lngs = lngs[self.order]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _rows(self, lats):
+        return np.floor((np.asarray(lats) + 90) / self._cell_deg).astype(np.int64)
+
+    def _cols(self, lngs):
+        cols = np.floor((np.asarray(lngs) + 180) / self._cell_deg).astype(np.int64)
+        return np.minimum(cols, self._n_cols - 1)    # lng == 180 shares the last column
+
+    def _ranges(self, lats: np.ndarray, lngs: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Grid slices covering the box of half-width radius_m around each query
+        point, as (query, start, count) per slice
+        """
+        n_cols, last = self._n_cols, self._n_cols - 1
+        rows = np.floor((lats + 90) / self._cell_deg).astype(np.int64)
+        cols = np.minimum(np.floor((lngs + 180) / self._cell_deg).astype(np.int64), last)
+        row_span = math.ceil(radius_m / self.cell_m)
+        # Longitude degrees shrink towards the poles; widen the column span to cover the radius
+        edge_lats = np.minimum(np.abs(lats) + row_span * self._cell_deg, 90.0)
+        col_spans = np.minimum(np.ceil(row_span / np.maximum(np.cos(np.radians(edge_lats)), 1e-6)), n_cols)
+        col_spans = col_spans.astype(np.int64)
+
+        # Each grid row covers [first, end] plus, across the antimeridian, a wrapped [wrap_first, wrap_end]
+        whole = 2 * col_spans >= last
+        low, high = cols - col_spans, cols + col_spans
+        first = np.where(whole, 0, np.maximum(low, 0))
+        end = np.where(whole, last, np.minimum(high, last))
+        wraps_west, wraps_east = ~whole & (low < 0), ~whole & (low >= 0) & (high > last)
+        wrap_first = np.where(wraps_west, low + n_cols, np.where(wraps_east, 0, 1))    # 1 > 0: empty
+        wrap_end = np.where(wraps_west, last, np.where(wraps_east, high - n_cols, 0))
+
+        offsets = np.arange(-row_span, row_span + 1, dtype=np.int64) * n_cols
+        base = (rows * n_cols)[:, None] + offsets                          # (n_queries, n_rows)
+        lower = np.concatenate([base + first[:, None], base + wrap_first[:, None]], axis=1).ravel()
+        upper = np.concatenate([base + end[:, None], base + wrap_end[:, None]], axis=1).ravel()
+        # Keys are integers, so key <= upper is key < upper + 1
+        starts = np.searchsorted(self._keys, lower)
+        counts = np.maximum(np.searchsorted(self._keys, upper + 1) - starts, 0)
+        return np.repeat(np.arange(len(lats)), 2 * len(offsets)), starts, counts
+
+    def _within(self, lats: np.ndarray, lngs: np.ndarray, queries: np.ndarray, starts: np.ndarray,
+                counts: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Expand slices into (query, grid position, distance), keeping points within radius_m
+        total = int(counts.sum())
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        queries = np.repeat(queries, counts)
+        distances = haversine_m(lats[queries], lngs[queries], self._lats[positions], self._lngs[positions])
+        within = distances <= radius_m
+        return queries[within], positions[within], distances[within]
+
+    def nearest_batch(self, lats: np.ndarray, lngs: np.ndarray, k: int,
+                      radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Up to k points within radius_m of each query point, as flat (query,
+        input row, distance in m) arrays ordered by query, nearest first.
+
+        Queries with at most max_candidates points in their radius box are
+        ranked directly. The rest (dense areas) search a box of growing size,
+        doubling from one cell, and finish as soon as k points lie within the
+        box's half-width; each step handles all unfinished queries at once.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        n = len(lats)
+        if not n or not len(self._keys):
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, np.empty(0)
+
+        queries, starts, counts = self._ranges(lats, lngs, radius_m)
+        direct = np.bincount(queries, weights=counts, minlength=n) <= max(self.max_candidates, k)
+        take = direct[queries]
+        found = [self._within(lats, lngs, queries[take], starts[take], counts[take], radius_m)]
+
+        pending = np.flatnonzero(~direct)
+        search_m = min(self.cell_m, radius_m)
+        while len(pending):
+            if search_m >= radius_m:
+                # Dense boxes with fewer than k points inside the radius itself
+                take = np.zeros(n, dtype=bool)
+                take[pending] = True
+                take = take[queries]
+                found.append(self._within(lats, lngs, queries[take], starts[take], counts[take], radius_m))
+                break
+            local, local_starts, local_counts = self._ranges(lats[pending], lngs[pending], search_m)
+            step = self._within(lats, lngs, pending[local], local_starts, local_counts, search_m)
+            finished = np.bincount(step[0], minlength=n) >= k
+            keep = finished[step[0]]
+            found.append(tuple(values[keep] for values in step))
+            pending = pending[~finished[pending]]
+            search_m = min(search_m * 2, radius_m)
+
+        queries, positions, distances = (np.concatenate(parts) for parts in zip(*found))
+        ranked = np.lexsort((distances, queries))
+        queries, positions, distances = queries[ranked], positions[ranked], distances[ranked]
+        # Rank within each query's run; keep the first k
+        top = np.arange(len(queries)) - np.searchsorted(queries, queries) < k
+        return queries[top], self.order[positions[top]], distances[top]
+
+    def nearest(self, lat: float, lng: float, k: int, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Input rows and distances (m) of up to k points within radius_m, nearest first
+        """
+        _, rows, distances = self.nearest_batch(np.array([lat]), np.array([lng]), k, radius_m)
+        return rows, distances
@@ -1,7 +1,36 @@
 import numpy as np
-import pandas as pd
 from dataclasses import dataclass
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from engines.cashflow import cash_flow_metrics
+from engines.comparables import ComparablesProvider, DatasetComparablesProvider
+from engines.records import RecordBatch
+from engines.stage_graph import Columns, GraphRun, Stage, StageGraph, StageMemo
+from engines.stress import MonteCarloStressTester
+from engines.timing import StageTimer
+from engines.valuation import ValuationAdjustments
+from engines.versioning import provenance
+
+# Sensitivity grid axes, in result array dimension order
+SENSITIVITY_AXES = ('rent_change', 'occupancy', 'price_shock', 'expected_yield')
+
+
+def nav_range(mean_price, std_price, size, multiplier) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (min, max) NAV: price per sqft one std either side of the mean, times size and
+    the valuation multiplier. Arguments broadcast, so a grid of prices works too.
+    """
+    return (mean_price - std_price) * size * multiplier, (mean_price + std_price) * size * multiplier
+
+
+def yield_band(noi, spread, nav_min, nav_max) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (min, max) yield in percent: NOI less / plus its spread over the high / low NAV.
+    Arguments broadcast.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((noi - spread) / nav_max) * 100, ((noi + spread) / nav_min) * 100
+
 
 @dataclass
 class MarketAnalysis:
@@ -15,68 +44,290 @@ class MarketIntelligenceEngine:
     """
     Analyze market conditions and asset valuation
     """
-    
+
+    DEFAULT_CAP_RATE = 0.06
+    MAX_NOI_SPREAD = 0.5  # cap on how far cash-flow volatility widens the yield band
+    MAX_NOI_RATIO = 3.0   # trailing NOI further than this factor from the stated NOI is not trusted
+
+    def __init__(self, comparables: Optional[ComparablesProvider] = None,
+                 stress_tester: Optional[MonteCarloStressTester] = None,
+                 adjustments: Optional[ValuationAdjustments] = None):
+        self.comparables = comparables or DatasetComparablesProvider()
+        self.stress_tester = stress_tester or MonteCarloStressTester()
+        self.adjustments = adjustments or ValuationAdjustments()
+        # Inputs must list every request field a stage reads: they key the memo
+        self.graph = StageGraph('market', [
+            Stage('comparables', self._comparables_stage,
+                  inputs=('location.postalCode', 'location.city', 'location.coordinates'),
+                  version=lambda: getattr(self.comparables, 'version', '')),
+            Stage('nav', self._nav_stage,
+                  inputs=('asset_data.specifications.size', 'asset_data.specifications.age',
+                          'asset_data.specifications.type', 'asset_data.specifications.condition',
+                          'oracle_data.existence.satellite.condition'),
+                  depends=('comparables',), version=lambda: self.adjustments.version),
+            Stage('stress', self._stress_stage, inputs=('financials.expectedYield', 'financials.occupancyRate'),
+                  depends=('nav',), version=lambda: self.stress_tester.version),
+            Stage('cashflow', self._cash_flow_stage, inputs=('financials.historicalCashFlow',)),
+            Stage('yield', self._yield_stage, inputs=('financials.cashFlow', 'financials.expectedYield'),
+                  depends=('nav', 'cashflow')),
+        ])
+
     def analyze(self, asset_data: Dict, location: Dict, financials: Dict, oracle_data: Dict) -> Dict[str, Any]:
         """
         Full market analysis
         """
-        # Mocking comparable search
-        comparables = self._get_mock_comparables(location)
-        
-        # Calculate NAV range
-        nav_range = self._calculate_nav_range(asset_data, comparables, oracle_data)
-        
-        # Stress test
-        downside_nav = self._stress_test(nav_range)
-        
-        # Yield analysis
-        yield_band = self._calculate_yield_band(financials, nav_range)
-        
+        return self.analyze_batch([asset_data], [location], [financials], [oracle_data])[0]
+
+    def analyze_batch(self, asset_data: List[Dict], locations: List[Dict],
+                      financials: List[Dict], oracle_data: List[Dict],
+                      timer: Optional[StageTimer] = None) -> List[Dict[str, Any]]:
+        """
+        Market analysis over a batch of assets given as request dicts
+        """
+        timer = timer or StageTimer()
+        with timer.stage('records'):
+            batch = RecordBatch.from_dicts(asset_data, locations, financials, oracle_data)
+        return self.analyze_records(batch, timer)
+
+    def analyze_records(self, batch: RecordBatch, timer: Optional[StageTimer] = None,
+                        memo: Optional[StageMemo] = None) -> List[Dict[str, Any]]:
+        """
+        Market analysis over a RecordBatch. Every stage works on column
+        arrays (one row per asset) rather than per-asset dicts.
+        Stage wall times are added to timer when one is passed.
+        """
+        timer = timer or StageTimer()
+        run = self.run_stages(batch, timer, memo)
+        with timer.stage('results'):
+            return self.build_results(run)
+
+    def run_stages(self, batch: RecordBatch, timer: Optional[StageTimer] = None,
+                   memo: Optional[StageMemo] = None) -> GraphRun:
+        """
+        Run the stage graph: comparables -> nav -> stress, cashflow -> yield.
+        With a memo, stages whose inputs are unchanged since an earlier run
+        are served from it (see engines.stage_graph).
+        """
+        return self.graph.run(batch, timer, memo)
+
+    def replay_stages(self, batch: RecordBatch, recorded: Dict[str, Columns],
+                      timer: Optional[StageTimer] = None) -> GraphRun:
+        """
+        Re-run each stage on the recorded outputs of its upstream stages, with
+        the recorded stress path counts (see StageGraph.replay)
+        """
+        row_inputs = {'stress_paths': recorded['stress']['paths']} if 'stress' in recorded else None
+        return self.graph.replay(batch, recorded, timer, row_inputs)
+
+    def provenance(self) -> Dict[str, Any]:
+        """
+        Engine version, config hash and seed of the results this engine produces
+        now (see engines.versioning). The stress time budget is left out: it only
+        changes path counts, which every result reports.
+        """
+        return provenance({
+            'comparables': getattr(self.comparables, 'version', ''),
+            'valuation': self.adjustments.version,
+            'stress': self.stress_tester.version,
+        }, self.stress_tester.seed)
+
+    def build_results(self, run: GraphRun) -> List[Dict[str, Any]]:
+        outputs = run.outputs
+        comparables, nav, stress, yield_band = outputs['comparables'], outputs['nav'], outputs['stress'], outputs['yield']
+        nav_mean = (nav['min'] + nav['max']) / 2
+        cash_flow_rows = self._cash_flow_rows(outputs['cashflow'])
+        stamp = self.provenance()
+        return [
+            {
+                'expected_nav': {
+                    'min': nav_min,
+                    'max': nav_max,
+                    'mean': mean
+                },
+                'downside_nav': downside,
+                'yield_band': {
+                    'min': yield_min,
+                    'max': yield_max,
+                    'noi_source': noi_source
+                },
+                'tail_risk': tail_risk,
+                'stress': {
+                    'var': downside,
+                    'cvar': cvar,
+                    'tail_loss': tail_loss,
+                    'confidence': self.stress_tester.confidence,
+                    'paths': paths
+                },
+                'valuation_adjustment': {
+                    'condition': condition,
+                    'age': age,
+                    'type': asset_type,
+                    'multiplier': multiplier
+                },
+                'comparables': {
+                    'method': 'nearby' if nearby else 'area',
+                    'nearby_count': nearby_count
+                },
+                'cash_flow': cash_flow_row,
+                'market_depth': 'Sufficient',
+                'provenance': stamp
+            }
+            for (nav_min, nav_max, mean, condition, age, asset_type, multiplier, downside, cvar, tail_loss, tail_risk,
+                 paths, yield_min, yield_max, noi_source, nearby, nearby_count, cash_flow_row)
+            in zip(
+                nav['min'].tolist(), nav['max'].tolist(), nav_mean.tolist(),
+                nav['condition'].tolist(), nav['age'].tolist(), nav['type'].tolist(), nav['multiplier'].tolist(),
+                stress['var'].tolist(), stress['cvar'].tolist(), stress['tail_loss'].tolist(),
+                stress['tail_risk'].tolist(), stress['paths'].tolist(),
+                yield_band['min'].tolist(), yield_band['max'].tolist(), yield_band['noi_source'].tolist(),
+                comparables['nearby'].tolist(), comparables['nearby_count'].tolist(), cash_flow_rows
+            )
+        ]
+
+    @staticmethod
+    def _cash_flow_rows(cash_flow: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        # NaN (history too short) becomes None; months is a count
+        names = list(cash_flow)
+        columns = [
+            [int(v) for v in values.tolist()] if name == 'months' else
+            [None if v != v else v for v in values.tolist()]
+            for name, values in cash_flow.items()
+        ]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def sensitivity(self, batch: RecordBatch, grid: Dict[str, Sequence[float]],
+                    timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        """
+        NAV and yield band of the first asset in batch over the Cartesian product of
+        the grid axes (SENSITIVITY_AXES; a missing or empty axis is the submitted value):
+
+          rent_change     fractional change in rental income (NOI), e.g. -0.1
+          occupancy       occupancy rate in percent; NOI scales with it relative to the
+                          submitted rate (an unknown rate counts as 100)
+          price_shock     fractional change in comparable prices per sqft
+          expected_yield  cap rate in percent; NAV is revalued by submitted / new cap
+                          rate, as in the stress test
+
+        The axes are broadcast through the same nav_range / yield_band math as the
+        engine stages, so the whole grid is a handful of array operations. Results
+        are dense arrays with one dimension per axis.
+        """
+        timer = timer or StageTimer()
+        run = self.run_stages(batch, timer)
+        with timer.stage('sensitivity'):
+            outputs = run.outputs
+            comparables, nav = outputs['comparables'], outputs['nav']
+            cap_rate, occupancy = (float(values[0]) for values in self.stress_inputs(batch))
+            noi, spread, _ = (values[0] for values in self._noi(batch, nav, outputs['cashflow']))
+            noi, spread = float(noi), float(spread)
+            base_occupancy = occupancy if occupancy > 0 else 100.0
+            defaults = {'rent_change': 0.0, 'occupancy': base_occupancy, 'price_shock': 0.0,
+                        'expected_yield': cap_rate * 100}
+            axes = {
+                name: np.asarray(grid.get(name) or [defaults[name]], dtype=np.float64)
+                for name in SENSITIVITY_AXES
+            }
+            rent, occupancy_grid, price, expected_yield = (
+                values.reshape([-1 if i == axis else 1 for i in range(len(axes))])
+                for axis, values in enumerate(axes.values())
+            )
+            shape = tuple(len(values) for values in axes.values())
+
+            price_factor = 1 + price
+            nav_min, nav_max = nav_range(comparables['mean'][0] * price_factor, comparables['std'][0] * price_factor,
+                                         batch.column('asset_data.specifications.size', default=1000)[0],
+                                         nav['multiplier'][0])
+            rate_factor = cap_rate / (expected_yield / 100)
+            nav_min, nav_max = nav_min * rate_factor, nav_max * rate_factor
+            income = (1 + rent) * occupancy_grid / base_occupancy
+            yield_min, yield_max = yield_band(noi * income, spread * income, nav_min, nav_max)
+            return {
+                'axes': {name: values.tolist() for name, values in axes.items()},
+                'shape': list(shape),
+                'expected_nav': {'min': np.broadcast_to(nav_min, shape).copy(),
+                                 'max': np.broadcast_to(nav_max, shape).copy()},
+                'yield_band': {'min': np.broadcast_to(yield_min, shape).copy(),
+                               'max': np.broadcast_to(yield_max, shape).copy()},
+                'base': self.build_results(run)[0],
+            }
+
+    def stress_inputs(self, batch: RecordBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cap rate (expected yield, or the default) and occupancy in percent (0 = unknown) per asset
+        """
+        cap_rate = batch.column('financials.expectedYield') / 100
+        cap_rate = np.where(cap_rate > 0, cap_rate, self.DEFAULT_CAP_RATE)
+        return cap_rate, batch.column('financials.occupancyRate')
+
+    # Stage functions: (batch, {upstream stage: columns}) -> columns
+
+    def _comparables_stage(self, batch: RecordBatch, inputs) -> Columns:
+        # Mean and std of comparable prices per sqft for each location: distance-weighted
+        # over the nearest comparables when there are enough around the coordinates,
+        # else over the postal code / city group
+        mean_price, std_price = self.comparables.stats(batch.source('location'))
+        near_mean, near_std, near_count = self.comparables.nearby(batch.array('lat'), batch.array('lng'))
+        nearby = ~np.isnan(near_mean)
         return {
-            'expected_nav': {
-                'min': nav_range[0],
-                'max': nav_range[1],
-                'mean': np.mean(nav_range)
-            },
-            'downside_nav': downside_nav,
-            'yield_band': {
-                'min': yield_band[0],
-                'max': yield_band[1]
-            },
-            'tail_risk': 'Medium',
-            'market_depth': 'Sufficient'
+            'mean': np.where(nearby, near_mean, mean_price),
+            'std': np.where(nearby, near_std, std_price),
+            'nearby': nearby,
+            'nearby_count': near_count,
         }
-    
-    def _get_mock_comparables(self, location):
-        """
-        Return mock comparables based on location
-        """
-        base_price = 10000 if 'New York' in str(location) else 5000
-        return [{'price_per_sqft': base_price * (1 + np.random.normal(0, 0.1))} for _ in range(10)]
-    
-    def _calculate_nav_range(self, asset_data, comparables, oracle_data):
-        prices = [c['price_per_sqft'] for c in comparables]
-        mean_price = np.mean(prices)
-        std_price = np.std(prices)
-        
-        size = asset_data.get('specifications', {}).get('size', 1000)
-        # Apply a condition multiplier from oracle data if available (e.g. good condition)
-        multiplier = 1.0 
-        
-        min_nav = (mean_price - std_price) * size * multiplier
-        max_nav = (mean_price + std_price) * size * multiplier
-        return (min_nav, max_nav)
-    
-    def _stress_test(self, nav_range):
-        # Simple 20% shock
-        return np.mean(nav_range) * 0.8
-        
-    def _calculate_yield_band(self, financials, nav_range):
-        # Cap rate = NOI / Value
-        noi = financials.get('cashFlow', 0) * 12 # assuming monthly CF provided or derived
-        if noi == 0:
-             noi = financials.get('expectedYield', 0)/100 * np.mean(nav_range)
-
-        min_yield = (noi / nav_range[1]) * 100
-        max_yield = (noi / nav_range[0]) * 100
-        return (min_yield, max_yield)
+
+    def _nav_stage(self, batch: RecordBatch, inputs) -> Columns:
+        comparables = inputs['comparables']
+        mean_price, std_price = comparables['mean'], comparables['std']
+
+        size = batch.column('asset_data.specifications.size', default=1000)
+        # Condition (as observed by the satellite oracle when available), age and type factors
+        factors = self.adjustments.factors(batch)
+        multiplier = factors['multiplier']
+
+        min_nav, max_nav = nav_range(mean_price, std_price, size, multiplier)
+        return {'min': min_nav, 'max': max_nav, **factors}
+
+    def _stress_stage(self, batch: RecordBatch, inputs) -> Columns:
+        # Monte Carlo over correlated price / occupancy / rate shocks
+        nav = inputs['nav']
+        cap_rate, occupancy = self.stress_inputs(batch)
+        # stress_paths (replay only) pins the recorded per-asset path counts
+        result = self.stress_tester.run((nav['min'] + nav['max']) / 2, cap_rate, occupancy, inputs.get('stress_paths'))
+        return {'var': result.var, 'cvar': result.cvar, 'tail_loss': result.tail_loss,
+                'tail_risk': result.tail_risk, 'paths': result.paths}
+
+    def _cash_flow_stage(self, batch: RecordBatch, inputs) -> Columns:
+        # Trailing NOI, volatility etc. from the historical cash-flow series
+        return cash_flow_metrics(batch)
+
+    def _yield_stage(self, batch: RecordBatch, inputs) -> Columns:
+        nav = inputs['nav']
+        noi, spread, source = self._noi(batch, nav, inputs['cashflow'])
+        min_yield, max_yield = yield_band(noi, spread, nav['min'], nav['max'])
+        return {'min': min_yield, 'max': max_yield, 'noi_source': source}
+
+    def _noi(self, batch: RecordBatch, nav: Columns, cash_flow: Columns) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Cap rate = NOI / Value. NOI is the trailing twelve months from the cash-flow
+        # history when there is one, else the stated monthly cash flow annualised,
+        # else implied by the expected yield. History entries are monthly amounts; a
+        # trailing NOI more than MAX_NOI_RATIO off the stated one (e.g. annual figures
+        # entered as months) is set aside for the stated NOI.
+        stated_noi = batch.column('financials.cashFlow') * 12
+        fallback_noi = batch.column('financials.expectedYield') / 100 * (nav['min'] + nav['max']) / 2
+        implied = stated_noi == 0
+        stated_noi = np.where(implied, fallback_noi, stated_noi)
+        trailing_noi = cash_flow['trailing_noi']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(stated_noi != 0, np.abs(trailing_noi / stated_noi), np.nan)
+        # Nothing stated to check against (NaN ratio): the history is all there is
+        plausible = ~((ratio > self.MAX_NOI_RATIO) | (ratio < 1 / self.MAX_NOI_RATIO))
+        has_history = ~np.isnan(trailing_noi)
+        from_history = has_history & plausible
+        noi = np.where(from_history, trailing_noi, stated_noi)
+        source = np.select([from_history, has_history, implied], ['history', 'history_rejected', 'expected_yield'],
+                           'cash_flow')
+
+        # Volatile histories widen the band around NOI, when it comes from them
+        volatility = np.where(from_history, np.nan_to_num(cash_flow['noi_volatility']), 0.0)
+        spread = np.clip(volatility, 0.0, self.MAX_NOI_SPREAD) * np.abs(noi)
+        return noi, spread, source
@@ -0,0 +1,246 @@
+"""
+Portfolio analysis over many holdings.
+
+Every holding is analysed in one MarketIntelligenceEngine pass over a single
+RecordBatch, then aggregated: NAV, concentration by city and asset type, and a
+portfolio stress test.
+
+The stress test uses a factor model of price returns. An asset's price shock
+on a path is
+
+    global + city factor + type factor + idiosyncratic
+
+The global price, occupancy and rate shocks are the stress tester's shared
+paths. The city and type factor columns are drawn once per city / type name
+from a seed derived from that name, so they are the same across calls. Two
+holdings in the same city therefore share that column, and their covariance is
+global_vol^2 + city_vol^2 (+ type_vol^2 if the type also matches). Holdings in
+different cities and types only share the global factor.
+
+Idiosyncratic shocks are independent, so their portfolio-level sum is normal
+with variance sum((value_i * idiosyncratic_vol)^2). It is added as one shared
+column instead of an (assets x paths) draw. This is a first-order
+approximation: it ignores how those shocks interact with the occupancy and
+rate factors.
+"""
+import threading
+import zlib
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from engines.comparables import location_keys
+from engines.market_intelligence import MarketIntelligenceEngine
+from engines.records import RecordBatch
+from engines.stress import TAIL_RISK_BUCKETS
+from engines.timing import StageTimer
+from engines.versioning import provenance
+
+UNKNOWN = 'unknown'
+
+
+def _group(keys: Sequence[str], values: np.ndarray) -> Tuple[List[Dict[str, Any]], float]:
+    # Value, weight and holding count per key, largest first, plus the Herfindahl index
+    names, inverse = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(names))
+    counts = np.bincount(inverse, minlength=len(names))
+    total = totals.sum()
+    weights = totals / total if total > 0 else np.zeros(len(names))
+    order = np.argsort(-totals, kind='stable')
+    groups = [
+        {'name': name, 'value': value, 'weight': weight, 'holdings': count}
+        for name, value, weight, count in zip(names[order].tolist(), totals[order].tolist(),
+                                              weights[order].tolist(), counts[order].tolist())
+    ]
+    return groups, float(np.sum(weights ** 2))
+
+
+class PortfolioAnalyzer:
+    """
+    Aggregate NAV, concentration and correlated stress for a set of holdings
+    """
+
+    def __init__(self, market: MarketIntelligenceEngine, city_vol: float = 0.04, type_vol: float = 0.03,
+                 idiosyncratic_vol: float = 0.06, max_cached_factors: int = 4096):
+        self.market = market
+        self.stress_tester = market.stress_tester
+        self.city_vol = city_vol
+        self.type_vol = type_vol
+        self.idiosyncratic_vol = idiosyncratic_vol
+        self.max_cached_factors = max_cached_factors
+        self._factors: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        rng = np.random.default_rng([self.stress_tester.seed, zlib.crc32(b'idiosyncratic')])
+        self._idiosyncratic = rng.standard_normal(self.stress_tester.n_paths)
+
+    def _factor(self, kind: str, name: str) -> np.ndarray:
+        # Unit-variance shock column for one city / type, the same for every call
+        key = f'{kind}:{name}'
+        with self._lock:
+            column = self._factors.get(key)
+            if column is not None:
+                self._factors.move_to_end(key)
+                return column
+        rng = np.random.default_rng([self.stress_tester.seed, zlib.crc32(key.encode())])
+        column = rng.standard_normal(self.stress_tester.n_paths)
+        with self._lock:
+            self._factors[key] = column
+            while len(self._factors) > self.max_cached_factors:
+                self._factors.popitem(last=False)
+        return column
+
+    def _factor_matrix(self, kind: str, keys: Sequence[str], vol: float) -> Tuple[np.ndarray, np.ndarray]:
+        # (n_names, n_paths) scaled factor columns and each holding's row in it
+        names, inverse = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+        if not vol:
+            return np.zeros((len(names), self.stress_tester.n_paths)), inverse
+        return np.stack([self._factor(kind, name) for name in names.tolist()]) * vol, inverse
+
+    def analyze(self, batch: RecordBatch, shares: np.ndarray, ids: Sequence[str],
+                timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        """
+        Analyse the holdings in batch. shares are the fraction of each asset
+        held (0-1], ids label the holdings in the result.
+        """
+        timer = timer or StageTimer()
+        shares = np.asarray(shares, dtype=np.float64)
+        run = self.market.run_stages(batch, timer)
+        nav, stress = run.outputs['nav'], run.outputs['stress']
+        nav_mean = (nav['min'] + nav['max']) / 2
+        values = shares * nav_mean
+
+        with timer.stage('concentration'):
+            cities = [location_keys(r.location)[1] or UNKNOWN for r in batch.records]
+            types = [r.asset_type.strip().lower() or UNKNOWN for r in batch.records]
+            total = values.sum()
+            weights = values / total if total > 0 else np.zeros(len(values))
+            by_city, city_hhi = _group(cities, values)
+            by_type, type_hhi = _group(types, values)
+            concentration = {
+                'largest_holding': float(weights.max()) if len(weights) else 0.0,
+                'hhi': {'holdings': float(np.sum(weights ** 2)), 'cities': city_hhi, 'types': type_hhi},
+                'by_city': by_city,
+                'by_type': by_type,
+            }
+
+        with timer.stage('portfolio_stress'):
+            cap_rate, occupancy = self.market.stress_inputs(batch)
+            portfolio_stress, contributions = self._stress(nav_mean, cap_rate, occupancy, shares, cities, types)
+
+        with timer.stage('results'):
+            holdings = [
+                {
+                    'id': holding_id,
+                    'share': share,
+                    'value': value,
+                    'weight': weight,
+                    'city': city,
+                    'type': asset_type,
+                    'expected_nav': mean,
+                    'downside_nav': downside,
+                    'tail_risk': tail_risk,
+                    'tail_contribution': contribution
+                }
+                for holding_id, share, value, weight, city, asset_type, mean, downside, tail_risk, contribution
+                in zip(ids, shares.tolist(), values.tolist(), weights.tolist(), cities, types, nav_mean.tolist(),
+                       stress['var'].tolist(), stress['tail_risk'].tolist(), contributions.tolist())
+            ]
+            return {
+                'holdings': len(holdings),
+                'nav': {
+                    'min': float(np.sum(shares * nav['min'])),
+                    'max': float(np.sum(shares * nav['max'])),
+                    'mean': float(total)
+                },
+                'concentration': concentration,
+                'stress': portfolio_stress,
+                'assets': holdings,
+                'provenance': self.provenance(),
+            }
+
+    def provenance(self) -> Dict[str, Any]:
+        """
+        The market engine's provenance, extended with the factor model settings
+        """
+        market = self.market.provenance()
+        return provenance({
+            **market['components'],
+            'portfolio': [self.city_vol, self.type_vol, self.idiosyncratic_vol],
+        }, market['seed'])
+
+    def _stress(self, nav: np.ndarray, cap_rate: np.ndarray, occupancy: np.ndarray, shares: np.ndarray,
+                cities: Sequence[str], types: Sequence[str]) -> Tuple[Dict[str, Any], np.ndarray]:
+        """
+        Portfolio VaR / CVaR over the shared shock paths, and each holding's
+        contribution to the tail loss (they sum to the portfolio's base - CVaR)
+        """
+        tester = self.stress_tester
+        shocks, n_paths = tester.shocks, tester.n_paths
+        values = shares * nav
+        base = float(values.sum())
+        city_shocks, city_rows = self._factor_matrix('city', cities, self.city_vol)
+        type_shocks, type_rows = self._factor_matrix('type', types, self.type_vol)
+
+        # Price enters the revaluation linearly and holdings with the same (city, type)
+        # share their price offset, so the paths only need per-segment sums of the
+        # holdings' unpriced (occupancy x rate) revaluations, taken in segment order
+        n_types = len(type_shocks)
+        segment_keys = city_rows * n_types + type_rows
+        order = np.argsort(segment_keys, kind='stable')
+        keys = segment_keys[order]
+        segments = np.unique(keys)
+        unpriced = shocks.copy()
+        unpriced[:, 0] = 0
+        sums = np.zeros((len(segments), n_paths))
+        chunk = max(1, tester.max_cells // n_paths)
+        for start in range(0, len(nav), chunk):
+            rows, chunk_keys = order[start:start + chunk], keys[start:start + chunk]
+            unpriced_values = tester.revalue(values[rows], cap_rate[rows], occupancy[rows], unpriced)
+            bounds = np.flatnonzero(np.r_[True, chunk_keys[1:] != chunk_keys[:-1]])
+            sums[np.searchsorted(segments, chunk_keys[bounds])] += np.add.reduceat(unpriced_values, bounds, axis=0)
+
+        portfolio = (1 + shocks[:, 0]) * sums.sum(axis=0)
+        for start in range(0, len(segments), chunk):
+            segment = segments[start:start + chunk]
+            offsets = city_shocks[segment // n_types] + type_shocks[segment % n_types]
+            portfolio += np.einsum('sp,sp->p', offsets, sums[start:start + chunk])
+        idiosyncratic_sigma = float(np.sqrt(np.sum((values * self.idiosyncratic_vol) ** 2)))
+        portfolio += idiosyncratic_sigma * self._idiosyncratic
+
+        k = int((1 - tester.confidence) * n_paths)
+        tail = np.argpartition(portfolio, k)[:k + 1]
+        var = float(portfolio[tail].max())
+        cvar = float(portfolio[tail].mean())
+        tail_loss = 1 - cvar / base if base > 0 else 0.0
+        returns = portfolio / base - 1 if base > 0 else np.zeros(n_paths)
+
+        # Euler allocation: each holding's mean loss over the tail paths, with the
+        # idiosyncratic part split in proportion to its variance
+        contributions = np.zeros(len(nav))
+        chunk = max(1, tester.max_cells // len(tail))
+        for start in range(0, len(nav), chunk):
+            rows = np.arange(start, min(len(nav), start + chunk))
+            offsets = city_shocks[:, tail][city_rows[rows]] + type_shocks[:, tail][type_rows[rows]]
+            tail_values = tester.revalue(values[rows], cap_rate[rows], occupancy[rows], shocks[tail], offsets)
+            contributions[rows] = values[rows] - tail_values.mean(axis=1)
+        idiosyncratic_loss = -idiosyncratic_sigma * float(self._idiosyncratic[tail].mean())
+        squared = values ** 2
+        if squared.sum() > 0:
+            contributions += idiosyncratic_loss * squared / squared.sum()
+
+        bucket = int(np.searchsorted(np.asarray(tester.tail_thresholds), tail_loss, side='right'))
+        return {
+            'var': var,
+            'cvar': cvar,
+            'tail_loss': tail_loss,
+            'tail_risk': TAIL_RISK_BUCKETS[bucket],
+            'volatility': float(returns.std()),
+            'confidence': tester.confidence,
+            'paths': n_paths,
+            'factor_vols': {
+                'global': float(tester.vols[0]),
+                'city': self.city_vol,
+                'type': self.type_vol,
+                'idiosyncratic': self.idiosyncratic_vol
+            },
+        }, contributions
@@ -0,0 +1,202 @@
+import math
+import numpy as np
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from engines.columns import column
+
+NAN = math.nan
+
+
+def _number(value: Any) -> float:
+    if value.__class__ is float:
+        return value
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else ''
+
+
+@dataclass(slots=True)
+class AssetRecord:
+    """
+    One analysis request flattened into typed fields, built once per asset.
+
+    Missing numbers are NaN (engines apply their own defaults per column). The
+    source dicts are kept by reference for the few consumers that need the
+    nested shape (comparables location keys, rule fields outside RECORD_PATHS).
+    The cash-flow history is left as submitted; engines.cashflow packs it for
+    the whole batch at once.
+    """
+    size: float
+    claimed_value: float
+    age: float
+    asset_type: str
+    condition: str
+    observed_condition: str     # oracle_data.existence.satellite.condition
+    lat: float
+    lng: float
+    current_rent: float
+    cash_flow: float
+    expected_yield: float
+    annual_expenses: float
+    occupancy_rate: float
+    satellite_size: float       # oracle_data.existence.satellite.estimated_size
+    cash_flow_history: Sequence[Any]
+    asset_data: Dict[str, Any]
+    location: Dict[str, Any]
+    financials: Dict[str, Any]
+    oracle_data: Dict[str, Any]
+
+    @classmethod
+    def from_dicts(cls, asset_data: Dict, location: Dict, financials: Dict, oracle_data: Dict) -> 'AssetRecord':
+        # Positional construction and direct .get calls: this runs once per asset per batch
+        specifications = asset_data.get('specifications')
+        if not isinstance(specifications, dict):
+            specifications = {}
+        coordinates = location.get('coordinates')
+        if isinstance(coordinates, (list, tuple)) and len(coordinates) == 2:
+            lat, lng = coordinates
+        elif isinstance(coordinates, dict):
+            lat, lng = coordinates.get('lat'), coordinates.get('lng')
+        else:
+            lat = lng = None
+        existence = oracle_data.get('existence')
+        satellite = existence.get('satellite') if isinstance(existence, dict) else None
+        if not isinstance(satellite, dict):
+            satellite = {}
+        history = financials.get('historicalCashFlow')
+        get = financials.get
+        return cls(
+            _number(specifications.get('size')),
+            _number(asset_data.get('claimedValue')),
+            _number(specifications.get('age')),
+            _text(specifications.get('type')),
+            _text(specifications.get('condition')),
+            _text(satellite.get('condition')),
+            _number(lat),
+            _number(lng),
+            _number(get('currentRent')),
+            _number(get('cashFlow')),
+            _number(get('expectedYield')),
+            _number(get('annualExpenses')),
+            _number(get('occupancyRate')),
+            _number(satellite.get('estimated_size')),
+            history if isinstance(history, (list, tuple)) else (),
+            asset_data,
+            location,
+            financials,
+            oracle_data,
+        )
+
+
+# Dotted source paths (as used by fraud rules and feature definitions) served
+# straight from AssetRecord attributes
+RECORD_PATHS: Dict[str, str] = {
+    'asset_data.specifications.size': 'size',
+    'asset_data.specifications.age': 'age',
+    'asset_data.claimedValue': 'claimed_value',
+    'location.coordinates.lat': 'lat',
+    'location.coordinates.lng': 'lng',
+    'financials.currentRent': 'current_rent',
+    'financials.cashFlow': 'cash_flow',
+    'financials.expectedYield': 'expected_yield',
+    'financials.annualExpenses': 'annual_expenses',
+    'financials.occupancyRate': 'occupancy_rate',
+    'oracle_data.existence.satellite.estimated_size': 'satellite_size',
+}
+
+SOURCES = ('asset_data', 'location', 'financials', 'oracle_data')
+
+# The oracle_data the engines read (fraud rules may name more oracle_data.* fields)
+ORACLE_PATHS = ('existence.satellite',)
+
+
+def select_paths(document: Dict[str, Any], paths: Iterable[str]) -> Dict[str, Any]:
+    """
+    The parts of a nested dict found at dotted paths, keeping their nesting;
+    paths that are missing are left out
+    """
+    selected: Dict[str, Any] = {}
+    taken: List[str] = []
+    for path in sorted(set(paths)):
+        if any(path.startswith(f'{prefix}.') for prefix in taken):
+            continue    # already inside a selected subtree
+        *parents, leaf = path.split('.')
+        value: Any = document
+        for part in (*parents, leaf):
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            continue
+        target = selected
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+        taken.append(path)
+    return selected
+
+_NUMERIC = {f.name for f in fields(AssetRecord) if f.type in (float, 'float')}
+
+
+class RecordBatch:
+    """
+    A batch of AssetRecords with lazily built float64 columns.
+
+    Each numeric attribute becomes one array on first use (a single pass over
+    slotted records), so engine stages share columns instead of each walking
+    nested dicts again.
+    """
+
+    __slots__ = ('records', '_arrays', '_sources')
+
+    def __init__(self, records: Sequence[AssetRecord]):
+        self.records = list(records)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._sources: Dict[str, List[Dict]] = {}
+
+    @classmethod
+    def from_dicts(cls, asset_data: List[Dict], locations: Optional[List[Dict]], financials: List[Dict],
+                   oracle_data: List[Dict]) -> 'RecordBatch':
+        locations = locations if locations is not None else [a.get('location') or {} for a in asset_data]
+        return cls([AssetRecord.from_dicts(*row) for row in zip(asset_data, locations, financials, oracle_data)])
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def array(self, attribute: str) -> np.ndarray:
+        """
+        Raw column for a numeric attribute; NaN where the value was missing
+        """
+        if attribute not in _NUMERIC:
+            raise KeyError(f"'{attribute}' is not a numeric AssetRecord field")
+        values = self._arrays.get(attribute)
+        if values is None:
+            values = np.fromiter((getattr(r, attribute) for r in self.records), dtype=np.float64, count=len(self.records))
+            self._arrays[attribute] = values
+        return values
+
+    def source(self, name: str) -> List[Dict]:
+        if name not in SOURCES:
+            raise ValueError(f"Unknown source '{name}', expected one of {SOURCES}")
+        values = self._sources.get(name)
+        if values is None:
+            values = self._sources[name] = [getattr(r, name) for r in self.records]
+        return values
+
+    def column(self, path: str, default: float = 0.0) -> np.ndarray:
+        """
+        Float64 column for a dotted 'source.path', missing values replaced by
+        default. Paths outside RECORD_PATHS are read from the source dicts.
+        """
+        attribute = RECORD_PATHS.get(path)
+        if attribute is not None:
+            values = self.array(attribute)
+            return np.where(np.isnan(values), default, values)
+        source, _, rest = path.partition('.')
+        return column(self.source(source), rest, default=default)
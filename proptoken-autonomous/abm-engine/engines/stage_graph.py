@@ -0,0 +1,213 @@
+"""
+Engine pipelines as a dependency graph of column-wise stages.
+
+A stage declares the request fields it reads and the upstream stages whose
+outputs it uses. Run plainly, the graph just calls each stage over the whole
+batch in dependency order. Run with a StageMemo, every (stage, asset) output is
+stored under a key derived from that asset's input values and the upstream
+keys, so re-analysing a submission recomputes only the stages downstream of
+the fields that changed; the rest are served from the memo.
+"""
+import hashlib
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from engines.records import RecordBatch
+from engines.timing import StageTimer
+
+# Stage outputs: named columns, one value per asset in the batch
+Columns = Dict[str, np.ndarray]
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fn: Callable[[RecordBatch, Dict[str, Any]], Columns]   # (batch, {upstream name: Columns, row input: list})
+    inputs: Tuple[str, ...] = ()      # dotted request paths ('financials.cashFlow') or row input names
+    depends: Tuple[str, ...] = ()     # upstream stages whose outputs fn reads
+    version: Callable[[], str] = str  # fingerprint of the data/config the outputs depend on
+
+
+class StageMemo:
+    """
+    LRU map of (stage, asset input fingerprint) -> that asset's stage outputs
+    """
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[Tuple[str, Any], ...]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[Tuple[str, Any], ...]]:
+        with self._lock:
+            row = self._entries.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return row
+
+    def set(self, key: str, row: Tuple[Tuple[str, Any], ...]):
+        with self._lock:
+            self._entries[key] = row
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+@dataclass
+class GraphRun:
+    outputs: Dict[str, Columns]
+    computed: Dict[str, int]          # assets computed per stage
+    reused: Dict[str, int]            # assets served from the memo per stage
+    rows: int = 0
+
+    def report(self) -> Dict[str, List[str]]:
+        """
+        Stage names split by whether any asset had to be recomputed
+        """
+        return {
+            'computed': [name for name, count in self.computed.items() if count],
+            'reused': [name for name, count in self.computed.items() if not count],
+        }
+
+
+def _lookup(batch: RecordBatch, row: int, path: str) -> Any:
+    source, _, rest = path.partition('.')
+    value: Any = getattr(batch.records[row], source)
+    for part in rest.split('.') if rest else ():
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+class StageGraph:
+    """
+    Stages in dependency order. name namespaces the memo keys, so engines can
+    share one StageMemo even where their stage names overlap.
+    """
+
+    def __init__(self, name: str, stages: Sequence[Stage]):
+        self.name = name
+        by_name = {stage.name: stage for stage in stages}
+        if len(by_name) != len(stages):
+            raise ValueError('Duplicate stage names')
+        self.stages: List[Stage] = []
+        visiting, done = set(), set()
+
+        def visit(stage: Stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Stage '{stage.name}' is part of a dependency cycle")
+            visiting.add(stage.name)
+            for upstream in stage.depends:
+                if upstream not in by_name:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{upstream}'")
+                visit(by_name[upstream])
+            done.add(stage.name)
+            self.stages.append(stage)
+
+        for stage in stages:
+            visit(stage)
+
+    def run(self, batch: RecordBatch, timer: Optional[StageTimer] = None, memo: Optional[StageMemo] = None,
+            row_inputs: Optional[Dict[str, Sequence[Any]]] = None) -> GraphRun:
+        """
+        Run every stage over the batch. row_inputs are extra per-asset values
+        (e.g. duplicate matches) that stages can list as inputs by name.
+        """
+        timer = timer or StageTimer()
+        row_inputs = row_inputs or {}
+        n = len(batch)
+        if n == 0:
+            memo = None
+        outputs: Dict[str, Columns] = {}
+        computed: Dict[str, int] = {}
+        reused: Dict[str, int] = {}
+        keys: Dict[str, List[str]] = {}
+
+        for stage in self.stages:
+            upstream = {name: outputs[name] for name in stage.depends}
+            if memo is None:
+                with timer.stage(stage.name):
+                    outputs[stage.name] = stage.fn(batch, {**upstream, **row_inputs})
+                computed[stage.name] = n
+                continue
+
+            keys[stage.name] = stage_keys = self._keys(f'{self.name}.{stage.name}', stage, batch, keys, row_inputs)
+            rows = [memo.get(key) for key in stage_keys]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            fresh: Columns = {}
+            if missing:
+                subset = batch if len(missing) == n else RecordBatch([batch.records[i] for i in missing])
+                index = np.asarray(missing)
+                with timer.stage(stage.name):
+                    fresh = stage.fn(subset, {
+                        **{name: {col: values[index] for col, values in columns.items()}
+                           for name, columns in upstream.items()},
+                        **{name: [values[i] for i in missing] for name, values in row_inputs.items()},
+                    })
+                names = list(fresh)
+                for position, i in enumerate(missing):
+                    row = tuple((name, fresh[name][position]) for name in names)
+                    rows[i] = row
+                    memo.set(stage_keys[i], row)
+            outputs[stage.name] = fresh if len(missing) == n else self._assemble(rows, fresh)
+            computed[stage.name] = len(missing)
+            reused[stage.name] = n - len(missing)
+        return GraphRun(outputs, computed, reused, n)
+
+    def replay(self, batch: RecordBatch, recorded: Dict[str, Columns], timer: Optional[StageTimer] = None,
+               row_inputs: Optional[Dict[str, Sequence[Any]]] = None) -> GraphRun:
+        """
+        Run every stage on the recorded outputs of its upstream stages rather
+        than on freshly computed ones, so a difference in one stage's outputs
+        points at that stage alone instead of everything downstream of it.
+        Stages missing from recorded are fed their fresh upstream outputs.
+        """
+        timer = timer or StageTimer()
+        row_inputs = row_inputs or {}
+        outputs: Dict[str, Columns] = {}
+        for stage in self.stages:
+            upstream = {name: recorded.get(name, outputs[name]) for name in stage.depends}
+            with timer.stage(stage.name):
+                outputs[stage.name] = stage.fn(batch, {**upstream, **row_inputs})
+        n = len(batch)
+        return GraphRun(outputs, {stage.name: n for stage in self.stages}, {}, n)
+
+    @staticmethod
+    def _keys(qualified_name: str, stage: Stage, batch: RecordBatch, keys: Dict[str, List[str]],
+              row_inputs: Dict[str, Sequence[Any]]) -> List[str]:
+        prefix = f'{qualified_name}|{stage.version()}|'
+        stage_keys = []
+        for i in range(len(batch)):
+            values = [
+                row_inputs[path][i] if path in row_inputs else _lookup(batch, i, path)
+                for path in stage.inputs
+            ]
+            upstream = [keys[name][i] for name in stage.depends]
+            canonical = json.dumps([values, upstream], sort_keys=True, separators=(',', ':'), default=str)
+            stage_keys.append(prefix + hashlib.sha1(canonical.encode()).hexdigest())
+        return stage_keys
+
+    @staticmethod
+    def _assemble(rows: List[Tuple[Tuple[str, Any], ...]], fresh: Columns) -> Columns:
+        names = [name for name, _ in rows[0]] if rows else []
+        columns = {}
+        for j, name in enumerate(names):
+            values = [row[j][1] for row in rows]
+            dtype = fresh[name].dtype if name in fresh else None
+            columns[name] = np.array(values, dtype=dtype)
+        return columns
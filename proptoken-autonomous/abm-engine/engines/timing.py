@@ -0,0 +1,29 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StageTimer:
+    """
+    Wall time per named stage for one engine call.
+
+    Engines are shared between threads, so each call gets its own timer rather
+    than the engine holding one. seconds is a plain dict, so it pickles back from
+    process-pool workers along with the results.
+    """
+
+    __slots__ = ('seconds',)
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
@@ -0,0 +1,92 @@
+"""
+NAV adjustment factors for asset condition, age and type.
+
+The factor tables are read once from a JSON file and compiled into lookup
+arrays: categories map to an index into a factor vector (with a trailing
+neutral 1.0 slot for unknown values) and age bands are bucketed with
+searchsorted, so adjusting a batch is three array gathers.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable
+
+from engines.records import RecordBatch
+
+DEFAULT_ADJUSTMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                                   'valuation_adjustments.json')
+
+
+def _normalise(value: str) -> str:
+    return value.strip().lower()
+
+
+@dataclass(frozen=True)
+class _CategoryTable:
+    codes: Dict[str, int]
+    factors: np.ndarray      # len(codes) + 1; the last slot is the neutral factor
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, Any], name: str) -> '_CategoryTable':
+        codes, factors = {}, []
+        for key, factor in mapping.items():
+            factor = float(factor)
+            if not factor > 0:
+                raise ValueError(f"{name} factor for '{key}' must be positive")
+            codes[_normalise(key)] = len(factors)
+            factors.append(factor)
+        return cls(codes, np.array(factors + [1.0]))
+
+    def lookup(self, values: Iterable[str], n: int) -> np.ndarray:
+        codes, unknown = self.codes, len(self.codes)
+        index = np.fromiter((codes.get(_normalise(v), unknown) if v else unknown for v in values),
+                            dtype=np.intp, count=n)
+        return self.factors[index]
+
+
+class ValuationAdjustments:
+    """
+    Condition, age and type multipliers applied to the comparables-based NAV.
+
+    The condition observed by the satellite oracle
+    (oracle_data.existence.satellite.condition) takes precedence over the one
+    claimed in the submission. Unknown categories and missing ages are neutral.
+    """
+
+    def __init__(self, path: str = DEFAULT_ADJUSTMENTS):
+        self.path = path
+        with open(path, 'rb') as f:
+            raw = f.read()
+        document = json.loads(raw)
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+        self.condition = _CategoryTable.from_mapping(document.get('condition', {}), 'condition')
+        self.type = _CategoryTable.from_mapping(document.get('type', {}), 'type')
+
+        age = document.get('age', {})
+        self.age_edges = np.array(age.get('max_years', []), dtype=np.float64)
+        self.age_factors = np.array(age.get('factors', [1.0]), dtype=np.float64)
+        if len(self.age_factors) != len(self.age_edges) + 1:
+            raise ValueError('age.factors needs one more entry than age.max_years')
+        if np.any(np.diff(self.age_edges) <= 0) or not np.all(self.age_factors > 0):
+            raise ValueError('age.max_years must increase and age.factors must be positive')
+
+    def factors(self, batch: RecordBatch) -> Dict[str, np.ndarray]:
+        """
+        Per-asset condition, age and type factors and their product 'multiplier'
+        """
+        n = len(batch)
+        records = batch.records
+        condition = self.condition.lookup((r.observed_condition or r.condition for r in records), n)
+        asset_type = self.type.lookup((r.asset_type for r in records), n)
+
+        age = batch.array('age')
+        bands = np.searchsorted(self.age_edges, np.nan_to_num(age), side='left')
+        age_factor = np.where(np.isnan(age), 1.0, self.age_factors[bands])
+        return {
+            'condition': condition,
+            'age': age_factor,
+            'type': asset_type,
+            'multiplier': condition * age_factor * asset_type,
+        }
@@ -0,0 +1,33 @@
+"""
+Provenance stamped on every analysis result.
+
+ENGINE_VERSION changes whenever engine logic changes results. config_hash
+fingerprints the versions of the data and configuration a result depends on:
+comparables, valuation adjustments, stress settings, fraud rules, anomaly
+model. Two results with the same engine version and config hash were computed
+the same way, and a snapshot replays bit-exactly only against a matching hash
+(see engines.snapshot).
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+ENGINE_VERSION = '1.2.0'
+
+
+def config_hash(components: Dict[str, Any]) -> str:
+    canonical = json.dumps([ENGINE_VERSION, components], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def provenance(components: Dict[str, Any], seed: Optional[int]) -> Dict[str, Any]:
+    """
+    {'engine_version', 'config_hash', 'seed', 'components'}; seed is None for
+    engines that draw no random numbers
+    """
+    return {
+        'engine_version': ENGINE_VERSION,
+        'config_hash': config_hash(components),
+        'seed': seed,
+        'components': components,
+    }
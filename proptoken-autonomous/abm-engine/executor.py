@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when the engine queue is full; callers should back off for retry_after seconds
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__('ABM engine is at capacity, retry later')
+        self.retry_after = retry_after
+
+
+class EngineExecutor:
+    """
+    Runs synchronous engine calls off the asyncio event loop.
+
+    Modes:
+      inline  - call directly on the event loop (debugging / single request tools)
+      thread  - ThreadPoolExecutor, NumPy releases the GIL for most array work
+      process - ProcessPoolExecutor, one engine instance per worker process
+
+    At most max_workers + max_queue calls are admitted at once; anything beyond
+    that is rejected with ExecutorSaturated instead of piling up in the pool queue.
+    A call holds its slot until the pool job finishes, even when the awaiting
+    request is cancelled first (client disconnect, timeout): the work is still
+    running and still counts as load.
+    """
+
+    MODES = ('inline', 'thread', 'process')
+
+    def __init__(self, mode: str = 'thread', max_workers: int = 1, max_queue: int = 64, retry_after: int = 1,
+                 initializer: Optional[Callable[[], Any]] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown executor mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers) if mode != 'inline' else 1
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.initializer = initializer
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()    # pool jobs release their slot from a worker thread
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == 'process':
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='abm-engine',
+                                                initializer=self.initializer)
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) on the configured backend, applying back-pressure
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise ExecutorSaturated(self.retry_after)
+            self._in_flight += 1
+
+        if self.mode == 'inline':
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            job = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the job itself ends (or is cancelled before it starts),
+        # not when this coroutine stops waiting for it
+        job.add_done_callback(self._release)
+        return await asyncio.wrap_future(job)
+
+    def _release(self, job: Optional[Future] = None):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queued': max(0, self._in_flight - self.max_workers),
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
@@ -1,49 +1,510 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Dict, Any, List
-from engines.market_intelligence import MarketIntelligenceEngine
-from engines.fraud_detection import FraudDetectionEngine
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from typing import Dict, Any, AsyncIterator, List, Callable, Optional, Sequence, Tuple
 
-app = FastAPI(title="ABM Engine", version="1.0.0")
+import tasks
+from cache import ResultCache, SQLiteCacheTier, request_key
+from config import settings
+from engines.duplicate_index import SubmissionIndex, submission_id
+from engines.records import select_paths
+from executor import EngineExecutor, ExecutorSaturated
+from metrics import CONTENT_TYPE, Metrics, MetricsMiddleware
+from results_store import AnalysisResultStore, input_hash, open_backend
+from models import AnalysisRequest, BatchAnalysisRequest, PortfolioRequest, SensitivityRequest
+from oracle_client import PROVIDERS, OracleClient, OracleProvider
+from serialization import FastJSONResponse
+from streaming import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, iter_ndjson, ndjson_line
+from submissions import SubmissionCatalog, analysis_inputs, read_submissions
 
-# Initialize engines
-market_engine = MarketIntelligenceEngine()
-fraud_engine = FraudDetectionEngine()
+# Engine calls are CPU-bound; run them on the configured backend instead of the event loop
+executor = EngineExecutor(
+    mode=settings.executor_mode,
+    max_workers=settings.executor_workers,
+    max_queue=settings.executor_max_queue,
+    retry_after=settings.retry_after_seconds,
+    initializer=tasks.init_pool_worker if settings.executor_mode == 'process' else tasks.warmup
+)
 
-class AnalysisRequest(BaseModel):
-    asset_data: Dict[str, Any]
-    location: Dict[str, Any]
-    financials: Dict[str, Any]
-    oracle_data: Dict[str, Any] = {}
+# Identical payloads are answered from here instead of re-running the engines
+cache: Optional[ResultCache] = ResultCache(
+    max_entries=settings.cache_max_entries,
+    max_bytes=settings.cache_max_bytes,
+    ttl_seconds=settings.cache_ttl_seconds,
+    disk=SQLiteCacheTier(settings.cache_disk_path) if settings.cache_disk_path else None
+) if settings.cache_enabled else None
+
+logger = logging.getLogger(__name__)
+
+MARKET_FIELDS = ('asset_data', 'location', 'financials', 'oracle_data')
+FRAUD_FIELDS = ('asset_data', 'financials', 'oracle_data')
+
+# Market and fraud results are persisted (versioned by the cache salt) when a store is configured
+PERSISTED_NAMESPACES = ('market', 'fraud')
+results_store: Optional[AnalysisResultStore] = AnalysisResultStore(
+    open_backend(settings.results_store_url, settings.results_store_pool_size),
+    batch_size=settings.results_store_batch_size,
+    flush_interval=settings.results_store_flush_ms / 1000,
+    cache_entries=settings.results_store_cache_entries
+) if settings.results_store_url else None
+
+# Cross-submission duplicate index. It is updated on every fraud analysis, so it lives
+# in this process (not the engine workers) and its matches are passed to the engine.
+submission_index = SubmissionIndex(radius_m=settings.duplicate_radius_m)
+
+# Oracle providers a request's oracle_data is missing are fetched here before analysis
+oracle_providers = [
+    OracleProvider(name, getattr(settings, f'oracle_{name}_url'), getattr(settings, f'oracle_{name}_timeout_ms') / 1000)
+    for name in PROVIDERS if getattr(settings, f'oracle_{name}_url')
+]
+oracle_client: Optional[OracleClient] = OracleClient(
+    oracle_providers,
+    required=[name.strip() for name in settings.oracle_required.split(',') if name.strip()],
+    max_connections=settings.oracle_max_connections,
+    pool_timeout=settings.oracle_pool_timeout_ms / 1000,
+    cache_seconds=settings.oracle_cache_seconds
+) if oracle_providers else None
+
+# Submissions by id, for requests that name assets instead of sending them (portfolios)
+submission_catalog = SubmissionCatalog(max_entries=settings.submission_catalog_entries)
+
+def catalog_submission(asset_data: Dict[str, Any], inputs: Tuple[Dict, Dict, Dict, Dict]):
+    sid = submission_id(asset_data)
+    if not sid.startswith('sha1:'):    # content hashes are never asked for by id
+        submission_catalog.add(sid, inputs)
+
+def catalog_requests(assets: Sequence[AnalysisRequest]):
+    for a in assets:
+        sources = a.sources()
+        catalog_submission(sources['asset_data'], tuple(sources[f] for f in MARKET_FIELDS))
+
+def load_submission_index(path: str):
+    for chunk in read_submissions(path):
+        submission_index.build(chunk)
+        for submission in chunk:
+            catalog_submission(submission, analysis_inputs(submission))
+
+# Engines (and their data) load in the background after startup, so the process
+# is live within the import time and ready once the warmup finishes
+started_at = time.monotonic()
+engine_warmup: Optional[asyncio.Task] = None
+
+async def warm_engines():
+    await asyncio.to_thread(tasks.warmup)
+    if cache is not None:
+        def invalidate_market(_):
+            cache.invalidate('market')
+            cache.invalidate('sensitivity')
+        tasks.market_engine().comparables.add_reload_listener(invalidate_market)
+
+def engines_ready() -> bool:
+    return engine_warmup is not None and engine_warmup.done() and not engine_warmup.cancelled() \
+        and engine_warmup.exception() is None
+
+async def wait_for_engines():
+    """
+    Hold requests that arrive during warmup instead of building engines on the event loop
+    """
+    if engine_warmup is None:
+        raise HTTPException(status_code=503, detail="ABM engine is not started",
+                            headers={"Retry-After": str(settings.retry_after_seconds)})
+    try:
+        await asyncio.shield(engine_warmup)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"ABM engines failed to load: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global engine_warmup
+    engine_warmup = asyncio.create_task(warm_engines())
+    # Seed the index in the background; analyses start matching against what is loaded so far
+    index_loader = None
+    if settings.submissions_export_path:
+        index_loader = asyncio.create_task(asyncio.to_thread(load_submission_index, settings.submissions_export_path))
+    yield
+    for task in (engine_warmup, index_loader):
+        if task is not None and not task.done():
+            task.cancel()
+    executor.shutdown()
+    if results_store is not None:
+        results_store.close()
+    if oracle_client is not None:
+        await oracle_client.aclose()
+
+app = FastAPI(title="ABM Engine", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+metrics = Metrics()
+metrics.describe('http_requests_total', 'HTTP requests by method, route and status')
+metrics.describe('http_request_duration_seconds', 'HTTP request latency by method and route')
+metrics.describe('http_requests_in_flight', 'HTTP requests currently being served')
+metrics.describe('engine_call_seconds', 'Engine batch calls including executor queueing')
+metrics.describe('engine_stage_seconds', 'Wall time per engine stage within one batch call')
+metrics.describe('engine_assets_total', 'Assets sent to the engines (cache misses)')
+metrics.describe('cache_lookups_total', 'Result cache lookups by namespace and outcome')
+metrics.describe('results_store_lookups_total', 'Results store lookups (after cache misses) by namespace and outcome')
+metrics.describe('oracle_fetches_total', 'Missing oracle providers by provider and outcome')
+metrics.describe('oracle_wait_seconds', 'Time requests waited for oracle providers before analysis')
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+async def run_engine(fn: Callable[..., Any], *args: Any) -> Any:
+    try:
+        return await executor.run(fn, *args)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def with_oracle_data(assets: Sequence[AnalysisRequest]) -> List[AnalysisRequest]:
+    """
+    The requests with the oracle providers they are missing fetched in (see
+    oracle_client); returned as they are when no providers are configured
+    """
+    if oracle_client is None:
+        return list(assets)
+    started = time.perf_counter()
+    completed = await asyncio.gather(*(
+        oracle_client.complete(a.sources()['asset_data'], a.sources()['location'], a.sources()['oracle_data'])
+        for a in assets
+    ))
+    metrics.observe('oracle_wait_seconds', time.perf_counter() - started)
+    requests = []
+    for asset, (oracle_data, outcomes) in zip(assets, completed):
+        for provider, outcome in outcomes.items():
+            metrics.inc('oracle_fetches_total', (('provider', provider), ('outcome', outcome)))
+        requests.append(asset if oracle_data is asset.sources()['oracle_data'] else asset.with_oracle_data(oracle_data))
+    return requests
+
+def cache_salt(namespace: str) -> str:
+    # The engine's config hash (comparables, valuation, stress and rules versions) is
+    # part of the key, so cached and stored results never outlive the setup that made them
+    if namespace in ('market', 'sensitivity'):
+        market = tasks.market_engine()
+        market.comparables.refresh_if_stale()
+        return market.provenance()['config_hash']
+    if namespace == 'fraud':
+        fraud = tasks.fraud_engine()
+        fraud.rules.refresh_if_stale()
+        return fraud.provenance(fraud.rules.active())['config_hash']
+    return ''
+
+async def run_batch(namespace: str, fn: Callable[..., Tuple[List[Any], Dict[str, float]]],
+                    *columns: List[Any]) -> List[Any]:
+    """
+    One engine batch call; engine tasks return (results, stage seconds), the
+    fraud task also the rule stats of the pool worker that ran it
+    """
+    started = time.perf_counter()
+    results, stages, *rule_stats = await run_engine(fn, *columns)
+    if rule_stats and rule_stats[0]:
+        tasks.merge_fraud_rule_stats(rule_stats[0])
+    metrics.observe('engine_call_seconds', time.perf_counter() - started, (('engine', namespace),))
+    metrics.observe_stages(namespace, stages)
+    metrics.inc('engine_assets_total', (('engine', namespace),), len(results))
+    return results
+
+def key_sources(sources: Dict[str, Any], oracle_paths: Sequence[str]) -> Dict[str, Any]:
+    # Keys cover only the oracle_data the engines read: provider answers also carry
+    # volatile fields (timestamps) that would make every refetch a miss
+    return {**sources, 'oracle_data': select_paths(sources['oracle_data'], oracle_paths)}
+
+async def cache_call(fn: Callable[..., Any], *args) -> Any:
+    # With a disk tier the cache does SQLite I/O, which must not block the event loop
+    if cache.blocking():
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def run_cached(namespace: str, assets: Sequence[AnalysisRequest],
+                     fn: Callable[..., Tuple[List[Any], Dict[str, float]]], fields: Sequence[str],
+                     extra: Optional[List[Any]] = None) -> List[Any]:
+    """
+    Answer what we can from the cache, then from the results store, and send
+    only the remaining misses to the engine, in one batch. extra is an optional
+    per-asset argument passed after the fields; it is part of the key.
+    """
+    def engine_args(indices: Sequence[int]) -> List[List[Any]]:
+        args = [[assets[i].sources()[f] for i in indices] for f in fields]
+        return args + [[extra[i] for i in indices]] if extra is not None else args
+
+    await wait_for_engines()
+    store = results_store if namespace in PERSISTED_NAMESPACES else None
+    if cache is None and store is None:
+        return await run_batch(namespace, fn, *engine_args(range(len(assets))))
+
+    salt = cache_salt(namespace)
+    oracle_paths = tasks.oracle_input_paths()
+    payloads = [key_sources(a.sources(), oracle_paths) for a in assets]
+    if extra is not None:
+        payloads = [[payload, extra[i]] for i, payload in enumerate(payloads)]
+    results: List[Any] = [None] * len(assets)
+    if cache is not None:
+        keys = [request_key(namespace, payload, salt) for payload in payloads]
+        results = await cache_call(cache.get_many, keys)
+        hits = sum(result is not None for result in results)
+        metrics.inc('cache_lookups_total', (('namespace', namespace), ('outcome', 'hit')), hits)
+        metrics.inc('cache_lookups_total', (('namespace', namespace), ('outcome', 'miss')), len(assets) - hits)
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    if store is not None and missing:
+        store_keys = {
+            i: (submission_id(assets[i].sources()['asset_data']), namespace, input_hash(payloads[i]), salt)
+            for i in missing
+        }
+        try:
+            stored = await asyncio.to_thread(store.get_many, list(store_keys.values()))
+        except Exception:
+            logger.exception('Results store read failed; computing %d results', len(missing))
+            stored = [None] * len(missing)
+        for i, result in zip(missing, stored):
+            if result is not None:
+                results[i] = result
+        if cache is not None:
+            await cache_call(cache.set_many, [(keys[i], result) for i, result in zip(missing, stored)
+                                              if result is not None])
+        found = sum(result is not None for result in stored)
+        metrics.inc('results_store_lookups_total', (('namespace', namespace), ('outcome', 'hit')), found)
+        metrics.inc('results_store_lookups_total', (('namespace', namespace), ('outcome', 'miss')), len(missing) - found)
+        missing = [i for i in missing if results[i] is None]
+
+    if missing:
+        computed = await run_batch(namespace, fn, *engine_args(missing))
+        for i, result in zip(missing, computed):
+            results[i] = result
+            if store is not None:
+                store.put(*store_keys[i], result)
+        if cache is not None:
+            await cache_call(cache.set_many, [(keys[i], results[i]) for i in missing])
+    return results
 
 @app.get("/")
 def read_root():
     return {"status": "online", "service": "ABM Engine"}
 
+@app.get("/health/live")
+def health_live():
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - started_at, 3)}
+
+@app.get("/health/ready")
+def health_ready():
+    body = {"engines": tasks.loaded_engines(), "uptime_seconds": round(time.monotonic() - started_at, 3)}
+    if engines_ready():
+        return {"status": "ready", **body}
+    if engine_warmup is not None and engine_warmup.done() and not engine_warmup.cancelled():
+        return FastJSONResponse({"status": "failed", "error": str(engine_warmup.exception()), **body}, status_code=503)
+    return FastJSONResponse({"status": "starting", **body}, status_code=503)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    startup = {'ready': int(engines_ready()), **{f'{name}_load_seconds': seconds
+                                                 for name, seconds in tasks.loaded_engines().items()}}
+    snapshots = {'startup': startup, 'executor': executor.stats(), 'index': submission_index.stats(),
+                 'catalog': submission_catalog.stats()}
+    if cache is not None:
+        snapshots['cache'] = cache.stats()
+    if results_store is not None:
+        snapshots['results_store'] = results_store.stats()
+    if oracle_client is not None:
+        snapshots['oracle'] = oracle_client.stats()
+    return Response(metrics.render(snapshots), media_type=CONTENT_TYPE)
+
+@app.get("/executor/stats")
+def executor_stats():
+    return executor.stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.post("/comparables/reload")
+def reload_comparables():
+    return tasks.reload_comparables()
+
+@app.get("/results/{submission_id}")
+async def stored_results(submission_id: str):
+    """
+    The latest persisted result of each kind (market, fraud) for a submission
+    """
+    if results_store is None:
+        raise HTTPException(status_code=404, detail="Results store is not configured")
+    latest = await asyncio.to_thread(results_store.latest, submission_id)
+    if not latest:
+        raise HTTPException(status_code=404, detail=f"No stored results for submission '{submission_id}'")
+    return FastJSONResponse({
+        "submission_id": submission_id,
+        "results": {
+            kind: {"result": row.result, "version": row.version, "input_hash": row.input_hash,
+                   "created_at": row.created_at}
+            for kind, row in latest.items()
+        }
+    })
+
+@app.get("/index/stats")
+def index_stats():
+    return submission_index.stats()
+
+@app.get("/fraud/rules")
+def fraud_rules():
+    return tasks.fraud_rule_stats()
+
+@app.post("/fraud/rules/reload")
+def reload_fraud_rules():
+    return tasks.reload_fraud_rules()
+
 @app.post("/analyze/market")
 async def analyze_market(request: AnalysisRequest):
-    try:
-        result = market_engine.analyze(
-            request.asset_data,
-            request.location,
-            request.financials,
-            request.oracle_data
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    request, = await with_oracle_data([request])
+    catalog_requests([request])
+    results = await run_cached('market', [request], tasks.analyze_market_batch, MARKET_FIELDS)
+    return FastJSONResponse(results[0])
+
+async def detect_fraud(assets: Sequence[AnalysisRequest]) -> List[Any]:
+    # Match against earlier submissions (and earlier assets in this batch), then index these
+    assets = await with_oracle_data(assets)
+    catalog_requests(assets)
+    duplicates = [submission_index.check_and_add(a.sources()['asset_data'], a.sources()['location']) for a in assets]
+    return await run_cached('fraud', assets, tasks.detect_fraud_batch, FRAUD_FIELDS, extra=duplicates)
 
 @app.post("/analyze/fraud")
 async def analyze_fraud(request: AnalysisRequest):
-    try:
-        result = fraud_engine.detect(
-            request.asset_data,
-            request.financials,
-            request.oracle_data
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    results = await detect_fraud([request])
+    return FastJSONResponse(results[0])
+
+@app.post("/analyze/market/batch")
+async def analyze_market_batch(request: BatchAnalysisRequest):
+    assets = await with_oracle_data(request.assets)
+    catalog_requests(assets)
+    results = await run_cached('market', assets, tasks.analyze_market_batch, MARKET_FIELDS)
+    return FastJSONResponse({"count": len(results), "results": results})
+
+@app.post("/analyze/market/sensitivity")
+async def analyze_market_sensitivity(request: SensitivityRequest):
+    """
+    NAV and yield band of one asset over the Cartesian product of the grid
+    axes, as dense arrays with one dimension per axis (in 'axes' order)
+    """
+    if request.grid.cells() > settings.sensitivity_max_cells:
+        raise HTTPException(status_code=413, detail=f"At most {settings.sensitivity_max_cells} grid points per request")
+    assets = await with_oracle_data([request.asset])
+    results = await run_cached('sensitivity', assets, tasks.market_sensitivity_batch, MARKET_FIELDS,
+                               extra=[request.grid.model_dump()])
+    return FastJSONResponse(results[0])
+
+@app.post("/analyze/fraud/batch")
+async def analyze_fraud_batch(request: BatchAnalysisRequest):
+    results = await detect_fraud(request.assets)
+    return FastJSONResponse({"count": len(results), "results": results})
+
+@app.post("/reanalyze")
+async def reanalyze(request: AnalysisRequest):
+    """
+    Analyse one submission with both engines, recomputing only the stages
+    downstream of fields that changed since it was last analysed. Bypasses the
+    result cache; the response lists which stages were reused.
+    """
+    await wait_for_engines()
+    request, = await with_oracle_data([request])
+    catalog_requests([request])
+    sources = request.sources()
+    duplicates = submission_index.check_and_add(sources['asset_data'], sources['location'])
+    started = time.perf_counter()
+    result, stages = await run_engine(tasks.reanalyze, sources['asset_data'], sources['location'],
+                                      sources['financials'], sources['oracle_data'], duplicates)
+    metrics.observe('engine_call_seconds', time.perf_counter() - started, (('engine', 'reanalyze'),))
+    metrics.observe_stages('reanalyze', stages)
+    return FastJSONResponse(result)
+
+@app.post("/analyze/portfolio")
+async def analyze_portfolio(request: PortfolioRequest):
+    """
+    Portfolio NAV, concentration by city and type, and correlated stress over
+    the holdings. Holdings name an asset analysed earlier (or loaded from the
+    submissions export) by id, or carry the full payload. All holdings go to the
+    engine as one batch; the result is not cached.
+    """
+    if len(request.holdings) > settings.portfolio_max_holdings:
+        raise HTTPException(status_code=413, detail=f"At most {settings.portfolio_max_holdings} holdings per portfolio")
+    inputs, ids, missing = [], [], []
+    for holding in request.holdings:
+        if holding.asset is not None:
+            sources = holding.asset.sources()
+            inputs.append(tuple(sources[f] for f in MARKET_FIELDS))
+            ids.append(submission_id(sources['asset_data']))
+        else:
+            found = submission_catalog.get(holding.asset_id)
+            if found is None:
+                missing.append(holding.asset_id)
+            inputs.append(found)
+            ids.append(holding.asset_id)
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Unknown asset ids", "asset_ids": missing})
+    catalog_requests([h.asset for h in request.holdings if h.asset is not None])
+
+    await wait_for_engines()
+    started = time.perf_counter()
+    result, stages = await run_engine(tasks.analyze_portfolio, *map(list, zip(*inputs)), ids,
+                                      [h.share for h in request.holdings])
+    metrics.observe('engine_call_seconds', time.perf_counter() - started, (('engine', 'portfolio'),))
+    metrics.observe_stages('portfolio', stages)
+    metrics.inc('engine_assets_total', (('engine', 'portfolio'),), len(ids))
+    return FastJSONResponse(result)
+
+async def analyze_chunk(chunk: List[Tuple[int, Optional[AnalysisRequest], Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Market and fraud analysis for one stream chunk, in input order. Bulk runs
+    bypass the result cache (they would only evict interactive entries) and
+    wait out executor saturation instead of failing the whole stream.
+    """
+    assets = [record for _, record, _ in chunk if record is not None]
+    catalog_requests(assets)
+    market_args = [[a.sources()[f] for a in assets] for f in MARKET_FIELDS]
+    fraud_args = [[a.sources()[f] for a in assets] for f in FRAUD_FIELDS]
+    fraud_args.append([submission_index.check_and_add(a.sources()['asset_data'], a.sources()['location']) for a in assets])
+    market, fraud, failure = [], [], None
+    while assets:
+        try:
+            market, fraud = await asyncio.gather(
+                run_batch('market', tasks.analyze_market_batch, *market_args),
+                run_batch('fraud', tasks.detect_fraud_batch, *fraud_args)
+            )
+            break
+        except HTTPException as e:
+            if e.status_code != 503:
+                failure = e.detail
+                break
+            await asyncio.sleep(settings.retry_after_seconds)
+
+    results, analysed = [], iter(zip(market, fraud))
+    for index, record, error in chunk:
+        if record is None or failure is not None:
+            results.append({"index": index, "error": error or failure})
+        else:
+            m, f = next(analysed)
+            results.append({"index": index, "id": submission_id(record.sources()['asset_data']), "market": m, "fraud": f})
+    return results
+
+async def stream_analysis(request: Request) -> AsyncIterator[bytes]:
+    chunk: List[Tuple[int, Optional[AnalysisRequest], Optional[str]]] = []
+    async for entry in iter_ndjson(request, AnalysisRequest, settings.stream_max_line_bytes):
+        chunk.append(entry)
+        if len(chunk) >= settings.stream_chunk_size:
+            for result in await analyze_chunk(chunk):
+                yield ndjson_line(result)
+            chunk = []
+    if chunk:
+        for result in await analyze_chunk(chunk):
+            yield ndjson_line(result)
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: Request):
+    """
+    Bulk revaluation: NDJSON AnalysisRequest records in, one NDJSON result line
+    per record out, in input order. Invalid lines come back as {"index", "error"}
+    without stopping the stream. Records are analysed in chunks of
+    ABM_STREAM_CHUNK_SIZE as they arrive, so memory stays bounded by one chunk
+    and results start flowing before the upload finishes.
+    """
+    return DuplexStreamingResponse(stream_analysis(request), media_type=NDJSON_MEDIA_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,183 @@
+"""
+Prometheus text-format metrics without a client library dependency.
+
+Everything is plain counters and fixed-bucket histograms behind one lock; an
+observation is a dict lookup, a bisect and a few additions, so instrumentation
+stays on in production. /metrics renders the current values on demand.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; engine stages are sub-millisecond to tens of milliseconds, requests up to seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Labels) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_format_labels(labels, ("le", f"{bound:g}"))} {cumulative}'
+        yield f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {self.count}'
+        yield f'{name}_sum{_format_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{_format_labels(labels)} {self.count}'
+
+
+class Metrics:
+    """
+    Registry of counters, gauges and histograms keyed by metric name and labels
+    """
+
+    def __init__(self, prefix: str = 'abm', buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, help_text: str):
+        self._help[f'{self.prefix}_{name}'] = help_text
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0):
+        with self._lock:
+            series = self._counters.setdefault(f'{self.prefix}_{name}', {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def add_gauge(self, name: str, labels: Labels = (), value: float = 1.0):
+        with self._lock:
+            series = self._gauges.setdefault(f'{self.prefix}_{name}', {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        with self._lock:
+            series = self._histograms.setdefault(f'{self.prefix}_{name}', {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def observe_stages(self, engine: str, stages: Dict[str, float]):
+        """
+        Record one engine call's StageTimer.seconds
+        """
+        with self._lock:
+            series = self._histograms.setdefault(f'{self.prefix}_engine_stage_seconds', {})
+            for stage, seconds in stages.items():
+                labels = (('engine', engine), ('stage', stage))
+                histogram = series.get(labels)
+                if histogram is None:
+                    histogram = series[labels] = Histogram(self.buckets)
+                histogram.observe(seconds)
+
+    def render(self, snapshots: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        Text exposition. snapshots are stats dicts from other components
+        (cache, executor, ...); their numeric values are exported as gauges
+        named <prefix>_<component>_<key>.
+        """
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, 'counter')
+                lines.extend(f'{name}{_format_labels(labels)} {value:g}' for labels, value in series.items())
+            for name, series in sorted(self._gauges.items()):
+                header(name, 'gauge')
+                lines.extend(f'{name}{_format_labels(labels)} {value:g}' for labels, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                header(name, 'histogram')
+                for labels, histogram in series.items():
+                    lines.extend(histogram.render(name, labels))
+
+        for component, stats in (snapshots or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{self.prefix}_{component}_{key}'
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value:g}')
+
+        uptime = f'{self.prefix}_uptime_seconds'
+        lines.append(f'# TYPE {uptime} gauge')
+        lines.append(f'{uptime} {time.time() - self.started_at:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-endpoint request counts and latency, and
+    in-flight requests. Endpoints are labelled by route template (not raw path)
+    to keep label cardinality bounded; the route is only known once routing has
+    run, so the in-flight gauge is labelled by method alone. Latency runs until
+    the response body is fully sent, so streaming responses are timed end to end.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+        in_flight = (('method', scope['method']),)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        self.metrics.add_gauge('http_requests_in_flight', in_flight, 1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.add_gauge('http_requests_in_flight', in_flight, -1)
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or ('<unmatched>' if status == 404 else scope['path'])
+            labels = (('method', scope['method']), ('path', path))
+            self.metrics.inc('http_requests_total', labels + (('status', str(status)),))
+            self.metrics.observe('http_request_duration_seconds', time.perf_counter() - started, labels)
@@ -0,0 +1,151 @@
+"""
+Request models for the ABM engine API.
+
+The nested models follow the submission shape (see backend_test.py), so bad
+input is rejected with a 422 at the edge instead of failing inside an engine.
+Fields the engines do not read (spv, registryIds, documentUrls, ...) are
+accepted and passed through unchanged.
+"""
+from typing import Annotated, Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, model_validator
+
+NonNegative = Annotated[float, Field(ge=0, allow_inf_nan=False)]
+Finite = Annotated[float, Field(allow_inf_nan=False)]
+
+
+class _Passthrough(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+
+class Coordinates(BaseModel):
+    lat: Annotated[float, Field(ge=-90, le=90)]
+    lng: Annotated[float, Field(ge=-180, le=180)]
+
+    @model_validator(mode='before')
+    @classmethod
+    def _from_pair(cls, value: Any) -> Any:
+        # Some clients send [lat, lng]
+        if isinstance(value, (list, tuple)) and len(value) == 2:
+            return {'lat': value[0], 'lng': value[1]}
+        return value
+
+
+class Location(_Passthrough):
+    address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    country: Optional[str] = None
+    postalCode: Optional[str] = None
+    coordinates: Optional[Coordinates] = None
+
+
+class Specifications(_Passthrough):
+    size: Optional[NonNegative] = None
+    type: Optional[str] = None
+    age: Optional[NonNegative] = None
+    condition: Optional[str] = None
+    floors: Optional[Annotated[int, Field(ge=0)]] = None
+    units: Optional[Annotated[int, Field(ge=0)]] = None
+
+
+class CashFlowEntry(_Passthrough):
+    # Monthly amounts, in the currency of currentRent and cashFlow
+    month: str
+    income: Finite
+    expenses: Finite = 0.0
+
+
+class Financials(_Passthrough):
+    currentRent: Optional[NonNegative] = None
+    cashFlow: Optional[Finite] = None
+    expectedYield: Optional[Finite] = None
+    annualExpenses: Optional[NonNegative] = None
+    occupancyRate: Optional[Annotated[float, Field(ge=0, le=100)]] = None
+    tenantCount: Optional[Annotated[int, Field(ge=0)]] = None
+    leaseTermsMonths: Optional[Annotated[int, Field(ge=0)]] = None
+    historicalCashFlow: List[CashFlowEntry] = []
+
+
+class AssetData(_Passthrough):
+    specifications: Specifications = Specifications()
+    claimedValue: Optional[NonNegative] = None
+    registryIds: List[str] = []
+
+
+class AnalysisRequest(BaseModel):
+    asset_data: AssetData
+    location: Location
+    financials: Financials
+    oracle_data: Dict[str, Any] = {}
+
+    _sources: Optional[Dict[str, Dict[str, Any]]] = PrivateAttr(default=None)
+
+    def sources(self) -> Dict[str, Dict[str, Any]]:
+        """
+        The validated request as plain dicts (what the engine tasks take and the
+        cache keys hash), dumped once per request
+        """
+        if self._sources is None:
+            self._sources = self.model_dump(exclude_none=True)
+        return self._sources
+
+    def with_oracle_data(self, oracle_data: Dict[str, Any]) -> 'AnalysisRequest':
+        """
+        A copy of this request carrying oracle_data instead (e.g. after missing
+        providers were fetched)
+        """
+        request = self.model_copy(update={'oracle_data': oracle_data})
+        request._sources = None
+        return request
+
+
+class BatchAnalysisRequest(BaseModel):
+    assets: List[AnalysisRequest]
+
+
+class PortfolioHolding(BaseModel):
+    """
+    A holding given either by the id of an already-submitted asset or as a full payload
+    """
+    asset_id: Optional[str] = None
+    asset: Optional[AnalysisRequest] = None
+    share: Annotated[float, Field(gt=0, le=1)] = 1.0   # fraction of the asset held
+
+    @model_validator(mode='after')
+    def _one_source(self) -> 'PortfolioHolding':
+        if (self.asset_id is None) == (self.asset is None):
+            raise ValueError('Give exactly one of asset_id or asset')
+        return self
+
+
+class PortfolioRequest(BaseModel):
+    holdings: Annotated[List[PortfolioHolding], Field(min_length=1)]
+
+
+ChangeFraction = Annotated[float, Field(gt=-1, allow_inf_nan=False)]
+Percent = Annotated[float, Field(ge=0, le=100)]
+Positive = Annotated[float, Field(gt=0, allow_inf_nan=False)]
+MAX_AXIS_VALUES = 1000
+
+
+class SensitivityGrid(BaseModel):
+    """
+    Values to sweep per axis (see MarketIntelligenceEngine.sensitivity); an
+    empty axis keeps the submitted value
+    """
+    rent_change: Annotated[List[ChangeFraction], Field(max_length=MAX_AXIS_VALUES)] = []
+    occupancy: Annotated[List[Percent], Field(max_length=MAX_AXIS_VALUES)] = []
+    price_shock: Annotated[List[ChangeFraction], Field(max_length=MAX_AXIS_VALUES)] = []
+    expected_yield: Annotated[List[Positive], Field(max_length=MAX_AXIS_VALUES)] = []
+
+    def cells(self) -> int:
+        cells = 1
+        for axis in (self.rent_change, self.occupancy, self.price_shock, self.expected_yield):
+            cells *= max(len(axis), 1)
+        return cells
+
+
+class SensitivityRequest(BaseModel):
+    asset: AnalysisRequest
+    grid: SensitivityGrid
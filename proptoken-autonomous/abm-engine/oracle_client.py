@@ -0,0 +1,222 @@
+"""
+Async client for the oracle providers (existence, ownership, activity).
+
+AnalysisRequest.oracle_data used to arrive fully collected, with the caller
+querying each provider in turn. OracleClient fetches the providers a request
+is missing itself, all at once, over one pooled httpx.AsyncClient:
+
+  POST <provider url>  {"assetId", "did", "location", "asset_data"}
+  -> a JSON object, used as oracle_data[<provider>]
+
+which is the oracle-network node's /verify/<provider> protocol.
+
+Each provider has its own timeout. At most max_connections requests are in
+flight; a fetch waits up to pool_timeout for a connection before its own
+timeout starts. Fetches are coalesced per (submission, provider): concurrent
+requests for the same submission (e.g. the market and fraud calls the backend
+makes side by side) await the same fetch, and a successful answer is reused
+for cache_seconds. Failed and timed-out fetches are not kept, so the next
+request tries again.
+
+Analysis does not wait for the slowest provider, only for the required ones
+(by default existence, the only provider the engines read). The others keep
+running in the background; they are merged in if they have answered by the
+time the required ones have, and are ready for the submission's next request
+otherwise. Cache keys only cover the oracle_data the engines read, so whether
+an optional provider made it in does not change them.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from engines.duplicate_index import submission_id
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ('existence', 'ownership', 'activity')
+
+
+@dataclass(frozen=True)
+class OracleProvider:
+    name: str
+    url: str
+    timeout: float    # seconds for the whole request, connect included
+
+
+class OraclePoolTimeout(Exception):
+    """
+    Raised when a fetch waited pool_timeout without getting a connection
+    """
+
+
+class OracleClient:
+    """
+    Fetches missing oracle_data entries concurrently, with per-provider timeouts,
+    connection pooling and per-submission request coalescing
+    """
+
+    def __init__(self, providers: Sequence[OracleProvider], required: Sequence[str] = ('existence',),
+                 max_connections: int = 100, pool_timeout: float = 1.0, cache_seconds: float = 300.0,
+                 max_entries: int = 10000, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.required = frozenset(required)
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.cache_seconds = cache_seconds
+        self.max_entries = max_entries
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        # One slot per pooled connection, so httpx never queues a request inside its own timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        # (submission id, provider) -> fetch task, in flight or finished; event loop only, so no lock
+        self._fetches: 'OrderedDict[Tuple[str, str], asyncio.Task]' = OrderedDict()
+        self._fetched_at: Dict[Tuple[str, str], float] = {}
+        self.requests = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created on first use so the pool belongs to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self._transport
+            )
+            self._slots = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    async def _request(self, key: Tuple[str, str], provider: OracleProvider,
+                       payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = self._http()
+        slots = self._slots
+        await self._acquire(slots)
+        try:
+            self.requests += 1
+            response = await asyncio.wait_for(
+                client.post(provider.url, json=payload, timeout=provider.timeout), provider.timeout
+            )
+        finally:
+            slots.release()
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError(f"Oracle provider '{provider.name}' returned {type(data).__name__}, expected an object")
+        self._fetched_at[key] = time.monotonic()
+        return data
+
+    async def _acquire(self, slots: asyncio.Semaphore):
+        # The acquire runs shielded: when the wait times out or is cancelled just as
+        # a slot was granted, the slot is handed back instead of leaking from the pool
+        acquire = asyncio.ensure_future(slots.acquire())
+        try:
+            await asyncio.wait_for(asyncio.shield(acquire), self.pool_timeout)
+        except BaseException as error:
+            acquire.add_done_callback(
+                lambda done: done.cancelled() or done.exception() is not None or slots.release()
+            )
+            acquire.cancel()
+            if isinstance(error, asyncio.TimeoutError):
+                raise OraclePoolTimeout(f'No free connection within {self.pool_timeout:g}s') from None
+            raise
+
+    def _fetch(self, sid: str, provider: OracleProvider, payload: Dict[str, Any]) -> Tuple[asyncio.Task, str]:
+        """
+        The fetch task for (sid, provider) and how it was obtained: 'fetched'
+        (started now), 'coalesced' (already in flight) or 'cached'
+        """
+        key = (sid, provider.name)
+        task = self._fetches.get(key)
+        if task is not None:
+            if not task.done():
+                return task, 'coalesced'
+            fetched_at = self._fetched_at.get(key)    # None: it failed
+            if fetched_at is not None and time.monotonic() - fetched_at < self.cache_seconds:
+                self._fetches.move_to_end(key)
+                return task, 'cached'
+            self._forget(key)
+
+        task = asyncio.create_task(self._request(key, provider, payload))
+        self._fetches[key] = task
+        task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        # Drop the oldest answers over max_entries; fetches still in flight stay
+        for old in list(self._fetches):
+            if len(self._fetches) <= self.max_entries:
+                break
+            if self._fetches[old].done():
+                self._forget(old)
+        return task, 'fetched'
+
+    def _finished(self, key: Tuple[str, str], task: asyncio.Task):
+        # Failures are not kept (this also marks their exception as retrieved)
+        failed = task.cancelled() or task.exception() is not None
+        if failed and self._fetches.get(key) is task:
+            self._forget(key)
+
+    def _forget(self, key: Tuple[str, str]):
+        self._fetches.pop(key, None)
+        self._fetched_at.pop(key, None)
+
+    async def complete(self, asset_data: Dict[str, Any], location: Dict[str, Any],
+                       oracle_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        oracle_data with the configured providers it is missing filled in, and
+        the outcome per fetched provider: fetched, coalesced or cached when it
+        answered, pending when analysis went ahead without it, timeout,
+        pool_timeout (no free connection) or error.
+        Returns oracle_data itself when nothing was added.
+        """
+        missing = [provider for name, provider in self.providers.items() if name not in oracle_data]
+        if not missing:
+            return oracle_data, {}
+        sid = submission_id(asset_data)
+        payload = {'assetId': sid, 'did': asset_data.get('did'), 'location': location, 'asset_data': asset_data}
+        fetches = {provider.name: self._fetch(sid, provider, payload) for provider in missing}
+        required = [task for name, (task, _) in fetches.items() if name in self.required]
+        if required:
+            # Every fetch ends by pool_timeout plus its provider's timeout, so this is bounded too
+            await asyncio.wait(required)
+
+        merged = dict(oracle_data)
+        outcomes: Dict[str, str] = {}
+        for name, (task, how) in fetches.items():
+            if not task.done():
+                outcomes[name] = 'pending'
+            elif task.cancelled() or task.exception() is not None:
+                error = None if task.cancelled() else task.exception()
+                if isinstance(error, OraclePoolTimeout):
+                    outcomes[name] = 'pool_timeout'
+                elif isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+                    outcomes[name] = 'timeout'
+                else:
+                    outcomes[name] = 'error'
+                if outcomes[name] == 'error':
+                    logger.warning("Oracle provider '%s' failed for %s: %s", name, sid, error)
+            else:
+                merged[name] = task.result()
+                outcomes[name] = how
+        if len(merged) == len(oracle_data):
+            return oracle_data, outcomes
+        return merged, outcomes
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight = sum(not task.done() for task in self._fetches.values())
+        return {
+            'providers': len(self.providers),
+            'in_flight': in_flight,
+            'cached': len(self._fetches) - in_flight,
+            'requests': self.requests,
+        }
+
+    async def aclose(self):
+        for task in self._fetches.values():
+            task.cancel()
+        self._fetches.clear()
+        self._fetched_at.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
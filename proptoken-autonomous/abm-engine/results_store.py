@@ -0,0 +1,480 @@
+"""
+Persistent store for ABM analysis results.
+
+Results live in the analysis_results table (database/init.sql). Each row is
+keyed by (submission_id, kind, input_hash, version):
+
+  kind        the analysis, e.g. 'market' or 'fraud'
+  input_hash  sha256 of the canonical engine inputs
+  version     the version of the data and config the result was computed
+              with (the comparables / rules version the cache keys are
+              salted with)
+
+Re-analysing a submission after a data change therefore adds a row instead
+of overwriting the old one, so past results stay auditable.
+
+Writes are buffered and flushed in batches by a background thread. On
+Postgres a batch is COPYed into a temporary table and moved over with one
+INSERT ... ON CONFLICT DO NOTHING. SQLite is the stand-in for local runs and
+tests; there a batch is one executemany in a transaction. Both backends hand
+out connections from a pool. Reads go through an in-process LRU, and rows
+still waiting to be written are visible to reads.
+"""
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# (submission_id, kind, input_hash, version)
+Key = Tuple[str, str, str, str]
+# Key + (result JSON, created_at epoch seconds)
+Row = Tuple[str, str, str, str, str, float]
+
+COLUMNS = ('submission_id', 'kind', 'input_hash', 'version', 'result', 'created_at')
+
+
+def input_hash(payload: Any) -> str:
+    """
+    sha256 over the canonical JSON of the engine inputs, independent of any version
+    """
+    return hashlib.sha256(dumps(payload, sort_keys=True)).hexdigest()
+
+
+@dataclass(frozen=True)
+class StoredResult:
+    submission_id: str
+    kind: str
+    input_hash: str
+    version: str
+    result: Any
+    created_at: float
+
+
+def _decode_latest(rows: Dict[str, Row]) -> Dict[str, StoredResult]:
+    # A fresh decode per read, so callers never share a result dict
+    return {kind: StoredResult(*key, loads(result), created_at) for kind, (*key, result, created_at) in rows.items()}
+
+
+class ResultsBackend(ABC):
+    """
+    Storage for result rows; results travel as JSON text
+    """
+
+    @abstractmethod
+    def write(self, rows: Sequence[Row]):
+        """
+        Insert rows in one transaction, ignoring keys that are already stored
+        """
+
+    @abstractmethod
+    def read(self, keys: Sequence[Key]) -> Dict[Key, str]:
+        """
+        Result JSON of the stored keys among keys
+        """
+
+    @abstractmethod
+    def latest(self, submission_id: str) -> List[Row]:
+        """
+        The most recent row of each kind for one submission
+        """
+
+    def close(self):
+        pass
+
+
+class SQLiteConnectionPool:
+    """
+    Fixed-size pool of SQLite connections to one database file (WAL mode, so
+    readers do not block the writer)
+    """
+
+    def __init__(self, path: str, size: int = 4, timeout: float = 5.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f'No SQLite connection free within {self.timeout}s') from None
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': self.size, 'open': self._created, 'idle': self._idle.qsize()}
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SQLiteResultsBackend(ResultsBackend):
+    """
+    SQLite version of the analysis_results table; creates it on first use
+    """
+
+    READ_CHUNK = 200    # keys per query (4 parameters each, under SQLite's limit)
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.pool = SQLiteConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_results ('
+                'submission_id TEXT NOT NULL, kind TEXT NOT NULL, input_hash TEXT NOT NULL, version TEXT NOT NULL, '
+                'result TEXT NOT NULL, created_at REAL NOT NULL, '
+                'PRIMARY KEY (submission_id, kind, input_hash, version))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS analysis_results_submission '
+                         'ON analysis_results (submission_id, kind, created_at)')
+
+    def write(self, rows: Sequence[Row]):
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(
+                    f'INSERT INTO analysis_results ({", ".join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT DO NOTHING', rows
+                )
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def read(self, keys: Sequence[Key]) -> Dict[Key, str]:
+        found = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(keys), self.READ_CHUNK):
+                chunk = keys[start:start + self.READ_CHUNK]
+                values = ', '.join(['(?, ?, ?, ?)'] * len(chunk))
+                cursor = conn.execute(
+                    'SELECT submission_id, kind, input_hash, version, result FROM analysis_results '
+                    f'WHERE (submission_id, kind, input_hash, version) IN (VALUES {values})',
+                    [part for key in chunk for part in key]
+                )
+                for *key, result in cursor:
+                    found[tuple(key)] = result
+        return found
+
+    def latest(self, submission_id: str) -> List[Row]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f'SELECT {", ".join(COLUMNS)} FROM analysis_results WHERE submission_id = ? '
+                'ORDER BY created_at DESC, rowid DESC', (submission_id,)
+            ).fetchall()
+        newest: Dict[str, Row] = {}
+        for row in rows:
+            newest.setdefault(row[1], row)
+        return list(newest.values())
+
+    def close(self):
+        self.pool.close()
+
+
+class PostgresResultsBackend(ResultsBackend):
+    """
+    analysis_results on Postgres through a psycopg connection pool. The table
+    comes from database/init.sql. Needs psycopg 3 with psycopg_pool.
+    """
+
+    def __init__(self, dsn: str, pool_size: int = 4):
+        from psycopg_pool import ConnectionPool
+
+        self.pool = ConnectionPool(dsn, min_size=1, max_size=pool_size, open=True)
+
+    def write(self, rows: Sequence[Row]):
+        from datetime import datetime, timezone
+
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            # Per-session staging table, emptied at every commit
+            cur.execute('CREATE TEMP TABLE IF NOT EXISTS analysis_results_load '
+                        '(LIKE analysis_results INCLUDING DEFAULTS) ON COMMIT DELETE ROWS')
+            with cur.copy(f'COPY analysis_results_load ({", ".join(COLUMNS)}) FROM STDIN') as copy:
+                for *key, result, created_at in rows:
+                    copy.write_row((*key, result, datetime.fromtimestamp(created_at, timezone.utc)))
+            cur.execute(f'INSERT INTO analysis_results ({", ".join(COLUMNS)}) '
+                        f'SELECT {", ".join(COLUMNS)} FROM analysis_results_load ON CONFLICT DO NOTHING')
+
+    def read(self, keys: Sequence[Key]) -> Dict[Key, str]:
+        if not keys:
+            return {}
+        columns = list(zip(*keys))
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                'SELECT submission_id, kind, input_hash, version, result::text FROM analysis_results '
+                'WHERE (submission_id, kind, input_hash, version) IN '
+                '(SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[]))',
+                [list(column) for column in columns]
+            )
+            return {tuple(key): result for *key, result in cur.fetchall()}
+
+    def latest(self, submission_id: str) -> List[Row]:
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                'SELECT DISTINCT ON (kind) submission_id, kind, input_hash, version, result::text, '
+                'EXTRACT(EPOCH FROM created_at)::float8 FROM analysis_results WHERE submission_id = %s '
+                'ORDER BY kind, created_at DESC', (submission_id,)
+            )
+            return [tuple(row) for row in cur.fetchall()]
+
+    def close(self):
+        self.pool.close()
+
+
+def open_backend(url: str, pool_size: int = 4) -> ResultsBackend:
+    """
+    postgresql://... (or postgres://...) -> Postgres; sqlite:///path or a plain path -> SQLite
+    """
+    if url.startswith(('postgresql://', 'postgres://')):
+        return PostgresResultsBackend(url, pool_size)
+    return SQLiteResultsBackend(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url, pool_size)
+
+
+class AnalysisResultStore:
+    """
+    Write-behind, read-through access to a ResultsBackend.
+
+    put() only queues the row (and caches the result). A writer thread flushes
+    the queue once batch_size rows are waiting or every flush_interval seconds.
+    A failed flush is logged and its rows are requeued. Past max_pending the
+    oldest rows are dropped and counted, so a database outage cannot exhaust
+    memory.
+    """
+
+    def __init__(self, backend: ResultsBackend, batch_size: int = 500, flush_interval: float = 1.0,
+                 cache_entries: int = 10000, max_pending: int = 100_000):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cache_entries = cache_entries
+        self.max_pending = max_pending
+        self._pending: 'OrderedDict[Key, Tuple[str, float]]' = OrderedDict()
+        self._inflight: Dict[Key, Tuple[str, float]] = {}
+        self._cache: 'OrderedDict[Key, str]' = OrderedDict()    # serialized, so every hit is a fresh copy
+        self._latest: 'OrderedDict[str, Dict[str, Row]]' = OrderedDict()    # serialized too
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._puts = 0
+        self.cache_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def _remember(self, key: Key, encoded: str):
+        # Caller holds _lock
+        self._cache[key] = encoded
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def put(self, submission_id: str, kind: str, input_hash: str, version: str, result: Any):
+        key = (submission_id, kind, input_hash, version)
+        row = (dumps(result).decode(), time.time())
+        with self._wake:
+            if self._closed:
+                raise RuntimeError('Result store is closed')
+            self._pending[key] = row
+            self._pending.move_to_end(key)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._remember(key, row[0])
+            self._latest.pop(submission_id, None)
+            self._puts += 1
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='results-store-writer', daemon=True)
+                self._writer.start()
+
+    def get(self, submission_id: str, kind: str, input_hash: str, version: str) -> Optional[Any]:
+        return self.get_many([(submission_id, kind, input_hash, version)])[0]
+
+    def get_many(self, keys: Sequence[Key]) -> List[Optional[Any]]:
+        """
+        Stored results for keys (None where there is none), with one backend
+        query for everything not cached or still queued
+        """
+        results: List[Optional[Any]] = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = loads(self._cache[key])
+                    self.cache_hits += 1
+                    continue
+                queued = self._pending.get(key) or self._inflight.get(key)
+                if queued is not None:
+                    results[i] = loads(queued[0])
+                    self._remember(key, queued[0])
+                    self.cache_hits += 1
+                else:
+                    missing.append(i)
+        if not missing:
+            return results
+
+        found = self.backend.read([keys[i] for i in missing])
+        with self._lock:
+            for i in missing:
+                stored = found.get(keys[i])
+                if stored is None:
+                    self.misses += 1
+                    continue
+                results[i] = loads(stored)
+                self._remember(keys[i], stored)
+                self.backend_hits += 1
+        return results
+
+    def latest(self, submission_id: str) -> Dict[str, StoredResult]:
+        """
+        The most recent result of each kind for a submission, including queued rows
+        """
+        with self._lock:
+            cached = self._latest.get(submission_id)
+            if cached is not None:
+                self._latest.move_to_end(submission_id)
+                self.cache_hits += 1
+                return _decode_latest(cached)
+            queued = [(key, row) for key, row in (*self._pending.items(), *self._inflight.items())
+                      if key[0] == submission_id]
+            puts = self._puts
+
+        newest: Dict[str, Row] = {}
+        for row in self.backend.latest(submission_id):
+            newest[row[1]] = row
+        for key, (result, created_at) in queued:
+            if key[1] not in newest or created_at >= newest[key[1]][-1]:
+                newest[key[1]] = (*key, result, created_at)
+
+        with self._lock:
+            self.backend_hits += 1 if newest else 0
+            self.misses += 0 if newest else 1
+            # A put during the read may have been missed by it; cache only if there was none
+            if self._puts == puts:
+                self._latest[submission_id] = newest
+                while len(self._latest) > self.cache_entries:
+                    self._latest.popitem(last=False)
+        return _decode_latest(newest)
+
+    def flush(self) -> int:
+        """
+        Write every queued row now, in batches of batch_size; returns rows written
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return written
+                    batch = []
+                    while self._pending and len(batch) < self.batch_size:
+                        key, row = self._pending.popitem(last=False)
+                        self._inflight[key] = row
+                        batch.append((*key, *row))
+                try:
+                    self.backend.write(batch)
+                except Exception:
+                    with self._lock:
+                        self.failed_flushes += 1
+                        # Requeue ahead of newer rows, unless a newer put replaced the key
+                        requeued = OrderedDict((row[:4], row[4:]) for row in batch if row[:4] not in self._pending)
+                        requeued.update(self._pending)
+                        self._pending = requeued
+                        self._inflight.clear()
+                    raise
+                with self._lock:
+                    self._inflight.clear()
+                    self.flushes += 1
+                    self.written += len(batch)
+                written += len(batch)
+
+    def _write_loop(self):
+        while True:
+            with self._wake:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing analysis results failed; %d rows queued for retry', len(self._pending))
+                if not closed:
+                    time.sleep(self.flush_interval)
+            if closed:
+                return
+
+    def close(self):
+        """
+        Stop the writer after a final flush and close the backend
+        """
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        else:
+            self.flush()
+        self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'cached': len(self._cache),
+                'cache_hits': self.cache_hits,
+                'backend_hits': self.backend_hits,
+                'misses': self.misses,
+                'written': self.written,
+                'flushes': self.flushes,
+                'failed_flushes': self.failed_flushes,
+                'dropped': self.dropped,
+            }
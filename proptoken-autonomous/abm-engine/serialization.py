@@ -0,0 +1,73 @@
+"""
+JSON encoding for engine results.
+
+orjson serializes dicts of floats several times faster than the stdlib and
+handles NumPy scalars and arrays natively, so responses skip FastAPI's
+jsonable_encoder walk entirely. Without orjson installed the stdlib encoder is
+used with the same output rules: NumPy values become plain numbers or lists,
+and NaN/Infinity become null (they are not valid JSON).
+"""
+import json
+import math
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _is_numpy(value: Any) -> bool:
+    # Checked by module name so importing this module never imports NumPy
+    return type(value).__module__ == 'numpy'
+
+
+def _default(value: Any) -> Any:
+    if _is_numpy(value):
+        import numpy as np
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+    return str(value)
+
+
+def _finite(value: Any) -> Any:
+    # Stdlib fallback only: mirror orjson's NaN/Infinity -> null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    if _is_numpy(value):
+        return _finite(_default(value))
+    return value
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    Compact JSON bytes; sort_keys gives a canonical form for hashing
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+    return json.dumps(_finite(value), default=_default, sort_keys=sort_keys, separators=(',', ':'),
+                      allow_nan=False).encode()
+
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with dumps(). Handlers return it directly so FastAPI
+    does not run jsonable_encoder over the engine output first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
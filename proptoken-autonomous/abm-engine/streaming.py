@@ -0,0 +1,82 @@
+"""
+Helpers for the NDJSON bulk endpoint: incremental request-body parsing and a
+streaming response that can send results while the upload is still arriving.
+"""
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import StreamingResponse
+
+from serialization import dumps
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for bodies that are produced while the request body is still
+    being read.
+
+    On servers advertising ASGI spec < 2.4 (uvicorn included) StreamingResponse
+    also listens on receive() for a disconnect. That would consume the upload's
+    http.request messages out from under the generator. Here only the generator
+    calls receive(), through request.stream(), and a client disconnect surfaces
+    there as ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson(request: Request, model: Type[BaseModel], max_line_bytes: int
+                      ) -> AsyncIterator[Tuple[int, Optional[BaseModel], Optional[str]]]:
+    """
+    Yield (index, record, error) per non-blank line of the request body as it
+    arrives. Lines that fail validation, or grow past max_line_bytes, yield an
+    error instead of a record; only one partial line is ever buffered.
+    """
+    buffer = bytearray()
+    index = 0
+    oversized = False
+
+    def parse(line: bytes) -> Tuple[Optional[BaseModel], Optional[str]]:
+        try:
+            return model.model_validate_json(line), None
+        except ValidationError as e:
+            return None, '; '.join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())
+
+    async for piece in request.stream():
+        buffer += piece
+        while True:
+            newline = buffer.find(b'\n')
+            if newline < 0:
+                break
+            line = bytes(buffer[:newline]).strip()
+            del buffer[:newline + 1]
+            if oversized or len(line) > max_line_bytes:
+                oversized = False
+                yield index, None, f'line exceeds {max_line_bytes} bytes'
+                index += 1
+            elif line:
+                yield (index, *parse(line))
+                index += 1
+        if len(buffer) > max_line_bytes:
+            # Drop the partial line but remember to report it once it ends
+            buffer.clear()
+            oversized = True
+
+    line = bytes(buffer).strip()
+    if oversized or len(line) > max_line_bytes:
+        yield index, None, f'line exceeds {max_line_bytes} bytes'
+    elif line:
+        yield (index, *parse(line))
+
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+    return dumps(record) + b'\n'
@@ -0,0 +1,103 @@
+"""
+Readers for local exports of the `submissions` table.
+
+An export is a CSV or Parquet file with (at least) a `data` column holding the
+submission JSON (the JSONB column, as text or already-decoded objects) and
+optionally an `id` column, e.g.
+
+    \\copy (SELECT id, data FROM submissions) TO 'submissions.csv' CSV HEADER
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _decode(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode()
+    if isinstance(value, str) and value:
+        return json.loads(value)
+    return {}
+
+
+def _rows_to_submissions(ids: List[Any], data: List[Any]) -> List[Dict[str, Any]]:
+    submissions = []
+    for submission_id, raw in zip(ids, data):
+        submission = _decode(raw)
+        if submission_id is not None and 'id' not in submission:
+            submission['id'] = str(submission_id)
+        submissions.append(submission)
+    return submissions
+
+
+def read_submissions(path: str, chunk_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield the export in chunks of decoded submission dicts, without loading the
+    whole file into memory
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in ('id', 'data') if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            table = batch.to_pydict()
+            data = table['data']
+            yield _rows_to_submissions(table.get('id', [None] * len(data)), data)
+    else:
+        import pandas as pd
+
+        for frame in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            data = frame['data'].tolist()
+            ids = frame['id'].tolist() if 'id' in frame.columns else [None] * len(data)
+            yield _rows_to_submissions(ids, data)
+
+
+def analysis_inputs(submission: Dict[str, Any]) -> Tuple[Dict, Dict, Dict, Dict]:
+    """
+    Split a submission into the (asset_data, location, financials, oracle_data)
+    arguments the engines take. asset_data is the submission itself, which
+    carries specifications, claimedValue, spv and registryIds.
+    """
+    return (
+        submission,
+        submission.get('location') or {},
+        submission.get('financials') or {},
+        submission.get('oracleData') or {}
+    )
+
+
+class SubmissionCatalog:
+    """
+    LRU map of submission id -> analysis inputs, so requests can refer to
+    submissions by id. The API fills it from the export and from every
+    submission it analyses; the oldest entries are dropped past max_entries.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[Dict, Dict, Dict, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, submission_id: str, inputs: Tuple[Dict, Dict, Dict, Dict]):
+        with self._lock:
+            self._entries[submission_id] = inputs
+            self._entries.move_to_end(submission_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, submission_id: str) -> Optional[Tuple[Dict, Dict, Dict, Dict]]:
+        with self._lock:
+            inputs = self._entries.get(submission_id)
+            if inputs is not None:
+                self._entries.move_to_end(submission_id)
+            return inputs
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'max_entries': self.max_entries}
@@ -0,0 +1,329 @@
+"""
+Module-level engine entry points.
+
+These functions are what the executor ships to its workers, so they must stay
+picklable: no FastAPI state, plain dict/list arguments only. Each process
+(including process-pool workers) builds its own engine instances on first use.
+
+Engines are registered by name and their modules (NumPy, the comparables
+dataset, the anomaly model) are only imported when an engine is first built,
+so importing this module, and main with it, stays cheap.
+"""
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from engines.timing import StageTimer
+
+if TYPE_CHECKING:
+    from engines.fraud_detection import FraudDetectionEngine
+    from engines.market_intelligence import MarketIntelligenceEngine
+    from engines.portfolio import PortfolioAnalyzer
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_engines: Dict[str, Any] = {}
+_load_seconds: Dict[str, float] = {}
+_stage_memo = None
+_portfolio = None
+_pool_worker = False    # set in process-pool workers, see init_pool_worker
+
+
+def _build_market_engine() -> 'MarketIntelligenceEngine':
+    from engines.comparables import DatasetComparablesProvider
+    from engines.market_intelligence import MarketIntelligenceEngine
+    from engines.stress import MonteCarloStressTester
+    from engines.valuation import ValuationAdjustments
+
+    comparables = DatasetComparablesProvider(
+        settings.comparables_path,
+        seed=settings.comparables_seed,
+        sample_size=settings.comparables_sample_size or None,
+        refresh_interval=settings.comparables_refresh_seconds,
+        k=settings.comparables_k,
+        radius_m=settings.comparables_radius_m,
+        min_nearby=settings.comparables_min_nearby,
+        cell_m=settings.comparables_cell_m
+    )
+    stress_tester = MonteCarloStressTester(
+        n_paths=settings.stress_paths,
+        time_budget_ms=settings.stress_time_budget_ms,
+        seed=settings.stress_seed
+    )
+    adjustments = ValuationAdjustments(settings.valuation_adjustments_path)
+    return MarketIntelligenceEngine(comparables, stress_tester, adjustments)
+
+
+def _build_fraud_engine() -> 'FraudDetectionEngine':
+    from engines.anomaly_model import IsolationForestScorer
+    from engines.fraud_detection import FraudDetectionEngine
+    from engines.fraud_rules import FraudRuleRegistry
+
+    rules = FraudRuleRegistry(
+        settings.fraud_rules_path,
+        refresh_interval=settings.fraud_rules_refresh_seconds
+    )
+    # Optional: without a trained model only the rules run
+    anomaly_model = IsolationForestScorer.load_optional(settings.anomaly_model_path)
+    return FraudDetectionEngine(rules, anomaly_model)
+
+
+ENGINES: Dict[str, Callable[[], Any]] = {
+    'market': _build_market_engine,
+    'fraud': _build_fraud_engine,
+}
+
+
+def engine(name: str) -> Any:
+    """
+    The engine registered as name, built (and timed) on first use
+    """
+    instance = _engines.get(name)
+    if instance is None:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown engine '{name}', expected one of {tuple(ENGINES)}")
+        with _lock:
+            instance = _engines.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = ENGINES[name]()
+                _load_seconds[name] = time.perf_counter() - started
+                _engines[name] = instance
+    return instance
+
+
+def market_engine() -> 'MarketIntelligenceEngine':
+    return engine('market')
+
+
+def fraud_engine() -> 'FraudDetectionEngine':
+    return engine('fraud')
+
+
+def loaded_engines() -> Dict[str, float]:
+    """
+    Seconds each engine took to build, for the engines built so far in this process
+    """
+    return dict(_load_seconds)
+
+
+def warmup():
+    """
+    Build every engine and load its data up front (used as the pool worker
+    initializer and by the API's background warmup)
+    """
+    for name in ENGINES:
+        engine(name)
+
+
+def init_pool_worker():
+    """
+    Process-pool worker initializer: warmup, and mark the process as a worker so
+    detect_fraud_batch hands its rule stats back to the API process
+    """
+    global _pool_worker
+    _pool_worker = True
+    warmup()
+    # A forked worker starts with a copy of the API process's stats, which are already counted there
+    fraud_engine().rules.drain_stats()
+
+
+def reload_comparables() -> Dict[str, Any]:
+    comparables = market_engine().comparables
+    changed = comparables.reload()
+    return {'changed': changed, 'version': comparables.version}
+
+
+def reload_fraud_rules() -> Dict[str, Any]:
+    rules = fraud_engine().rules
+    reloaded = rules.reload()
+    return {'reloaded': reloaded, 'version': rules.version, 'rules': len(rules.rules)}
+
+
+def fraud_rule_stats() -> Dict[str, Any]:
+    return fraud_engine().rules.stats()
+
+
+def oracle_input_paths() -> Tuple[str, ...]:
+    """
+    The oracle_data paths the engines read: the satellite result and any
+    oracle_data fields the active fraud rules name
+    """
+    from engines.records import ORACLE_PATHS
+
+    rule_fields = fraud_engine().rules.active().fields
+    return ORACLE_PATHS + tuple(f.split('.', 1)[1] for f in rule_fields if f.startswith('oracle_data.'))
+
+
+def merge_fraud_rule_stats(stats: Dict[str, Any]):
+    # Rule stats returned by a pool worker's detect_fraud_batch
+    fraud_engine().rules.merge_stats(stats)
+
+
+def _snapshot(directory: str, engine_name: str, run, inputs: Dict[str, Any], provenance: Dict[str, Any],
+              asset_data: List[Dict], timer: StageTimer):
+    # A failed snapshot write is logged, never turned into a failed analysis
+    from engines.duplicate_index import submission_id
+    from engines.snapshot import save_snapshot, snapshot_path
+
+    with timer.stage('snapshot'):
+        try:
+            save_snapshot(snapshot_path(directory, engine_name), engine_name, run, inputs, provenance,
+                          [submission_id(a) for a in asset_data])
+        except Exception:
+            logger.exception('Writing a %s snapshot to %s failed', engine_name, directory)
+
+
+def analyze_market_batch(asset_data: List[Dict], locations: List[Dict], financials: List[Dict],
+                         oracle_data: List[Dict], snapshot_dir: Optional[str] = None
+                         ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    Returns (results, stage seconds); the timings travel back with the results
+    so the API process can record them whichever executor mode ran the call.
+    With a snapshot directory (argument or ABM_SNAPSHOT_DIR) the inputs and
+    stage outputs are also saved for replay (see engines.snapshot).
+    """
+    from engines.records import RecordBatch
+
+    timer = StageTimer()
+    market = market_engine()
+    with timer.stage('records'):
+        batch = RecordBatch.from_dicts(asset_data, locations, financials, oracle_data)
+    run = market.run_stages(batch, timer)
+    with timer.stage('results'):
+        results = market.build_results(run)
+    directory = snapshot_dir or settings.snapshot_dir
+    if directory and results:
+        inputs = {'asset_data': asset_data, 'locations': locations, 'financials': financials,
+                  'oracle_data': oracle_data}
+        _snapshot(directory, 'market', run, inputs, results[0]['provenance'], asset_data, timer)
+    return results, timer.seconds
+
+
+def market_sensitivity_batch(asset_data: List[Dict], locations: List[Dict], financials: List[Dict],
+                             oracle_data: List[Dict], grids: List[Dict[str, List[float]]]
+                             ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    One sensitivity grid per asset (see MarketIntelligenceEngine.sensitivity)
+    """
+    from engines.records import RecordBatch
+
+    timer = StageTimer()
+    market = market_engine()
+    with timer.stage('records'):
+        batch = RecordBatch.from_dicts(asset_data, locations, financials, oracle_data)
+    results = [
+        market.sensitivity(RecordBatch([record]), grid, timer)
+        for record, grid in zip(batch.records, grids)
+    ]
+    return results, timer.seconds
+
+
+def detect_fraud_batch(asset_data: List[Dict], financials: List[Dict], oracle_data: List[Dict],
+                       duplicates: Optional[List[List[Dict]]] = None, snapshot_dir: Optional[str] = None
+                       ) -> Tuple[List[Dict[str, Any]], Dict[str, float], Dict[str, Any]]:
+    """
+    Returns (results, stage seconds, rule stats). In a process-pool worker the
+    rule stats are those gathered since its previous call, for the API process
+    to merge (merge_fraud_rule_stats); elsewhere they are already counted in
+    this process and the dict is empty.
+    """
+    from engines.records import RecordBatch
+
+    timer = StageTimer()
+    fraud = fraud_engine()
+    with timer.stage('records'):
+        batch = RecordBatch.from_dicts(asset_data, None, financials, oracle_data)
+    ruleset = fraud.rules.active()
+    run = fraud.run_stages(batch, ruleset, duplicates, timer)
+    with timer.stage('results'):
+        results = fraud.build_results(ruleset, run, duplicates)
+    directory = snapshot_dir or settings.snapshot_dir
+    if directory and results:
+        inputs = {'asset_data': asset_data, 'financials': financials, 'oracle_data': oracle_data,
+                  'duplicates': duplicates}
+        _snapshot(directory, 'fraud', run, inputs, results[0]['provenance'], asset_data, timer)
+    return results, timer.seconds, fraud.rules.drain_stats() if _pool_worker else {}
+
+
+def replay_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Replay one snapshot file against this process's engines and compare it bit
+    for bit with the recording (see engines.snapshot.replay_snapshot)
+    """
+    from engines.snapshot import load_snapshot, replay_snapshot as replay
+
+    started = time.perf_counter()
+    snapshot = load_snapshot(path)
+    report = replay(snapshot, engine(snapshot.engine))
+    return {'path': path, **report, 'seconds': time.perf_counter() - started}
+
+
+def stage_memo():
+    global _stage_memo
+    if _stage_memo is None:
+        from engines.stage_graph import StageMemo
+
+        with _lock:
+            if _stage_memo is None:
+                _stage_memo = StageMemo(settings.stage_memo_entries)
+    return _stage_memo
+
+
+def reanalyze(asset_data: Dict, location: Dict, financials: Dict, oracle_data: Dict,
+              duplicates: Optional[List[Dict]] = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Market and fraud analysis of one submission through the stage memo: stages
+    whose inputs are unchanged since this process last analysed it are reused.
+    The memo is per process, so in process mode reuse depends on which worker
+    serves the call; results are the same either way.
+    """
+    from engines.records import RecordBatch
+
+    timer = StageTimer()
+    memo = stage_memo()
+    with timer.stage('records'):
+        batch = RecordBatch.from_dicts([asset_data], [location], [financials], [oracle_data])
+    market = market_engine()
+    market_run = market.run_stages(batch, timer, memo)
+    fraud = fraud_engine()
+    ruleset = fraud.rules.active()
+    fraud_duplicates = [duplicates] if duplicates is not None else None
+    fraud_run = fraud.run_stages(batch, ruleset, fraud_duplicates, timer, memo)
+    with timer.stage('results'):
+        result = {
+            'market': market.build_results(market_run)[0],
+            'fraud': fraud.build_results(ruleset, fraud_run, fraud_duplicates)[0],
+            'stages': {'market': market_run.report(), 'fraud': fraud_run.report()},
+        }
+    return result, timer.seconds
+
+
+def portfolio_analyzer() -> 'PortfolioAnalyzer':
+    global _portfolio
+    if _portfolio is None:
+        from engines.portfolio import PortfolioAnalyzer
+
+        market = market_engine()
+        with _lock:
+            if _portfolio is None:
+                _portfolio = PortfolioAnalyzer(market)
+    return _portfolio
+
+
+def analyze_portfolio(asset_data: List[Dict], locations: List[Dict], financials: List[Dict], oracle_data: List[Dict],
+                      ids: List[str], shares: List[float]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Portfolio NAV, concentration and correlated stress over the holdings, with
+    every holding analysed in one market engine pass
+    """
+    from engines.records import RecordBatch
+
+    timer = StageTimer()
+    with timer.stage('records'):
+        batch = RecordBatch.from_dicts(asset_data, locations, financials, oracle_data)
+    result = portfolio_analyzer().analyze(batch, shares, ids, timer)
+    return result, timer.seconds
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service modules (main, tasks, results_store, ...) live at the engine root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from engines.anomaly_model import FEATURES, IsolationForestScorer, average_path_length, compile_isolation_forest
+
+# Two trees: a split on yield at 10 into leaves of 1 and 3 samples, and a lone leaf of 4 samples
+TINY_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'anomaly_model')
+
+
+def c(n):
+    return float(average_path_length(np.array([n]))[0])
+
+
+@pytest.mark.parametrize('max_features', [1.0, 0.5])
+def test_compiled_forest_scores_like_sklearn(tmp_path, max_features):
+    ensemble = pytest.importorskip('sklearn.ensemble')
+    rng = np.random.default_rng(4)
+    X = np.vstack([rng.normal(0, 1, (500, len(FEATURES))), rng.normal(6, 1, (5, len(FEATURES)))])
+    X = X.astype(np.float32).astype(np.float64)    # as feature_matrix rounds its inputs
+    model = ensemble.IsolationForest(n_estimators=25, max_samples=64, max_features=max_features,
+                                     random_state=0).fit(X)
+
+    scorer = IsolationForestScorer(*compile_isolation_forest(model))
+    scorer.save(str(tmp_path))
+    loaded = IsolationForestScorer.load(str(tmp_path))
+    assert isinstance(loaded.threshold, np.memmap)
+    assert loaded.version == scorer.version
+    np.testing.assert_allclose(loaded.score(X), -model.score_samples(X), rtol=1e-12)
+
+
+def test_committed_model_loads_memory_mapped():
+    scorer = IsolationForestScorer.load(TINY_MODEL)
+    assert all(isinstance(getattr(scorer, name), np.memmap) for name in ('feature', 'threshold', 'leaf_value'))
+    X = np.zeros((2, len(FEATURES)))
+    X[:, 0] = [5.0, 12.0]
+    lone_leaf = c(4)
+    expected = 2.0 ** (-np.array([(1 + c(1) + lone_leaf) / 2, (1 + c(3) + lone_leaf) / 2]) / lone_leaf)
+    np.testing.assert_allclose(scorer.score(X), expected, rtol=1e-12)
+    assert scorer.score(np.zeros((0, len(FEATURES)))).shape == (0,)
+    assert IsolationForestScorer.load_optional(TINY_MODEL).version == scorer.version
+
+
+def test_missing_or_mismatched_models(tmp_path):
+    assert IsolationForestScorer.load_optional(None) is None
+    assert IsolationForestScorer.load_optional('') is None
+    assert IsolationForestScorer.load_optional(str(tmp_path / 'missing')) is None
+
+    other = tmp_path / 'other'
+    shutil.copytree(TINY_MODEL, other)
+    meta = json.loads((other / 'meta.json').read_text())
+    (other / 'meta.json').write_text(json.dumps({**meta, 'features': meta['features'][:-1]}))
+    with pytest.raises(ValueError, match='different features'):
+        IsolationForestScorer.load_optional(str(other))
@@ -0,0 +1,54 @@
+import copy
+
+import pytest
+
+from benchmarks.common import make_assets
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from engines.duplicate_index import SubmissionIndex
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    monkeypatch.setattr(main, 'cache', None)
+    monkeypatch.setattr(main, 'results_store', None)
+    monkeypatch.setattr(main, 'submission_index', SubmissionIndex())
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_market_batch_matches_single_requests_in_order(client):
+    assets = make_assets(4, seed=5)
+    response = client.post('/analyze/market/batch', json={'assets': assets})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 4
+    assert body['results'] == [client.post('/analyze/market', json=asset).json() for asset in assets]
+    assert len({str(result['expected_nav']) for result in body['results']}) == 4    # not one result repeated
+
+    assert client.post('/analyze/market/batch', json={'assets': []}).json() == {'count': 0, 'results': []}
+
+
+def test_fraud_batch_reports_each_asset(client):
+    assets = make_assets(3, seed=6)
+    assets[1]['financials']['expectedYield'] = 25
+    # The last asset is the first one resubmitted under a new id
+    assets[2] = copy.deepcopy(assets[0])
+    assets[2]['asset_data']['id'] = 'bench-6-copy'
+
+    body = client.post('/analyze/fraud/batch', json={'assets': assets}).json()
+    results = body['results']
+    assert body['count'] == 3
+    assert 'yield_anomaly' in [a['type'] for a in results[1]['anomalies']]
+    assert 'yield_anomaly' not in [a['type'] for a in results[0]['anomalies']]
+    assert results[0]['duplicates'] == [] and results[1]['duplicates'] == []
+    assert [d['submission_id'] for d in results[2]['duplicates']] == [assets[0]['asset_data']['id']]
+
+
+def test_invalid_asset_is_reported_by_position(client):
+    response = client.post('/analyze/market/batch', json={'assets': [make_assets(1)[0], {'asset_data': 5}]})
+    assert response.status_code == 422
+    assert {tuple(error['loc'][:3]) for error in response.json()['detail']} == {('body', 'assets', 1)}
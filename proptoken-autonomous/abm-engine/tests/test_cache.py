@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import numpy as np
+
+from cache import ResultCache, SQLiteCacheTier, request_key
+
+
+def test_request_key_is_canonical():
+    assert request_key('market', {'a': 1, 'b': 2}) == request_key('market', {'b': 2, 'a': 1})
+    assert request_key('market', {'a': 1}) != request_key('fraud', {'a': 1})
+    assert request_key('market', {'a': 1}, 'v1') != request_key('market', {'a': 1}, 'v2')
+
+
+def test_hits_are_copies():
+    cache = ResultCache()
+    cache.set('market:k', {'expected_nav': {'mean': np.float64(1.5)}, 'tags': ['a']})
+    first = cache.get('market:k')
+    first['expected_nav']['mean'] = 99
+    first['tags'].append('b')
+    assert cache.get('market:k') == {'expected_nav': {'mean': 1.5}, 'tags': ['a']}
+    assert cache.stats()['hits'] == 2
+
+
+def test_disk_tier_is_shared(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResultCache(disk=SQLiteCacheTier(path)).set_many([('market:a', {'v': 1}), ('fraud:b', {'v': 2})])
+
+    other = ResultCache(disk=SQLiteCacheTier(path))
+    assert other.blocking()
+    assert other.get_many(['market:a', 'fraud:b', 'market:c']) == [{'v': 1}, {'v': 2}, None]
+    stats = other.stats()
+    assert stats['disk_hits'] == 2 and stats['misses'] == 1
+    other.invalidate('market')
+    assert ResultCache(disk=SQLiteCacheTier(path)).get_many(['market:a', 'fraud:b']) == [None, {'v': 2}]
+
+
+def test_byte_bound_evicts_oldest():
+    cache = ResultCache(max_bytes=40)
+    for i in range(4):
+        cache.set(f'market:{i}', {'value': i})    # 11 bytes each
+    assert cache.get_many([f'market:{i}' for i in range(4)]) == [None, {'value': 1}, {'value': 2}, {'value': 3}]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_api_cache_calls_do_not_block_the_event_loop(tmp_path, monkeypatch):
+    import main
+
+    class SlowTier(SQLiteCacheTier):
+        def get(self, key):
+            time.sleep(0.2)
+            return super().get(key)
+
+    cache = ResultCache(disk=SlowTier(str(tmp_path / 'cache.db')))
+    monkeypatch.setattr(main, 'cache', cache)
+    calls = []
+
+    def engine(values):
+        return [{'value': v['id']} for v in values], {}
+
+    async def scenario():
+        main.engine_warmup = asyncio.get_running_loop().create_future()
+        main.engine_warmup.set_result(None)
+        main.executor.mode = 'inline'
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        request = main.AnalysisRequest(asset_data={'id': 'sub-1'}, location={'city': 'Gurugram'},
+                                       financials={}, oracle_data={})
+        clock = asyncio.create_task(ticker())
+        results = await main.run_cached('probe', [request], lambda *args: calls.append(args) or engine(args[0]),
+                                        ('asset_data',))
+        clock.cancel()
+        return results, ticks
+
+    mode, warmup = main.executor.mode, main.engine_warmup
+    try:
+        results, ticks = asyncio.run(scenario())
+    finally:
+        main.executor.mode, main.engine_warmup = mode, warmup
+    assert results == [{'value': 'sub-1'}]
+    assert ticks >= 5    # the loop kept running while the disk tier was read
+    assert len(calls) == 1
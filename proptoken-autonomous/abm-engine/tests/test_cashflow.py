@@ -0,0 +1,122 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from engines.cashflow import cash_flow_metrics, pack
+from engines.records import RecordBatch
+
+
+def month(i):
+    return f'{2020 + i // 12}-{i % 12 + 1:02d}'
+
+
+def history(incomes, expenses=1000.0, start=0, skip=()):
+    return [{'month': month(start + i), 'income': income, 'expenses': expenses}
+            for i, income in enumerate(incomes) if i not in skip]
+
+
+def batch(*histories):
+    n = len(histories)
+    return RecordBatch.from_dicts([{} for _ in range(n)], [{} for _ in range(n)],
+                                  [{'historicalCashFlow': h} for h in histories], [{} for _ in range(n)])
+
+
+def reference(entries):
+    # Plain per-asset versions of the metrics, for a dated series without gaps
+    noi = np.array([e['income'] - e['expenses'] for e in entries])
+    t = np.arange(len(noi), dtype=np.float64)
+    income = np.array([e['income'] for e in entries])
+    return {
+        'trailing_noi': noi[-12:].mean() * 12,
+        'noi_volatility': noi.std() / abs(noi.mean()),
+        'noi_trend': np.polyfit(t, noi, 1)[0] / abs(noi.mean()),
+        'income_spike': income[-3:].mean() / np.median(income[:-3]),
+    }
+
+
+def test_metrics_match_a_per_asset_reference():
+    rng = np.random.default_rng(3)
+    series = [history(list(20000 + rng.normal(0, 800, n).cumsum()), start=s) for n, s in ((30, 0), (7, 5), (14, 40))]
+    metrics = cash_flow_metrics(batch(*series))
+    for i, entries in enumerate(series):
+        for name, expected in reference(entries).items():
+            assert metrics[name][i] == pytest.approx(expected, rel=1e-9), (name, i)
+    assert metrics['months'].tolist() == [30, 7, 14]
+    assert metrics['gap_months'].tolist() == [0, 0, 0]
+
+
+def test_order_gaps_and_short_histories():
+    shuffled = history([100, 200, 300, 400, 500], expenses=0, skip=(2,))[::-1]
+    undated = [{'month': 'n/a', 'income': 10}, {'income': 20}, {'income': 30}]
+    metrics = cash_flow_metrics(batch(shuffled, undated, [], history([100, 100])))
+
+    packed = pack(batch(shuffled))
+    assert packed.income[0].tolist() == [100, 200, 400, 500]    # sorted by month
+    assert metrics['gap_months'][0] == 1
+    assert metrics['noi_trend'][0] > 0
+    # Undated series keep their order, have no calendar metrics, and missing expenses are 0
+    assert metrics['trailing_noi'][1] == 240 and math.isnan(metrics['gap_months'][1])
+    assert metrics['noi_trend'][1] == pytest.approx(0.5)    # +10 per entry around a mean of 20
+    # No history, or too short for the windowed metrics
+    assert metrics['months'][2] == 0 and math.isnan(metrics['trailing_noi'][2])
+    assert math.isnan(metrics['noi_volatility'][3]) and math.isnan(metrics['income_spike'][3])
+
+
+def test_seasonality_needs_two_cycles():
+    seasonal = [20000 + 3000 * math.sin(2 * math.pi * i / 12) for i in range(36)]
+    noise = list(20000 + np.random.default_rng(5).normal(0, 500, 36))
+    metrics = cash_flow_metrics(batch(history(seasonal), history(noise), history(seasonal[:18])))
+    assert metrics['seasonality'][0] > 0.9
+    assert metrics['seasonality'][1] < 0.5
+    assert math.isnan(metrics['seasonality'][2])
+
+
+def test_long_histories_are_truncated():
+    packed = pack(batch(history(list(range(1, 151)))), max_months=120)
+    assert packed.income.shape == (1, 120) and packed.lengths.tolist() == [120]
+    assert packed.income[0, 0] == 31 and packed.income[0, -1] == 150
+
+
+# The sample submission of backend_test.py: its history reports ten times the monthly rent
+SAMPLE = {
+    'asset_data': {'specifications': {'size': 25000, 'type': 'commercial', 'age': 5, 'condition': 'excellent'},
+                   'claimedValue': 75000000, 'registryIds': ['KA/BLR/2020/12345']},
+    'location': {'city': 'Bengaluru', 'postalCode': '560001', 'coordinates': {'lat': 12.9716, 'lng': 77.5946}},
+    'financials': {
+        'currentRent': 450000, 'expectedYield': 8.5, 'annualExpenses': 1200000, 'occupancyRate': 85,
+        'historicalCashFlow': [
+            {'month': '2024-01', 'income': 4500000, 'expenses': 100000},
+            {'month': '2024-02', 'income': 4650000, 'expenses': 105000},
+            {'month': '2024-03', 'income': 4500000, 'expenses': 98000},
+        ],
+    },
+    'oracle_data': {},
+}
+
+
+def test_implausible_history_falls_back_to_the_stated_yield(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    consistent = json.loads(json.dumps(SAMPLE))
+    consistent['asset_data']['id'] = 'sample-consistent'
+    with TestClient(main.app) as client:
+        sample = client.post('/analyze/market', json=SAMPLE).json()
+        nav_mid = sample['expected_nav']['mean']
+        # A history matching the stated yield is used as is
+        for entry in consistent['financials']['historicalCashFlow']:
+            entry.update(income=0.085 * nav_mid / 12 + 100000, expenses=100000)
+        matching = client.post('/analyze/market', json=consistent).json()
+
+    band = sample['yield_band']
+    assert band['noi_source'] == 'history_rejected'
+    assert band['min'] == pytest.approx(8.5 * nav_mid / sample['expected_nav']['max'])
+    assert band['max'] == pytest.approx(8.5 * nav_mid / sample['expected_nav']['min'])
+    assert sample['cash_flow']['trailing_noi'] == pytest.approx(4449000 * 12)    # still reported
+
+    assert matching['yield_band']['noi_source'] == 'history'
+    assert matching['yield_band']['min'] < 8.5 < matching['yield_band']['max']
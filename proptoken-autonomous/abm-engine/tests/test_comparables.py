@@ -0,0 +1,145 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from engines.comparables import DatasetComparablesProvider
+from engines.geo_index import haversine_m
+
+HEADER = 'city,postal_code,price_per_sqft,lat,lng\n'
+# Postal code 110001 and a city-only row in Delhi, Mumbai, two fallback rows, and a
+# cluster of located Pune rows around (18.52, 73.85)
+ROWS = [
+    'Delhi,110001,100,,',
+    'Delhi,110001,200,,',
+    'Delhi,,600,,',
+    'Mumbai,400001,1000,,',
+    '*,,50,,',
+    '*,,70,,',
+    'Pune,411001,300,18.5200,73.8500',
+    'Pune,411001,400,18.5210,73.8500',
+    'Pune,411001,500,18.5200,73.8510',
+    'Pune,411001,900,18.6000,73.9500',
+]
+
+
+def write(path, rows, mtime=None):
+    path.write_text(HEADER + '\n'.join(rows) + '\n')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def provider(path, **kwargs):
+    return DatasetComparablesProvider(path, refresh_interval=0, min_nearby=3, **kwargs)
+
+
+def test_lookup_order_is_postal_code_then_city_then_fallback(tmp_path):
+    comparables = provider(write(tmp_path / 'comparables.csv', ROWS))
+    assert comparables.lookup({'postalCode': '110001', 'city': 'Mumbai'}).tolist() == [100, 200]
+    assert sorted(comparables.lookup({'postalCode': '999999', 'city': ' DELHI '}).tolist()) == [100, 200, 600]
+    assert comparables.lookup({'city': 'Atlantis'}).tolist() == [50, 70]
+    assert comparables.lookup(None).tolist() == [50, 70]
+
+    means, stds = comparables.stats([{'postalCode': '400001'}, {'city': 'delhi'}, {}])
+    np.testing.assert_allclose(means, [1000, 300, 60])
+    np.testing.assert_allclose(stds, [0, np.std([100, 200, 600]), 10])
+
+    # Without '*' rows the whole dataset is the fallback
+    whole = provider(write(tmp_path / 'no_fallback.csv', ROWS[:4]))
+    assert sorted(whole.lookup({'city': 'Atlantis'}).tolist()) == [100, 200, 600, 1000]
+
+
+def test_sampling_is_seeded(tmp_path):
+    path = write(tmp_path / 'comparables.csv', ROWS + [f'Goa,403001,{price},,' for price in range(100)])
+    first = provider(path, sample_size=10, seed=3).lookup({'city': 'goa'})
+    assert len(first) == 10
+    assert provider(path, sample_size=10, seed=3).lookup({'city': 'goa'}).tolist() == first.tolist()
+    assert provider(path, sample_size=10, seed=4).lookup({'city': 'goa'}).tolist() != first.tolist()
+    assert provider(path, sample_size=10, seed=3).version != provider(path, sample_size=10, seed=4).version
+
+
+def test_nearby_weights_the_nearest_by_inverse_distance(tmp_path):
+    comparables = provider(write(tmp_path / 'comparables.csv', ROWS), radius_m=1000)
+    lats, lngs = np.array([18.5203, 18.5203, 28.6, np.nan]), np.array([73.8503, 73.8503, 77.2, np.nan])
+    means, stds, counts = comparables.nearby(lats, lngs)
+
+    prices = np.array([300, 400, 500])
+    distances = haversine_m(18.5203, 73.8503, np.array([18.52, 18.521, 18.52]), np.array([73.85, 73.85, 73.851]))
+    weights = 1 / np.maximum(distances, 50)
+    expected = np.sum(weights * prices) / weights.sum()
+    assert counts.tolist() == [3, 3, 0, 0]    # the far Pune row is outside the radius
+    assert means[0] == pytest.approx(expected) and means[1] == means[0]
+    assert stds[0] == pytest.approx(np.sqrt(np.sum(weights * (prices - expected) ** 2) / weights.sum()))
+    assert np.isnan(means[2:]).all()
+
+    # Fewer than min_nearby comparables around: left to the postal code / city lookup
+    assert np.isnan(provider(str(tmp_path / 'comparables.csv'), radius_m=60).nearby(lats[:1], lngs[:1])[0]).all()
+
+
+def test_engine_prefers_nearby_then_postal_code_then_city(tmp_path):
+    from engines.market_intelligence import MarketIntelligenceEngine
+    from engines.records import RecordBatch
+
+    engine = MarketIntelligenceEngine(provider(write(tmp_path / 'comparables.csv', ROWS), radius_m=1000))
+    locations = [
+        {'postalCode': '110001', 'city': 'Pune', 'coordinates': {'lat': 18.5203, 'lng': 73.8503}},
+        {'postalCode': '110001', 'city': 'Pune', 'coordinates': {'lat': 10.0, 'lng': 10.0}},
+        {'city': 'Delhi'},
+    ]
+    batch = RecordBatch.from_dicts([{} for _ in locations], locations, [{} for _ in locations],
+                                   [{} for _ in locations])
+    columns = engine.run_stages(batch).outputs['comparables']
+    assert columns['nearby'].tolist() == [True, False, False]
+    assert 300 < columns['mean'][0] < 500
+    assert columns['mean'][1:].tolist() == [150, 300]
+
+
+def test_changed_file_is_reloaded_in_the_background(tmp_path):
+    path = write(tmp_path / 'comparables.csv', ROWS, mtime=1_000_000)
+    comparables = DatasetComparablesProvider(path, refresh_interval=0.05)
+    version = comparables.version
+    reloads = []
+    comparables.add_reload_listener(reloads.append)
+
+    # Rewritten with the same mtime: not noticed
+    write(tmp_path / 'comparables.csv', ROWS[:4] + ['*,,80,,'], mtime=1_000_000)
+    time.sleep(0.06)
+    assert comparables.lookup({'city': 'Atlantis'}).tolist() == [50, 70]
+
+    os.utime(path, (1_000_100, 1_000_100))
+    time.sleep(0.06)
+    comparables.lookup({})    # notices the change and starts the rebuild
+    deadline = time.monotonic() + 5
+    while not reloads and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reloads == [comparables]
+    assert comparables.version != version
+    assert comparables.lookup({'city': 'Atlantis'}).tolist() == [80]
+
+    # Touched but unchanged: reloaded, and nobody is told
+    os.utime(path, (1_000_200, 1_000_200))
+    time.sleep(0.06)
+    comparables.lookup({})
+    comparables._rebuilding.join(5)
+    assert len(reloads) == 1
+
+
+def test_api_cache_is_invalidated_on_reload(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    import tasks
+    from benchmarks.common import make_assets
+    from cache import ResultCache
+
+    cache = ResultCache()
+    monkeypatch.setattr(main, 'cache', cache)
+    monkeypatch.setattr(main, 'oracle_client', None)
+    request = make_assets(1)[0]
+    with TestClient(main.app) as client:
+        assert client.post('/analyze/market', json=request).status_code == 200
+        assert cache.stats()['entries'] == 1
+        tasks.market_engine().comparables._notify_reload()
+        assert cache.stats()['entries'] == 0
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from engines.duplicate_index import SubmissionIndex, match_features, submission_id
+from engines.geo_index import haversine_m
+
+
+def asset(sid=None, registry=(), spv=None, directors=(), lat=None, lng=None):
+    data = {'registryIds': list(registry), 'spv': {'spvRegistrationNumber': spv, 'directors': list(directors)}}
+    if sid is not None:
+        data['id'] = sid
+    if lat is not None:
+        data['location'] = {'coordinates': {'lat': lat, 'lng': lng}}
+    return data
+
+
+def reasons(matches):
+    return {match['submission_id']: sorted(match['reasons']) for match in matches}
+
+
+def test_matches_on_each_identifying_field():
+    index = SubmissionIndex(radius_m=100)
+    index.add('a', asset('a', registry=['GGN/2021-0042'], spv='U-123 45'))
+    index.add('b', asset('b', directors=['Asha  Rao', 'Vikram Singh']))
+    index.add('c', asset('c', lat=28.45, lng=77.02))
+
+    # Identifying values are normalised: case, punctuation and spacing do not matter
+    probe = asset('new', registry=['ggn 2021 0042'], spv='u12345', directors=['asha rao'], lat=28.4505, lng=77.02)
+    matches = index.query('new', probe)
+    assert reasons(matches) == {
+        'a': ['registry_id:GGN20210042', 'spv_registration:U12345'],
+        'b': ['director:asha rao'],
+        'c': ['coordinates'],
+    }
+    assert [match['submission_id'] for match in matches] == ['a', 'c', 'b']    # most reasons, then nearest first
+    assert matches[1]['distance_m'] == pytest.approx(55.6, abs=0.1)
+    assert index.query('far', asset('far', lat=28.46, lng=77.02)) == []
+
+    features = match_features([matches, []])
+    assert features['index.registry_id_matches'].tolist() == [1, 0]
+    assert features['index.spv_registration_matches'].tolist() == [1, 0]
+    assert features['index.director_matches'].tolist() == [1, 0]
+    assert features['index.nearby_matches'].tolist() == [1, 0]
+
+
+def test_a_submission_never_matches_itself():
+    index = SubmissionIndex()
+    data = asset('a', registry=['R-1'], lat=28.45, lng=77.02)
+    assert index.check_and_add(data) == []
+    assert index.check_and_add(data) == []
+    assert index.query('a', data) == []
+    assert reasons(index.query('b', data)) == {'a': ['coordinates', 'registry_id:R1']}
+
+
+def test_re_adding_replaces_previous_entries():
+    index = SubmissionIndex()
+    index.add('a', asset('a', registry=['R-1'], directors=['X'], lat=28.45, lng=77.02))
+    index.add('a', asset('a', registry=['R-2'], lat=12.97, lng=77.59))
+    assert len(index) == 1
+    assert index.query('b', asset('b', registry=['R1'], directors=['x'], lat=28.45, lng=77.02)) == []
+    assert reasons(index.query('b', asset('b', registry=['R2'], lat=12.97, lng=77.59))) == \
+        {'a': ['coordinates', 'registry_id:R2']}
+    assert index.stats()['keys'] == 1 and index.stats()['grid_cells'] == 1
+
+    index.remove('a')
+    assert len(index) == 0 and index.stats()['keys'] == 0 and index.stats()['grid_cells'] == 0
+
+
+def test_submission_id_falls_back_to_a_content_hash():
+    assert submission_id({'id': 'sub-1', 'name': 'x'}) == 'sub-1'
+    assert submission_id({'assetId': 7}) == '7'
+    first = submission_id({'name': 'Tower', 'registryIds': ['R-1']})
+    assert first.startswith('sha1:')
+    assert submission_id({'registryIds': ['R-1'], 'name': 'Tower'}) == first    # key order does not matter
+    assert submission_id({'name': 'Tower', 'registryIds': ['R-2']}) != first
+
+    # So re-analysing an id-less payload does not flag it as its own duplicate
+    index = SubmissionIndex()
+    data = asset(registry=['R-1'])
+    assert index.check_and_add(data) == [] and index.check_and_add(dict(data)) == []
+
+
+# Gurugram, the antimeridian, and the north pole
+CENTERS = [(28.45, 77.02), (-17.0, 179.9995), (89.9991, 10.0)]
+
+
+def test_nearby_matches_agree_with_brute_force():
+    rng = np.random.default_rng(11)
+    radius_m = 100.0
+    lats = np.concatenate([rng.normal(lat, 0.0008, 400) for lat, _ in CENTERS])
+    lngs = np.concatenate([rng.normal(lng, 0.0008 if abs(lat) < 80 else 5.0, 400) for lat, lng in CENTERS])
+    lats, lngs = np.clip(lats, -90, 90), (lngs + 180) % 360 - 180
+    index = SubmissionIndex(radius_m=radius_m, max_matches=len(lats))
+    for i, (lat, lng) in enumerate(zip(lats, lngs)):
+        index.add(f's{i}', {}, {'coordinates': [lat, lng]})
+
+    for q in rng.choice(len(lats), 60, replace=False):
+        distances = haversine_m(lats[q], lngs[q], lats, lngs)
+        expected = {f's{i}' for i in np.flatnonzero(distances <= radius_m) if i != q}
+        found = index.query(f's{q}', {}, {'coordinates': [lats[q], lngs[q]]})
+        assert {match['submission_id'] for match in found} == expected
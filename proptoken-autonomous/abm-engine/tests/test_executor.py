@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from executor import EngineExecutor, ExecutorSaturated
+
+
+def test_cancelled_requests_keep_their_slot_until_the_job_ends():
+    executor = EngineExecutor(mode='thread', max_workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    async def scenario():
+        request = asyncio.create_task(executor.run(work))
+        await asyncio.to_thread(started.wait, 5)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        # The job is still running in the pool, so it still counts against capacity
+        assert executor.stats()['in_flight'] == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(work)
+
+        release.set()
+        for _ in range(100):
+            if executor.stats()['in_flight'] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await executor.run(lambda: 'next')
+
+    assert asyncio.run(scenario()) == 'next'
+    stats = executor.stats()
+    assert stats['in_flight'] == 0 and stats['completed'] == 2 and stats['rejected'] == 1
+    executor.shutdown()
+
+
+def test_inline_and_failing_calls_release_their_slot():
+    executor = EngineExecutor(mode='inline', max_queue=0)
+
+    def fail():
+        raise ValueError('bad input')
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await executor.run(fail)
+        return await executor.run(lambda x: x * 2, 21)
+
+    assert asyncio.run(scenario()) == 42
+    assert executor.stats()['in_flight'] == 0
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from engines.fraud_detection import FraudDetectionEngine
+from engines.fraud_rules import FraudRuleRegistry, RuleStats
+
+RULES = {'rules': [
+    {'id': 'yield_anomaly', 'severity': 'high', 'score': 0.3, 'detail': 'Claimed yield {0:g}% is suspicious',
+     'when': [{'field': 'financials.expectedYield', 'op': '>', 'threshold': 20}]},
+    {'id': 'size_yield_mismatch', 'severity': 'medium', 'score': 0.2, 'detail': 'Large size with high yield',
+     'when': [{'field': 'asset_data.specifications.size', 'op': '>', 'threshold': 50000},
+              {'field': 'financials.expectedYield', 'op': '>', 'threshold': 15}]},
+]}
+
+
+def write_rules(path, document):
+    path.write_text(json.dumps(document))
+    return str(path)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return FraudRuleRegistry(write_rules(tmp_path / 'rules.json', RULES), refresh_interval=0)
+
+
+def detect(engine, records):
+    return engine.detect_batch([{'id': f'sub-{i}', 'specifications': {'size': size}} for i, (size, _) in enumerate(records)],
+                               [{'expectedYield': y} for _, y in records], [{} for _ in records])
+
+
+def test_rule_masks_on_known_records(registry):
+    ruleset = registry.active()
+    columns = {'financials.expectedYield': np.array([25.0, 16.0, 16.0, 5.0]),
+               'asset_data.specifications.size': np.array([1000.0, 60000.0, 1000.0, 90000.0])}
+    evaluation = ruleset.evaluate(columns, 4)
+    assert evaluation.masks.tolist() == [[True, False, False, False], [False, True, False, False]]
+    np.testing.assert_allclose(evaluation.scores, [0.3, 0.2, 0.0, 0.0])
+    assert evaluation.detail(0, 0) == 'Claimed yield 25% is suspicious'
+
+    results = detect(FraudDetectionEngine(registry), [(1000, 25), (60000, 16), (1000, 5)])
+    assert [[a['type'] for a in r['anomalies']] for r in results] == [['yield_anomaly'], ['size_yield_mismatch'], []]
+    assert [r['fraud_likelihood'] for r in results] == pytest.approx([3.0, 2.0, 0.0])    # scores on a 0-10 scale
+
+
+def test_reload_swaps_rules_and_keeps_them_on_a_bad_file(registry, tmp_path):
+    engine = FraudDetectionEngine(registry)
+    version = registry.version
+    detect(engine, [(1000, 25)])
+
+    changed = {'rules': [dict(RULES['rules'][0], when=[{'field': 'financials.expectedYield', 'op': '>', 'threshold': 30}])]}
+    write_rules(tmp_path / 'rules.json', changed)
+    assert registry.reload()
+    assert registry.version != version and [r.id for r in registry.rules] == ['yield_anomaly']
+    assert detect(engine, [(1000, 25)])[0]['anomalies'] == []
+    # Stats of rules that are gone are dropped; kept rules keep counting
+    assert [r['id'] for r in registry.stats()['rules']] == ['yield_anomaly']
+    assert registry.stats()['rules'][0]['evaluations'] == 2
+
+    (tmp_path / 'rules.json').write_text('{"rules": [{"id": "broken"}]}')
+    assert not registry.reload()
+    assert [r.id for r in registry.rules] == ['yield_anomaly']
+
+
+def test_yaml_rule_files(tmp_path):
+    yaml = pytest.importorskip('yaml')
+    path = tmp_path / 'rules.yaml'
+    path.write_text(yaml.safe_dump(RULES))
+    registry = FraudRuleRegistry(str(path), refresh_interval=0)
+    assert [rule.id for rule in registry.rules] == ['yield_anomaly', 'size_yield_mismatch']
+
+    path.write_text('rules: [unclosed')
+    assert registry.reload() is False
+    assert len(registry.rules) == 2
+
+def test_concurrent_evaluations_are_all_counted(registry):
+    ruleset = registry.active()
+    columns = {'financials.expectedYield': np.array([25.0, 5.0]), 'asset_data.specifications.size': np.zeros(2)}
+
+    def evaluate():
+        for _ in range(500):
+            ruleset.evaluate(columns, 2)
+
+    threads = [threading.Thread(target=evaluate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = {r['id']: r for r in registry.stats()['rules']}
+    assert stats['yield_anomaly']['evaluations'] == 4000
+    assert stats['yield_anomaly']['rows'] == 8000 and stats['yield_anomaly']['hits'] == 4000
+
+
+def test_drained_stats_merge_into_another_registry(registry, tmp_path):
+    api = FraudRuleRegistry(write_rules(tmp_path / 'api.json', RULES), refresh_interval=0)
+    detect(FraudDetectionEngine(registry), [(1000, 25), (60000, 16)])
+
+    api.merge_stats(registry.drain_stats())
+    api.merge_stats({'retired_rule': RuleStats(1, 1, 1, 0.0)})
+    assert all(r['evaluations'] == 0 for r in registry.stats()['rules'])
+    stats = {r['id']: r for r in api.stats()['rules']}
+    assert stats['yield_anomaly']['evaluations'] == 1 and stats['yield_anomaly']['hits'] == 1
+    assert stats['size_yield_mismatch']['rows'] == 2
+
+
+def test_process_workers_return_their_rule_stats():
+    import tasks
+    from benchmarks.common import make_assets
+    from executor import EngineExecutor
+
+    requests = make_assets(3)
+    columns = [[r[field] for r in requests] for field in ('asset_data', 'financials', 'oracle_data')]
+    executor = EngineExecutor(mode='process', max_workers=1, initializer=tasks.init_pool_worker)
+    try:
+        _, _, first = asyncio.run(executor.run(tasks.detect_fraud_batch, *columns))
+        _, _, second = asyncio.run(executor.run(tasks.detect_fraud_batch, *columns))
+    finally:
+        executor.shutdown()
+    assert first and all(s.evaluations == 1 and s.rows == 3 for s in first.values())
+    # Drained on every call, so the second call only reports its own evaluations
+    assert second.keys() == first.keys() and all(s.evaluations == 1 for s in second.values())
+
+    # In this process (inline and thread mode) the stats stay in the registry
+    _, _, local = tasks.detect_fraud_batch(*columns)
+    assert local == {}
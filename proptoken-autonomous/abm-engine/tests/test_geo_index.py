@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from engines.geo_index import GeoGrid, haversine_m
+
+
+def points(rng, centers, per_center, spread_deg):
+    lats = np.concatenate([rng.normal(lat, spread_deg, per_center) for lat, _ in centers])
+    lngs = np.concatenate([rng.normal(lng, spread_deg, per_center) for _, lng in centers])
+    return np.clip(lats, -90, 90), (lngs + 180) % 360 - 180
+
+
+def brute_force(lats, lngs, lat, lng, k, radius_m):
+    distances = haversine_m(lat, lng, lats, lngs)
+    rows = np.flatnonzero(distances <= radius_m)
+    rows = rows[np.argsort(distances[rows], kind='stable')][:k]
+    return rows, distances[rows]
+
+
+# Gurugram (dense), the antimeridian, and near the north pole
+CENTERS = [(28.45, 77.02), (-17.0, 179.99), (89.5, 10.0)]
+
+
+@pytest.mark.parametrize('k, radius_m, max_candidates', [(5, 2_000, 256), (20, 10_000, 16), (3, 50_000, 4)])
+def test_nearest_batch_matches_brute_force(k, radius_m, max_candidates):
+    rng = np.random.default_rng(7)
+    lats, lngs = points(rng, CENTERS, 2000, 0.05)
+    grid = GeoGrid(lats, lngs, cell_m=250, max_candidates=max_candidates)
+    query_lats, query_lngs = points(rng, CENTERS, 30, 0.06)
+
+    queries, rows, distances = grid.nearest_batch(query_lats, query_lngs, k, radius_m)
+    assert (np.diff(queries) >= 0).all()
+    for q, (lat, lng) in enumerate(zip(query_lats, query_lngs)):
+        expected_rows, expected_distances = brute_force(lats, lngs, lat, lng, k, radius_m)
+        mine = queries == q
+        np.testing.assert_allclose(distances[mine], expected_distances, rtol=1e-12)
+        assert rows[mine].tolist() == expected_rows.tolist()
+
+
+def test_nearest_handles_empty_and_isolated_queries():
+    grid = GeoGrid(np.array([28.45, 28.46]), np.array([77.02, 77.02]))
+    rows, distances = grid.nearest(28.45, 77.02, 5, 5_000)
+    assert rows.tolist() == [0, 1] and distances[0] == 0
+    assert distances[1] == pytest.approx(1112, rel=0.01)    # 0.01 degree of latitude
+    assert len(grid.nearest(0.0, 0.0, 5, 5_000)[0]) == 0
+    assert len(GeoGrid(np.empty(0), np.empty(0)).nearest(28.45, 77.02, 5, 5_000)[0]) == 0
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.common import make_assets
+
+
+@pytest.fixture
+def main(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    return main
+
+
+def wait_until_ready(client):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        response = client.get('/health/ready')
+        if response.status_code != 503 or response.json()['status'] != 'starting':
+            return response
+        time.sleep(0.01)
+    raise AssertionError('warmup did not finish')
+
+
+def test_ready_only_after_warmup(main, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import tasks
+
+    release = threading.Event()
+    warmup = tasks.warmup
+
+    def slow_warmup():
+        release.wait(10)
+        warmup()
+
+    monkeypatch.setattr(tasks, 'warmup', slow_warmup)
+    with TestClient(main.app) as client:
+        assert client.get('/health/live').json()['status'] == 'alive'
+        response = client.get('/health/ready')
+        assert response.status_code == 503 and response.json()['status'] == 'starting'
+        assert 'abm_startup_ready 0\n' in client.get('/metrics').text
+
+        release.set()
+        response = wait_until_ready(client)
+        assert response.status_code == 200
+        assert response.json()['status'] == 'ready'
+        assert set(response.json()['engines']) == set(tasks.ENGINES)
+        assert client.post('/analyze/market', json=make_assets(1)[0]).status_code == 200
+
+
+def test_analysis_waits_for_warmup(main, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import tasks
+
+    warmup = tasks.warmup
+
+    def slow_warmup():
+        time.sleep(0.2)
+        warmup()
+
+    monkeypatch.setattr(tasks, 'warmup', slow_warmup)
+    with TestClient(main.app) as client:
+        # Held until the engines are loaded rather than rejected
+        assert client.post('/analyze/fraud', json=make_assets(1, seed=9)[0]).status_code == 200
+        assert client.get('/health/ready').status_code == 200
+
+
+def test_failed_warmup_is_reported(main, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import tasks
+
+    def broken_warmup():
+        raise RuntimeError('comparables dataset is unreadable')
+
+    monkeypatch.setattr(tasks, 'warmup', broken_warmup)
+    with TestClient(main.app) as client:
+        response = wait_until_ready(client)
+        assert response.status_code == 503
+        assert response.json()['status'] == 'failed'
+        assert response.json()['error'] == 'comparables dataset is unreadable'
+        assert client.get('/health/live').status_code == 200
+
+        response = client.post('/analyze/market', json=make_assets(1)[0])
+        assert response.status_code == 503
+        assert 'comparables dataset is unreadable' in response.json()['detail']
@@ -0,0 +1,63 @@
+import re
+
+from benchmarks.common import make_assets
+from metrics import CONTENT_TYPE, Metrics
+
+
+def samples(text):
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    return values
+
+
+def test_render_counters_histograms_and_snapshots():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.describe('jobs_total', 'Jobs run')
+    metrics.inc('jobs_total', (('kind', 'a"b'),), 2)
+    metrics.inc('jobs_total', (('kind', 'a"b'),))
+    metrics.add_gauge('busy', value=3)
+    metrics.add_gauge('busy', value=-1)
+    metrics.observe('job_seconds', 0.05)
+    metrics.observe('job_seconds', 0.5)
+    metrics.observe('job_seconds', 5.0)
+    text = metrics.render({'cache': {'entries': 4, 'enabled': True, 'backend': 'memory'}})
+
+    assert '# HELP abm_jobs_total Jobs run\n# TYPE abm_jobs_total counter' in text
+    values = samples(text)
+    assert values['abm_jobs_total{kind="a\\"b"}'] == 3
+    assert values['abm_busy'] == 2
+    assert [values[f'abm_job_seconds_bucket{{le="{le}"}}'] for le in ('0.1', '1', '+Inf')] == [1, 2, 3]
+    assert values['abm_job_seconds_sum'] == 5.55 and values['abm_job_seconds_count'] == 3
+    # Only numeric, non-boolean snapshot values become gauges
+    assert values['abm_cache_entries'] == 4
+    assert not any(name.startswith(('abm_cache_enabled', 'abm_cache_backend')) for name in values)
+    assert 'abm_uptime_seconds' in values
+
+
+def test_metrics_endpoint_reports_requests_and_engine_calls(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    with TestClient(main.app) as client:
+        assert client.post('/analyze/market/batch', json={'assets': make_assets(2, seed=8)}).status_code == 200
+        assert client.get('/results/no-such-submission').status_code == 404
+        response = client.get('/metrics')
+
+    assert response.headers['content-type'] == CONTENT_TYPE
+    values = samples(response.text)
+    # Requests are labelled by route template, not by the raw path
+    assert values['abm_http_requests_total{method="POST",path="/analyze/market/batch",status="200"}'] >= 1
+    assert values['abm_http_requests_total{method="GET",path="/results/{submission_id}",status="404"}'] >= 1
+    assert not any('no-such-submission' in name for name in values)
+    assert values['abm_http_request_duration_seconds_count{method="POST",path="/analyze/market/batch"}'] >= 1
+    assert values['abm_engine_call_seconds_count{engine="market"}'] >= 1
+    assert values['abm_engine_assets_total{engine="market"}'] >= 1
+    assert any(re.match(r'abm_engine_stage_seconds_count\{engine="market",stage="\w+"\}', name) for name in values)
+    # Component stats are exported as gauges
+    assert values['abm_startup_ready'] == 1
+    assert 'abm_executor_workers' in values and 'abm_index_keys' in values
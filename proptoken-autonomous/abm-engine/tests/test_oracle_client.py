@@ -0,0 +1,352 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from oracle_client import OracleClient, OraclePoolTimeout, OracleProvider
+
+SATELLITE = {'satellite': {'condition': 'poor', 'estimated_size': 1000}}
+
+
+class StubOracles:
+    """
+    Local HTTP server playing the oracle providers at /<provider>. Each
+    provider answers after its delay with its body (or fails with status),
+    stamped with the time when stamped is set, like the oracle-network node;
+    the server records every request and the connections they came in on.
+    """
+
+    def __init__(self):
+        self.delays = {}
+        self.statuses = {}
+        self.bodies = {'existence': SATELLITE, 'ownership': {'registry': {'owner_match': True}},
+                       'activity': {'score': 0.9}}
+        self.stamped = False
+        self.requests = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'    # keep-alive, so pooled connections are reused
+
+            def do_POST(self):
+                provider = self.path.strip('/')
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub._lock:
+                    stub.requests.append((provider, payload['assetId']))
+                    stub.connections.add(self.client_address)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delays.get(provider, 0))
+                with stub._lock:
+                    stub.in_flight -= 1
+                status = stub.statuses.get(provider, 200)
+                answer = dict(stub.bodies[provider], timestamp=time.time()) if stub.stamped else stub.bodies[provider]
+                body = json.dumps(answer if status == 200 else {'error': 'down'}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # the client timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def provider(self, name, timeout=2.0):
+        return OracleProvider(name, f'{self.url}/{name}', timeout)
+
+    def fetched(self, provider=None):
+        return [sid for name, sid in self.requests if provider is None or name == provider]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubOracles()
+    yield server
+    server.close()
+
+
+def make_client(stub, timeouts=None, **kwargs):
+    timeouts = timeouts or {}
+    providers = [stub.provider(name, timeouts.get(name, 2.0)) for name in ('existence', 'ownership', 'activity')]
+    return OracleClient(providers, **kwargs)
+
+
+def asset(sid='sub-1'):
+    return {'id': sid, 'specifications': {'size': 1280}}, {'city': 'Gurugram'}
+
+
+def run(coroutine_fn):
+    return asyncio.run(coroutine_fn())
+
+
+def test_missing_providers_are_fetched_concurrently(stub):
+    stub.delays = {'existence': 0.3, 'ownership': 0.3, 'activity': 0.3}
+
+    async def scenario():
+        client = make_client(stub, required=('existence', 'ownership', 'activity'))
+        try:
+            return await client.complete(*asset(), {})
+        finally:
+            await client.aclose()
+
+    started = time.perf_counter()
+    oracle_data, outcomes = run(scenario)
+    assert time.perf_counter() - started < 0.8    # one after another would take 0.9s
+    assert stub.max_in_flight == 3
+    assert oracle_data == stub.bodies
+    assert outcomes == {'existence': 'fetched', 'ownership': 'fetched', 'activity': 'fetched'}
+
+
+def test_supplied_providers_are_not_fetched(stub):
+    supplied = {'existence': {'satellite': {'condition': 'good'}}, 'ownership': {}, 'activity': {}}
+
+    async def scenario():
+        client = make_client(stub, required=('existence', 'ownership', 'activity'))
+        try:
+            partial = await client.complete(*asset(), {'existence': supplied['existence']})
+            complete = await client.complete(*asset('sub-2'), supplied)
+            return partial, complete
+        finally:
+            await client.aclose()
+
+    (partial, outcomes), (complete, none) = run(scenario)
+    assert partial['existence'] == supplied['existence']
+    assert outcomes == {'ownership': 'fetched', 'activity': 'fetched'}
+    assert complete is supplied and none == {}
+    assert sorted(name for name, _ in stub.requests) == ['activity', 'ownership']
+
+
+def test_analysis_does_not_wait_for_optional_providers(stub):
+    stub.delays = {'ownership': 0.5, 'activity': 0.5}
+
+    async def scenario():
+        client = make_client(stub, required=('existence',))
+        try:
+            started = time.perf_counter()
+            first = await client.complete(*asset(), {})
+            waited = time.perf_counter() - started
+            await asyncio.sleep(0.7)
+            second = await client.complete(*asset(), {})
+            return first, waited, second
+        finally:
+            await client.aclose()
+
+    (first, outcomes), waited, (second, later) = run(scenario)
+    assert waited < 0.4
+    assert first == {'existence': SATELLITE}
+    assert outcomes == {'existence': 'fetched', 'ownership': 'pending', 'activity': 'pending'}
+    # The background fetches finished meanwhile and are served without new requests
+    assert second == stub.bodies
+    assert later == {'existence': 'cached', 'ownership': 'cached', 'activity': 'cached'}
+    assert len(stub.requests) == 3
+
+
+def test_per_provider_timeouts(stub):
+    stub.delays = {'activity': 2.0}
+
+    async def scenario():
+        client = make_client(stub, timeouts={'activity': 0.2}, required=('existence', 'activity'))
+        try:
+            return await client.complete(*asset(), {})
+        finally:
+            await client.aclose()
+
+    started = time.perf_counter()
+    oracle_data, outcomes = run(scenario)
+    assert time.perf_counter() - started < 1.0
+    assert outcomes['activity'] == 'timeout' and 'activity' not in oracle_data
+    assert oracle_data['existence'] == SATELLITE
+
+
+def test_pool_wait_is_bounded_separately(stub):
+    stub.delays = {'existence': 0.3}
+    others = {'ownership': {}, 'activity': {}}
+
+    async def scenario(pool_timeout):
+        client = make_client(stub, timeouts={'existence': 0.45}, max_connections=1, pool_timeout=pool_timeout)
+        try:
+            return await asyncio.gather(*(client.complete(*asset(f'sub-{i}'), others) for i in range(2)))
+        finally:
+            await client.aclose()
+
+    # The second fetch waits 0.3s for the connection, then gets its own 0.45s
+    waited = asyncio.run(scenario(1.0))
+    assert [outcomes['existence'] for _, outcomes in waited] == ['fetched', 'fetched']
+    # and gives up when no connection frees up within pool_timeout
+    gave_up = asyncio.run(scenario(0.1))
+    assert sorted(outcomes['existence'] for _, outcomes in gave_up) == ['fetched', 'pool_timeout']
+
+
+def test_pool_slots_are_not_lost():
+    async def scenario():
+        client = OracleClient([], max_connections=1, pool_timeout=0.05)
+        slots = asyncio.Semaphore(1)
+        await slots.acquire()
+        # Times out while the slot is held
+        with pytest.raises(OraclePoolTimeout):
+            await client._acquire(slots)
+        # Cancelled after the slot was granted but before the waiter ran
+        waiter = asyncio.create_task(client._acquire(slots))
+        await asyncio.sleep(0)
+        slots.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0)
+        return slots._value
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_concurrent_requests_for_a_submission_are_coalesced(stub):
+    stub.delays = {'existence': 0.2, 'ownership': 0.2, 'activity': 0.2}
+
+    async def scenario():
+        client = make_client(stub, required=('existence', 'ownership', 'activity'))
+        try:
+            results = await asyncio.gather(*(client.complete(*asset(), {}) for _ in range(5)))
+            other = await client.complete(*asset('sub-2'), {})
+            return results, other
+        finally:
+            await client.aclose()
+
+    results, _ = run(scenario)
+    assert all(oracle_data == stub.bodies for oracle_data, _ in results)
+    assert sorted(outcome for _, outcomes in results for outcome in outcomes.values()) == \
+        ['coalesced'] * 12 + ['fetched'] * 3
+    assert stub.fetched('existence') == ['sub-1', 'sub-2']
+
+
+def test_failures_are_retried_not_cached(stub):
+    stub.statuses = {'existence': 503}
+
+    async def scenario():
+        client = make_client(stub, required=('existence',))
+        try:
+            failed = await client.complete(*asset(), {'ownership': {}, 'activity': {}})
+            stub.statuses = {}
+            recovered = await client.complete(*asset(), {'ownership': {}, 'activity': {}})
+            return failed, recovered
+        finally:
+            await client.aclose()
+
+    (failed, failed_outcomes), (recovered, outcomes) = run(scenario)
+    assert failed_outcomes == {'existence': 'error'} and 'existence' not in failed
+    assert outcomes == {'existence': 'fetched'} and recovered['existence'] == SATELLITE
+    assert stub.fetched('existence') == ['sub-1', 'sub-1']
+
+
+def test_answers_expire(stub):
+    async def scenario():
+        client = make_client(stub, cache_seconds=0.1)
+        try:
+            await client.complete(*asset(), {})
+            await asyncio.sleep(0.2)
+            return await client.complete(*asset(), {})
+        finally:
+            await client.aclose()
+
+    _, outcomes = run(scenario)
+    assert outcomes['existence'] == 'fetched'
+    assert stub.fetched('existence') == ['sub-1', 'sub-1']
+
+
+def test_connections_are_pooled(stub):
+    async def scenario():
+        client = make_client(stub, max_connections=2)
+        try:
+            for i in range(10):
+                await client.complete(*asset(f'sub-{i}'), {'ownership': {}, 'activity': {}})
+            return client.stats()
+        finally:
+            await client.aclose()
+
+    stats = run(scenario)
+    assert len(stub.fetched('existence')) == 10
+    assert len(stub.connections) == 1    # sequential requests share one kept-alive connection
+    assert stats['requests'] == 10 and stats['in_flight'] == 0
+
+
+def test_api_fetches_missing_oracle_data(stub, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from benchmarks.common import make_assets
+
+    oracle = make_client(stub, required=('existence',))
+    monkeypatch.setattr(main, 'oracle_client', oracle)
+    monkeypatch.setattr(main, 'cache', None)
+    request = make_assets(1)[0]
+    request['asset_data']['id'] = 'sub-api-oracle'
+    request['oracle_data'] = {}
+
+    with TestClient(main.app) as client:
+        fetched = client.post('/analyze/market', json=request)
+        assert fetched.status_code == 200
+        assert fetched.json()['valuation_adjustment']['condition'] == 0.8    # 'poor' from the satellite
+        assert client.post('/analyze/fraud', json=request).status_code == 200
+        metrics = client.get('/metrics').text
+
+    # The fraud call reused the existence answer fetched for the market call
+    assert stub.fetched('existence') == ['sub-api-oracle']
+    assert 'abm_oracle_fetches_total{provider="existence",outcome="cached"} 1' in metrics
+
+
+def test_api_keys_ignore_volatile_oracle_fields(stub, monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    import main
+    from benchmarks.common import make_assets
+    from cache import ResultCache
+    from results_store import AnalysisResultStore, open_backend
+
+    keys, hashes = [], []
+
+    def recorded(fn, calls):
+        return lambda *args: calls.append(fn(*args)) or calls[-1]
+
+    cache = ResultCache()
+    store = AnalysisResultStore(open_backend(str(tmp_path / 'results.db'), 1), flush_interval=60)
+    monkeypatch.setattr(main, 'oracle_client', make_client(stub, required=('existence',), cache_seconds=0))
+    monkeypatch.setattr(main, 'cache', cache)
+    monkeypatch.setattr(main, 'results_store', store)
+    monkeypatch.setattr(main, 'request_key', recorded(main.request_key, keys))
+    monkeypatch.setattr(main, 'input_hash', recorded(main.input_hash, hashes))
+    stub.stamped = True
+    request = make_assets(1)[0]
+    request['asset_data']['id'] = 'sub-api-keys'
+    request['oracle_data'] = {}
+
+    with TestClient(main.app) as client:
+        first = client.post('/analyze/market', json=request)
+        # Refetched answers carry new timestamps, and this time the optional providers are left pending
+        stub.delays = {'ownership': 0.5, 'activity': 0.5}
+        cache.invalidate()
+        second = client.post('/analyze/market', json=request)
+    store.close()
+
+    assert first.status_code == second.status_code == 200
+    assert len(stub.fetched('existence')) == 2
+    assert len(keys) == len(hashes) == 2
+    assert keys[0] == keys[1] and hashes[0] == hashes[1]
+    assert store.stats()['cache_hits'] == 1    # the second request was answered from the store
+    assert second.json() == first.json()
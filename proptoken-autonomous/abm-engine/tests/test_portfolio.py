@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmarks.common import make_assets
+from engines.records import RecordBatch
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    import tasks
+    return tasks.portfolio_analyzer()
+
+
+def holdings(n, seed=0):
+    requests = make_assets(n, seed)
+    batch = RecordBatch.from_dicts(*([r[field] for r in requests] for field in
+                                     ('asset_data', 'location', 'financials', 'oracle_data')))
+    shares = np.linspace(0.1, 1.0, n)
+    return batch, shares, [r['asset_data']['id'] for r in requests]
+
+
+def test_tail_contributions_sum_to_the_tail_loss(analyzer):
+    batch, shares, ids = holdings(40)
+    result = analyzer.analyze(batch, shares, ids)
+    stress = result['stress']
+    contributions = sum(asset['tail_contribution'] for asset in result['assets'])
+    assert contributions == pytest.approx(result['nav']['mean'] - stress['cvar'], rel=1e-9)
+    assert stress['var'] >= stress['cvar']
+    assert stress['tail_loss'] == pytest.approx(1 - stress['cvar'] / result['nav']['mean'])
+
+
+def test_segment_sums_match_a_full_revaluation(analyzer):
+    # The portfolio paths are built from per-(city, type) sums; revalue every holding on every path instead
+    batch, shares, ids = holdings(25, seed=1)
+    result = analyzer.analyze(batch, shares, ids)
+    tester = analyzer.stress_tester
+    values = np.array([asset['value'] for asset in result['assets']])
+    cap_rate, occupancy = analyzer.market.stress_inputs(batch)
+    city_shocks, city_rows = analyzer._factor_matrix('city', [a['city'] for a in result['assets']], analyzer.city_vol)
+    type_shocks, type_rows = analyzer._factor_matrix('type', [a['type'] for a in result['assets']], analyzer.type_vol)
+    paths = tester.revalue(values, cap_rate, occupancy, tester.shocks,
+                           city_shocks[city_rows] + type_shocks[type_rows]).sum(axis=0)
+    paths += np.sqrt(np.sum((values * analyzer.idiosyncratic_vol) ** 2)) * analyzer._idiosyncratic
+
+    k = int((1 - tester.confidence) * tester.n_paths)
+    tail = np.sort(paths)[:k + 1]
+    assert result['stress']['var'] == pytest.approx(tail.max(), rel=1e-9)
+    assert result['stress']['cvar'] == pytest.approx(tail.mean(), rel=1e-9)
+
+
+def test_concentration_and_repeatability(analyzer):
+    batch, shares, ids = holdings(12)
+    first = analyzer.analyze(batch, shares, ids)
+    concentration = first['concentration']
+    assert sum(group['weight'] for group in concentration['by_city']) == pytest.approx(1)
+    assert sum(group['holdings'] for group in concentration['by_type']) == 12
+    weights = np.array([asset['weight'] for asset in first['assets']])
+    assert concentration['hhi']['holdings'] == pytest.approx(np.sum(weights ** 2))
+    assert 1 / 12 <= concentration['hhi']['holdings'] <= concentration['hhi']['cities'] <= 1
+    # Factor columns are seeded by name, so the same holdings give the same stress
+    assert analyzer.analyze(batch, shares, ids)['stress'] == first['stress']
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from engines.records import AssetRecord, RecordBatch
+from models import AnalysisRequest
+
+REQUEST = {
+    'asset_data': {'id': 'sub-1', 'spv': {'name': 'SPV-1'}, 'claimedValue': 5_000_000,
+                   'specifications': {'size': 1280, 'type': 'Commercial', 'condition': 'good'}},
+    'location': {'city': 'Gurugram', 'coordinates': [28.45, 77.02]},
+    'financials': {'currentRent': 30000, 'expectedYield': 7.5, 'occupancyRate': 90,
+                   'historicalCashFlow': [{'month': '2024-01', 'income': 30000, 'expenses': 5000}]},
+    'oracle_data': {'existence': {'satellite': {'condition': 'poor', 'estimated_size': 1000}}},
+}
+
+
+def with_field(section, **values):
+    request = {key: dict(value) for key, value in REQUEST.items()}
+    request[section].update(values)
+    return request
+
+
+def test_requests_are_validated_and_passed_through():
+    sources = AnalysisRequest.model_validate(REQUEST).sources()
+    assert sources['location']['coordinates'] == {'lat': 28.45, 'lng': 77.02}    # [lat, lng] pairs accepted
+    assert sources['asset_data']['spv'] == {'name': 'SPV-1'}    # fields the engines do not read are kept
+    assert 'country' not in sources['location']    # unset optionals are dropped, not sent as None
+
+
+@pytest.mark.parametrize('section, values', [
+    ('financials', {'occupancyRate': 120}),
+    ('financials', {'currentRent': -1}),
+    ('financials', {'expectedYield': float('inf')}),
+    ('financials', {'historicalCashFlow': [{'income': 10}]}),
+    ('location', {'coordinates': [95, 77]}),
+    ('asset_data', {'specifications': {'size': 'large'}}),
+])
+def test_bad_values_are_rejected(section, values):
+    with pytest.raises(ValidationError):
+        AnalysisRequest.model_validate(with_field(section, **values))
+
+
+def test_bad_input_is_a_422_at_the_api(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    with TestClient(main.app) as client:
+        response = client.post('/analyze/market', json=with_field('financials', occupancyRate=120))
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['loc'] == ['body', 'financials', 'occupancyRate']
+
+
+def test_records_flatten_requests():
+    sources = AnalysisRequest.model_validate(REQUEST).sources()
+    record = AssetRecord.from_dicts(sources['asset_data'], sources['location'], sources['financials'],
+                                    sources['oracle_data'])
+    assert (record.size, record.lat, record.lng) == (1280, 28.45, 77.02)
+    assert (record.asset_type, record.condition, record.observed_condition) == ('Commercial', 'good', 'poor')
+    assert record.satellite_size == 1000 and len(record.cash_flow_history) == 1
+    assert math.isnan(record.annual_expenses)
+    assert not hasattr(record, '__dict__')    # slotted
+
+    # Raw dicts (no validation) still flatten: coordinate pairs, junk numbers, missing sections
+    raw = AssetRecord.from_dicts({'specifications': 'n/a'}, {'coordinates': [1, 2]}, {'expectedYield': 'high'}, {})
+    assert (raw.lat, raw.lng) == (1, 2)
+    assert math.isnan(raw.size) and math.isnan(raw.expected_yield) and raw.observed_condition == ''
+
+
+def test_batch_columns():
+    batch = RecordBatch.from_dicts(
+        [{'specifications': {'size': 100}, 'grade': 2}, {'specifications': {}}],
+        [{}, {}], [{'expectedYield': 8}, {}], [{}, {}]
+    )
+    assert np.isnan(batch.array('size')[1])
+    assert batch.array('size') is batch.array('size')    # built once
+    assert batch.column('asset_data.specifications.size', default=-1).tolist() == [100, -1]
+    assert batch.column('financials.expectedYield').tolist() == [8, 0]
+    assert batch.column('asset_data.grade', default=5).tolist() == [2, 5]    # outside RECORD_PATHS
+    with pytest.raises(KeyError):
+        batch.array('asset_type')
+    with pytest.raises(ValueError):
+        batch.source('headers')
@@ -0,0 +1,281 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from results_store import AnalysisResultStore, SQLiteResultsBackend, input_hash, open_backend
+
+
+class CountingBackend(SQLiteResultsBackend):
+    """
+    SQLite backend that records the calls the store makes
+    """
+
+    def __init__(self, path, pool_size=4):
+        super().__init__(path, pool_size)
+        self.writes = []
+        self.reads = 0
+        self.fail_writes = False
+
+    def write(self, rows):
+        if self.fail_writes:
+            raise sqlite3.OperationalError('database is down')
+        self.writes.append(len(rows))
+        super().write(rows)
+
+    def read(self, keys):
+        self.reads += 1
+        return super().read(keys)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'results.db')
+
+
+@pytest.fixture
+def backend(db_path):
+    return CountingBackend(db_path)
+
+
+def make_store(backend, **kwargs):
+    kwargs.setdefault('flush_interval', 60)
+    return AnalysisResultStore(backend, **kwargs)
+
+
+def stored_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT submission_id, kind, version FROM analysis_results ORDER BY rowid').fetchall()
+
+
+def test_input_hash_is_canonical():
+    assert input_hash({'a': 1, 'b': [1, 2]}) == input_hash({'b': [1, 2], 'a': 1})
+    assert input_hash({'a': 1}) != input_hash({'a': 2})
+
+
+def test_put_flush_and_read_back(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'expected_nav': {'mean': 1.5}})
+    store.put('sub-1', 'fraud', 'h2', 'v1', {'fraud_likelihood': 0.1})
+    assert stored_rows(db_path) == []
+
+    assert store.flush() == 2
+    assert backend.writes == [2]
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1'), ('sub-1', 'fraud', 'v1')]
+
+    fresh = make_store(CountingBackend(db_path))
+    assert fresh.get('sub-1', 'market', 'h1', 'v1') == {'expected_nav': {'mean': 1.5}}
+    assert fresh.get('sub-1', 'market', 'h1', 'v2') is None
+    store.close()
+    fresh.close()
+
+
+def test_reads_are_cached(backend, db_path):
+    writer = make_store(backend)
+    writer.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    writer.close()
+
+    reader_backend = CountingBackend(db_path)
+    store = make_store(reader_backend)
+    for _ in range(3):
+        result = store.get('sub-1', 'market', 'h1', 'v1')
+        assert result == {'nav': 1}
+        result['nav'] = 2    # callers get their own copy
+    assert reader_backend.reads == 1
+    assert store.stats()['backend_hits'] == 1
+    assert store.stats()['cache_hits'] == 2
+    store.close()
+
+
+def test_queued_rows_are_visible_before_flush(backend):
+    store = make_store(backend, cache_entries=1)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.put('sub-2', 'market', 'h2', 'v1', {'nav': 2})    # evicts sub-1 from the read cache
+    assert store.get_many([('sub-1', 'market', 'h1', 'v1'), ('sub-2', 'market', 'h2', 'v1')]) == [{'nav': 1}, {'nav': 2}]
+    assert backend.reads == 0
+    store.close()
+
+
+def test_batches_are_bulk_inserted(backend, db_path):
+    store = make_store(backend, batch_size=100)
+    # Hold the writer thread (woken once a batch fills) off until every row is queued,
+    # so whichever side flushes sees all 250 rows
+    with store._flush_lock:
+        for i in range(250):
+            store.put(f'sub-{i}', 'market', f'h{i}', 'v1', {'i': i})
+    store.flush()
+    assert backend.writes == [100, 100, 50]
+    assert len(stored_rows(db_path)) == 250
+    store.close()
+
+
+def test_writer_flushes_when_a_batch_fills(backend, db_path):
+    store = make_store(backend, batch_size=10)
+    for i in range(10):
+        store.put(f'sub-{i}', 'market', f'h{i}', 'v1', {'i': i})
+    deadline = time.time() + 5
+    while len(stored_rows(db_path)) < 10 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(stored_rows(db_path)) == 10
+    store.close()
+
+
+def test_writer_flushes_on_interval(backend, db_path):
+    store = make_store(backend, batch_size=1000, flush_interval=0.05)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    deadline = time.time() + 5
+    while not stored_rows(db_path) and time.time() < deadline:
+        time.sleep(0.01)
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1')]
+    store.close()
+
+
+def test_versions_are_kept_and_latest_wins(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.flush()
+    store.put('sub-1', 'market', 'h1', 'v2', {'nav': 2})
+    store.put('sub-1', 'fraud', 'h2', 'v1', {'fraud': 0.5})
+
+    # The v2 row is still queued; latest() merges it with what is stored
+    latest = store.latest('sub-1')
+    assert latest['market'].version == 'v2' and latest['market'].result == {'nav': 2}
+    assert latest['fraud'].result == {'fraud': 0.5}
+
+    store.flush()
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1'), ('sub-1', 'market', 'v2'), ('sub-1', 'fraud', 'v1')]
+    assert store.get('sub-1', 'market', 'h1', 'v1') == {'nav': 1}
+    assert store.latest('sub-2') == {}
+    store.close()
+
+
+def test_latest_is_cached_until_the_submission_changes(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.flush()
+    assert store.latest('sub-1')['market'].result == {'nav': 1}
+    hits = store.stats()['cache_hits']
+    assert store.latest('sub-1')['market'].result == {'nav': 1}
+    assert store.stats()['cache_hits'] == hits + 1
+
+    store.put('sub-1', 'market', 'h1', 'v2', {'nav': 2})
+    assert store.latest('sub-1')['market'].result == {'nav': 2}
+    store.close()
+
+
+def test_latest_returns_copies(backend):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': {'min': 1}})
+    for _ in range(3):    # a miss, then cache hits
+        latest = store.latest('sub-1')
+        assert latest['market'].result == {'nav': {'min': 1}}
+        latest['market'].result['nav']['min'] = 2    # callers get their own copy
+        latest.pop('market')
+    assert store.stats()['cache_hits'] >= 2
+    store.close()
+
+
+def test_duplicate_keys_are_ignored(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.flush()
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.flush()
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1')]
+    store.close()
+
+
+def test_failed_flush_requeues_rows(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    backend.fail_writes = True
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    assert store.stats()['pending'] == 1
+    assert store.stats()['failed_flushes'] == 1
+    assert store.get('sub-1', 'market', 'h1', 'v1') == {'nav': 1}
+
+    backend.fail_writes = False
+    assert store.flush() == 1
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1')]
+    store.close()
+
+
+def test_pending_rows_are_bounded(backend):
+    store = make_store(backend, max_pending=5)
+    backend.fail_writes = True
+    for i in range(8):
+        store.put(f'sub-{i}', 'market', f'h{i}', 'v1', {'i': i})
+    assert store.stats()['pending'] == 5
+    assert store.stats()['dropped'] == 3
+    backend.fail_writes = False
+    store.close()
+
+
+def test_close_flushes_and_rejects_writes(backend, db_path):
+    store = make_store(backend)
+    store.put('sub-1', 'market', 'h1', 'v1', {'nav': 1})
+    store.close()
+    assert stored_rows(db_path) == [('sub-1', 'market', 'v1')]
+    with pytest.raises(RuntimeError):
+        store.put('sub-2', 'market', 'h2', 'v1', {'nav': 2})
+
+
+def test_concurrent_writers_share_the_pool(db_path):
+    backend = SQLiteResultsBackend(db_path, pool_size=2)
+    store = AnalysisResultStore(backend, batch_size=50, flush_interval=0.01)
+
+    def work(n):
+        for i in range(100):
+            store.put(f'sub-{n}-{i}', 'market', f'h{i}', 'v1', {'n': n, 'i': i})
+            store.get(f'sub-{n}-{i}', 'market', f'h{i}', 'v1')
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+    assert len(stored_rows(db_path)) == 800
+    assert backend.pool.stats()['open'] <= 2
+
+
+def test_open_backend_picks_sqlite_for_paths(db_path):
+    backend = open_backend(f'sqlite:///{db_path}')
+    assert isinstance(backend, SQLiteResultsBackend) and backend.pool.path == db_path
+    backend.close()
+    assert isinstance(open_backend(db_path), SQLiteResultsBackend)
+
+
+def test_api_reads_through_the_store(db_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    import tasks
+    from benchmarks.common import make_assets
+
+    store = AnalysisResultStore(SQLiteResultsBackend(db_path), flush_interval=60)
+    monkeypatch.setattr(main, 'results_store', store)
+    monkeypatch.setattr(main, 'cache', None)
+    asset = make_assets(1)[0]
+    asset['asset_data']['id'] = 'sub-api'
+
+    with TestClient(main.app) as client:
+        first = client.post('/analyze/market', json=asset)
+        assert first.status_code == 200
+        store.flush()
+        assert stored_rows(db_path) == [('sub-api', 'market', tasks.market_engine().provenance()['config_hash'])]
+
+        # Served from the store: the engine is not called again
+        def fail(*args):
+            raise AssertionError('engine called for a stored result')
+        monkeypatch.setattr(tasks, 'analyze_market_batch', fail)
+        second = client.post('/analyze/market', json=asset)
+        assert second.status_code == 200
+        assert second.json() == first.json()
+
+        stored = client.get('/results/sub-api').json()
+        assert stored['results']['market']['result'] == first.json()
+        assert client.get('/results/unknown').status_code == 404
+    store.close()
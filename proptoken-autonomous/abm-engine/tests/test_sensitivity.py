@@ -0,0 +1,68 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_assets
+from engines.records import RecordBatch
+
+GRID = {'rent_change': [-0.2, 0.0, 0.1], 'occupancy': [50, 75, 100], 'price_shock': [-0.1, 0.0],
+        'expected_yield': [4, 8]}
+
+
+@pytest.fixture(scope='module')
+def market():
+    import tasks
+    return tasks.market_engine()
+
+
+def request(occupancy=80.0, expected_yield=8.0):
+    asset = make_assets(1)[0]
+    asset['financials'].update(occupancyRate=occupancy, expectedYield=expected_yield)
+    return asset
+
+
+def record(asset):
+    return RecordBatch.from_dicts([asset['asset_data']], [asset['location']], [asset['financials']],
+                                  [asset['oracle_data']])
+
+
+def test_grid_shape_and_base_point(market):
+    result = market.sensitivity(record(request()), GRID)
+    assert result['shape'] == [3, 3, 2, 2] and list(result['axes']) == list(GRID)
+    assert result['expected_nav']['min'].shape == (3, 3, 2, 2)
+
+    # A grid of just the submitted values reproduces the plain analysis
+    base = market.sensitivity(record(request()), {'occupancy': [80], 'expected_yield': [8]})
+    assert base['shape'] == [1, 1, 1, 1]
+    for band, name in (('expected_nav', 'expected_nav'), ('yield_band', 'yield_band')):
+        assert base[band]['min'][0, 0, 0, 0] == pytest.approx(base['base'][name]['min'], rel=1e-12)
+        assert base[band]['max'][0, 0, 0, 0] == pytest.approx(base['base'][name]['max'], rel=1e-12)
+
+
+def test_axes_move_the_results_the_right_way(market):
+    result = market.sensitivity(record(request()), GRID)
+    nav, yields = result['expected_nav']['min'], result['yield_band']['max']
+    assert (np.diff(nav, axis=2) > 0).all()    # higher comparable prices, higher NAV
+    assert (np.diff(nav, axis=3) < 0).all()    # higher cap rate, lower NAV
+    assert (np.diff(nav, axis=0) == 0).all() and (np.diff(nav, axis=1) == 0).all()    # income does not move NAV
+    assert (np.diff(yields, axis=0) > 0).all() and (np.diff(yields, axis=1) > 0).all()
+    # NAV scales with submitted / new cap rate
+    np.testing.assert_allclose(nav[..., 0] / nav[..., 1], 8 / 4)
+
+
+def test_api_grid_and_size_limit(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    monkeypatch.setattr(main, 'settings', replace(main.settings, sensitivity_max_cells=10))
+    with TestClient(main.app) as client:
+        response = client.post('/analyze/market/sensitivity', json={'asset': request(), 'grid': {'rent_change': [0, 0.1]}})
+        too_big = client.post('/analyze/market/sensitivity', json={'asset': request(), 'grid': GRID})
+        invalid = client.post('/analyze/market/sensitivity', json={'asset': request(), 'grid': {'occupancy': [120]}})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['shape'] == [2, 1, 1, 1] and len(body['expected_nav']['min']) == 2
+    assert too_big.status_code == 413 and invalid.status_code == 422
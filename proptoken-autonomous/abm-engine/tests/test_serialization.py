@@ -0,0 +1,62 @@
+import json
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+import serialization
+from serialization import FastJSONResponse, dumps, loads
+
+VALUE = {
+    'float': np.float64(1.5),
+    'float32': np.float32(0.25),
+    'int': np.int64(7),
+    'bool': np.bool_(True),
+    'array': np.arange(6, dtype=np.int32).reshape(2, 3),
+    'strided': np.arange(6.0).reshape(2, 3)[:, ::2],    # not contiguous
+    'nan': float('nan'),
+    'numpy_nan': np.float64('nan'),
+    'inf_array': np.array([1.0, np.inf, np.nan]),
+    'nested': [{'x': np.float64(2.0)}, (np.int8(1), None)],
+    'other': Decimal('1.10'),
+}
+EXPECTED = {
+    'float': 1.5,
+    'float32': 0.25,
+    'int': 7,
+    'bool': True,
+    'array': [[0, 1, 2], [3, 4, 5]],
+    'strided': [[0.0, 2.0], [3.0, 5.0]],
+    'nan': None,
+    'numpy_nan': None,
+    'inf_array': [1.0, None, None],
+    'nested': [{'x': 2.0}, [1, None]],
+    'other': '1.10',
+}
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    return request.param
+
+
+def test_numpy_values_and_non_finite_floats(encoder):
+    data = dumps(VALUE)
+    assert json.loads(data) == EXPECTED    # valid JSON: no NaN or Infinity literals
+    assert loads(data) == EXPECTED
+    assert b' ' not in data
+
+
+def test_sorted_keys_are_canonical(encoder):
+    assert dumps({'b': 1, 'a': np.float64(2)}, sort_keys=True) == b'{"a":2.0,"b":1}'
+    assert dumps({'b': 1, 'a': 2}, sort_keys=True) == dumps({'a': 2, 'b': 1}, sort_keys=True)
+
+
+def test_response_renders_engine_output():
+    response = FastJSONResponse({'nav': np.array([1.0, np.nan]), 'score': np.float32(0.5)})
+    assert response.media_type == 'application/json'
+    assert json.loads(response.body) == {'nav': [1.0, None], 'score': 0.5}
@@ -0,0 +1,81 @@
+import glob
+
+import numpy as np
+import pytest
+
+import tasks
+from benchmarks.common import make_assets
+from engines import versioning
+from engines.snapshot import compare_outputs, load_snapshot, replay_snapshot
+
+
+@pytest.fixture(scope='module')
+def recorded(tmp_path_factory):
+    # One market and one fraud snapshot of the same small batch
+    directory = str(tmp_path_factory.mktemp('snapshots'))
+    requests = make_assets(8, seed=2)
+    columns = {field: [r[field] for r in requests] for field in ('asset_data', 'location', 'financials', 'oracle_data')}
+    tasks.analyze_market_batch(columns['asset_data'], columns['location'], columns['financials'],
+                               columns['oracle_data'], snapshot_dir=directory)
+    tasks.detect_fraud_batch(columns['asset_data'], columns['financials'], columns['oracle_data'],
+                             snapshot_dir=directory)
+    paths = sorted(glob.glob(f'{directory}/*.npz'))
+    return {load_snapshot(path).engine: path for path in paths}
+
+
+def test_saved_runs_replay_bit_for_bit(recorded):
+    assert sorted(recorded) == ['fraud', 'market']
+    for name, path in recorded.items():
+        snapshot = load_snapshot(path)
+        assert snapshot.meta['rows'] == 8 and len(snapshot.meta['ids']) == 8
+        report = replay_snapshot(snapshot, tasks.engine(name))
+        assert report['status'] == 'match', report
+        assert report['recorded'] == report['current']
+        # and the same through the replay CLI's entry point
+        assert tasks.replay_snapshot(path)['status'] == 'match'
+
+
+def test_tampered_inputs_are_mismatches(recorded):
+    market = load_snapshot(recorded['market'])
+    market.inputs['financials'][0]['expectedYield'] += 1
+    report = replay_snapshot(market, tasks.market_engine())
+    assert report['status'] == 'mismatch'
+    # Only the stress stage reads expectedYield here (as its cap rate), and only the tampered row differs
+    assert sorted(report['mismatches']) == ['stress/cvar', 'stress/tail_loss', 'stress/var']
+    assert report['mismatches']['stress/var']['rows'] == 1
+
+    fraud = load_snapshot(recorded['fraud'])
+    fraud.inputs['financials'][3]['expectedYield'] = 25
+    report = replay_snapshot(fraud, tasks.fraud_engine())
+    assert report['status'] == 'mismatch' and report['mismatches']
+
+
+def test_engine_version_change_is_reported(recorded, monkeypatch):
+    version = versioning.ENGINE_VERSION
+    monkeypatch.setattr(versioning, 'ENGINE_VERSION', '99.0.0')
+    snapshot = load_snapshot(recorded['market'])
+    report = replay_snapshot(snapshot, tasks.market_engine())
+    assert report['current']['engine_version'] == '99.0.0'
+    assert report['recorded']['engine_version'] == version
+    assert report['recorded']['config_hash'] != report['current']['config_hash']
+    # Unchanged outputs still match; a difference is put down to the version change, not flagged as a regression
+    assert report['status'] == 'match'
+    snapshot.inputs['financials'][0]['expectedYield'] += 1
+    assert replay_snapshot(snapshot, tasks.market_engine())['status'] == 'config_changed'
+
+
+def test_compare_treats_nan_positions_consistently():
+    values = np.array([1.0, np.nan, 3.0, np.nan])
+    same = compare_outputs({'s': {'x': values}}, {'s': {'x': values.copy()}})
+    assert same == {'mismatches': {}, 'missing': [], 'extra': []}
+
+    moved = compare_outputs({'s': {'x': values}}, {'s': {'x': np.array([1.0, 2.0, np.nan, np.nan])}})
+    assert moved['mismatches'] == {'s/x': {'rows': 2, 'max_abs_diff': None}}
+
+    changed = compare_outputs({'s': {'x': values}}, {'s': {'x': np.array([1.5, np.nan, 3.0, np.nan]),
+                                                            'y': values}})
+    assert changed['mismatches'] == {'s/x': {'rows': 1, 'max_abs_diff': 0.5}}
+    assert changed['extra'] == ['s/y']
+    assert compare_outputs({'s': {'x': values, 'z': values}}, {'s': {'x': values}})['missing'] == ['s/z']
+    assert compare_outputs({'s': {'x': values}}, {'s': {'x': values.astype(np.float32)}})['mismatches'] == \
+        {'s/x': {'dtype': ['float64', 'float32']}}
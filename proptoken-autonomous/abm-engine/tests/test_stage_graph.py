@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from engines.records import RecordBatch
+from engines.stage_graph import Stage, StageGraph, StageMemo
+
+
+def batch(cash_flows, yields):
+    n = len(cash_flows)
+    return RecordBatch.from_dicts([{} for _ in range(n)], [{} for _ in range(n)],
+                                  [{'cashFlow': c, 'expectedYield': y} for c, y in zip(cash_flows, yields)],
+                                  [{} for _ in range(n)])
+
+
+def toy_graph(calls):
+    def income(batch, inputs):
+        calls.append(('income', len(batch)))
+        return {'income': batch.array('cash_flow') * 12}
+
+    def value(batch, inputs):
+        calls.append(('value', len(batch)))
+        return {'value': inputs['income']['income'] / 0.08}
+
+    def band(batch, inputs):
+        calls.append(('band', len(batch)))
+        return {'low': batch.array('expected_yield') - 1, 'high': batch.array('expected_yield') + 1}
+
+    # Listed out of order on purpose: the graph sorts by dependency
+    return StageGraph('toy', [
+        Stage('value', value, depends=('income',)),
+        Stage('income', income, inputs=('financials.cashFlow',)),
+        Stage('band', band, inputs=('financials.expectedYield',)),
+    ])
+
+
+def test_memo_reuses_unchanged_stages():
+    calls, memo = [], StageMemo()
+    graph = toy_graph(calls)
+    assert [stage.name for stage in graph.stages] == ['income', 'value', 'band']
+
+    first = graph.run(batch([100, 200, 300], [7, 8, 9]), memo=memo)
+    assert first.computed == {'income': 3, 'value': 3, 'band': 3}
+    assert memo.stats()['hits'] == 0
+
+    calls.clear()
+    second = graph.run(batch([100, 200, 300], [7, 8, 9]), memo=memo)
+    assert calls == [] and second.reused == {'income': 3, 'value': 3, 'band': 3}
+    assert memo.stats()['hits'] == 9
+    assert second.report() == {'computed': [], 'reused': ['income', 'value', 'band']}
+
+    # One asset's cash flow changed: income and value rerun for it alone, band is reused
+    changed = graph.run(batch([100, 250, 300], [7, 8, 9]), memo=memo)
+    assert calls == [('income', 1), ('value', 1)]
+    assert changed.computed == {'income': 1, 'value': 1, 'band': 0}
+    plain = toy_graph([]).run(batch([100, 250, 300], [7, 8, 9]))
+    for stage, columns in plain.outputs.items():
+        for name, values in columns.items():
+            np.testing.assert_array_equal(changed.outputs[stage][name], values)
+
+
+def test_version_change_invalidates():
+    calls, memo = [], StageMemo()
+    version = ['v1']
+    graph = StageGraph('toy', [Stage('income', lambda b, i: calls.append(1) or {'x': b.array('cash_flow')},
+                                     inputs=('financials.cashFlow',), version=lambda: version[0])])
+    graph.run(batch([1], [1]), memo=memo)
+    graph.run(batch([1], [1]), memo=memo)
+    version[0] = 'v2'
+    graph.run(batch([1], [1]), memo=memo)
+    assert len(calls) == 2
+
+
+def test_bad_graphs_are_rejected():
+    fn = lambda b, i: {}
+    with pytest.raises(ValueError, match='cycle'):
+        StageGraph('g', [Stage('a', fn, depends=('b',)), Stage('b', fn, depends=('a',))])
+    with pytest.raises(ValueError, match='unknown stage'):
+        StageGraph('g', [Stage('a', fn, depends=('missing',))])
+    with pytest.raises(ValueError, match='Duplicate'):
+        StageGraph('g', [Stage('a', fn), Stage('a', fn)])
+
+
+def test_reanalyze_recomputes_only_changed_stages(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from benchmarks.common import make_assets
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    request = make_assets(1)[0]
+    request['asset_data']['id'] = 'sub-reanalyze'
+
+    with TestClient(main.app) as client:
+        first = client.post('/reanalyze', json=request).json()
+        second = client.post('/reanalyze', json=request).json()
+        request['financials']['expectedYield'] = request['financials']['expectedYield'] + 5
+        changed = client.post('/reanalyze', json=request).json()
+
+    assert first['stages']['market']['reused'] == []
+    assert second['stages']['market']['computed'] == [] and second['stages']['fraud']['computed'] == []
+    assert second['market']['expected_nav'] == first['market']['expected_nav']
+    assert 'yield' in changed['stages']['market']['computed']
+    assert 'comparables' in changed['stages']['market']['reused']
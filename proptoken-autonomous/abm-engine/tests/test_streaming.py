@@ -0,0 +1,87 @@
+import asyncio
+import json
+from dataclasses import replace
+
+import pytest
+
+from benchmarks.common import make_assets
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setattr(main, 'oracle_client', None)
+    monkeypatch.setattr(main, 'settings', replace(main.settings, stream_chunk_size=2, stream_max_line_bytes=4096))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def record(sid):
+    request = make_assets(1)[0]
+    request['asset_data']['id'] = sid
+    return json.dumps(request).encode()
+
+
+def body():
+    # Valid, invalid JSON, blank, schema error, oversized, then a valid last line without a newline
+    return b'\n'.join([
+        record('stream-a'),
+        b'{"asset_data": {',
+        b'   ',
+        b'{"asset_data": 5}',
+        b'{"pad": "' + b'x' * 5000 + b'"}',
+        record('stream-b'),
+    ])
+
+
+def lines(response):
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def check(results):
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert [result.get('id') for result in results] == ['stream-a', None, None, None, 'stream-b']
+    assert results[0]['market']['expected_nav'] and 'fraud_likelihood' in results[0]['fraud']
+    assert results[4]['market'] and results[4]['fraud']
+    assert results[1]['error'] and 'asset_data' in results[2]['error']
+    assert results[3]['error'] == 'line exceeds 4096 bytes'
+
+
+def test_stream_reports_bad_lines_in_order(client):
+    check(lines(client.post('/analyze/stream', content=body())))
+
+
+def test_lines_split_across_pieces():
+    # TestClient sends the body as one message; drive iter_ndjson with small ones instead
+    from models import AnalysisRequest
+    from starlette.requests import Request
+    from streaming import iter_ndjson
+
+    data = body()
+    pieces = [data[start:start + 97] for start in range(0, len(data), 97)]
+
+    async def receive():
+        piece = pieces.pop(0)
+        return {'type': 'http.request', 'body': piece, 'more_body': bool(pieces)}
+
+    async def parse():
+        request = Request({'type': 'http', 'method': 'POST', 'headers': []}, receive)
+        return [entry async for entry in iter_ndjson(request, AnalysisRequest, 4096)]
+
+    entries = asyncio.run(parse())
+    assert [index for index, _, _ in entries] == [0, 1, 2, 3, 4]
+    assert [record is not None for _, record, _ in entries] == [True, False, False, False, True]
+    assert entries[3][2] == 'line exceeds 4096 bytes'
+    assert entries[4][1].asset_data.id == 'stream-b'
+
+
+def test_stream_of_only_bad_lines(client):
+    results = lines(client.post('/analyze/stream', content=b'nope\n\n[1, 2]\n'))
+    assert [result['index'] for result in results] == [0, 1]
+    assert all(result['error'] for result in results)
+    assert lines(client.post('/analyze/stream', content=b'')) == []
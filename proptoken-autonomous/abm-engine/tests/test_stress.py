@@ -0,0 +1,51 @@
+import numpy as np
+
+from engines.stress import MonteCarloStressTester
+
+
+def batch(n, seed=1):
+    rng = np.random.default_rng(seed)
+    nav = rng.uniform(1e6, 5e6, n)
+    cap_rate = rng.uniform(0.05, 0.09, n)
+    occupancy = np.where(np.arange(n) % 5 == 0, 0.0, rng.uniform(60, 100, n))    # every fifth unknown
+    return nav, cap_rate, occupancy
+
+
+def test_var_bounds_cvar_and_runs_are_reproducible():
+    nav, cap_rate, occupancy = batch(100)
+    result = MonteCarloStressTester(time_budget_ms=0).run(nav, cap_rate, occupancy)
+    assert (result.var >= result.cvar).all()
+    assert (result.var < nav).all()
+    np.testing.assert_allclose(result.tail_loss, 1 - result.cvar / nav)
+    assert set(result.tail_risk) <= {'Low', 'Medium', 'High'}
+    assert (result.paths == 2000).all()
+
+    again = MonteCarloStressTester(time_budget_ms=0).run(nav, cap_rate, occupancy)
+    assert np.array_equal(result.var, again.var) and np.array_equal(result.cvar, again.cvar)
+
+
+def test_results_do_not_depend_on_chunking():
+    nav, cap_rate, occupancy = batch(70)
+    whole = MonteCarloStressTester(time_budget_ms=0, chunk_rows=1000).run(nav, cap_rate, occupancy)
+    chunked = MonteCarloStressTester(time_budget_ms=0, chunk_rows=8).run(nav, cap_rate, occupancy)
+    assert np.array_equal(whole.cvar, chunked.cvar)
+
+
+def test_batch_degrades_to_min_paths_when_over_budget():
+    nav, cap_rate, occupancy = batch(200)
+    tester = MonteCarloStressTester(time_budget_ms=1e-6, chunk_rows=32, min_paths=200)
+    result = tester.run(nav, cap_rate, occupancy)
+    # The first chunk shows the batch cannot finish in time; the rest runs with min_paths
+    assert (result.paths[:32] == 2000).all()
+    assert (result.paths[32:] == 200).all()
+    assert (result.var >= result.cvar).all()
+
+    # Recorded path counts replay exactly, whatever the budget
+    replayed = MonteCarloStressTester(time_budget_ms=1000).run(nav, cap_rate, occupancy, paths=result.paths)
+    assert np.array_equal(replayed.cvar, result.cvar)
+
+
+def test_batch_within_budget_keeps_every_path():
+    nav, cap_rate, occupancy = batch(50)
+    result = MonteCarloStressTester(time_budget_ms=10_000).run(nav, cap_rate, occupancy)
+    assert (result.paths == 2000).all()
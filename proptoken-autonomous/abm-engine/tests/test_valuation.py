@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_assets
+from engines.records import RecordBatch
+from engines.valuation import ValuationAdjustments
+
+TABLE = {
+    'condition': {'Good': 1.0, 'poor': 0.8, 'Excellent': 1.1},
+    'age': {'max_years': [5, 30], 'factors': [1.05, 1.0, 0.9]},
+    'type': {'office': 1.0, 'land': 0.85},
+}
+
+
+def write_table(tmp_path, table):
+    path = tmp_path / 'adjustments.json'
+    path.write_text(json.dumps(table))
+    return str(path)
+
+
+def batch(*specs, satellite=None):
+    satellite = satellite or [None] * len(specs)
+    oracle = [{'existence': {'satellite': {'condition': s}}} if s else {} for s in satellite]
+    return RecordBatch.from_dicts([{'specifications': spec} for spec in specs], [{} for _ in specs],
+                                  [{} for _ in specs], oracle)
+
+
+def test_table_is_applied(tmp_path):
+    adjustments = ValuationAdjustments(write_table(tmp_path, TABLE))
+    factors = adjustments.factors(batch(
+        {'condition': ' GOOD ', 'age': 5, 'type': 'Office'},
+        {'condition': 'poor', 'age': 6, 'type': 'land'},
+        {'condition': 'excellent', 'age': 31, 'type': 'castle'},
+        {},
+    ))
+    assert factors['condition'].tolist() == [1.0, 0.8, 1.1, 1.0]
+    assert factors['age'].tolist() == [1.05, 1.0, 0.9, 1.0]      # bands include their upper edge
+    assert factors['type'].tolist() == [1.0, 0.85, 1.0, 1.0]     # unknown and missing are neutral
+    np.testing.assert_allclose(factors['multiplier'], [1.05, 0.8 * 0.85, 1.1 * 0.9, 1.0])
+
+    other = ValuationAdjustments(write_table(tmp_path, {**TABLE, 'type': {'land': 0.5}}))
+    assert other.version != adjustments.version
+
+
+def test_satellite_condition_overrides_the_declared_one(tmp_path):
+    adjustments = ValuationAdjustments(write_table(tmp_path, TABLE))
+    factors = adjustments.factors(batch({'condition': 'excellent'}, {'condition': 'excellent'},
+                                        satellite=['poor', None]))
+    assert factors['condition'].tolist() == [0.8, 1.1]
+
+
+@pytest.mark.parametrize('table, message', [
+    ({'condition': {'poor': 0}}, 'must be positive'),
+    ({'age': {'max_years': [5, 30], 'factors': [1.0, 1.0]}}, 'one more entry'),
+    ({'age': {'max_years': [30, 5], 'factors': [1.0, 1.0, 1.0]}}, 'must increase'),
+])
+def test_invalid_tables_are_rejected(tmp_path, table, message):
+    with pytest.raises(ValueError, match=message):
+        ValuationAdjustments(write_table(tmp_path, table))
+
+
+def test_nav_scales_with_the_multiplier():
+    import tasks
+
+    requests = make_assets(1) * 2
+    sources = [{field: json.loads(json.dumps(r[field])) for field in r} for r in requests]
+    sources[0]['asset_data']['specifications'].update(age=10)
+    sources[1]['asset_data']['specifications'].update(age=10)
+    sources[0]['oracle_data']['existence']['satellite']['condition'] = 'good'
+    sources[1]['oracle_data']['existence']['satellite']['condition'] = 'poor'
+    records = RecordBatch.from_dicts(*([s[f] for s in sources] for f in ('asset_data', 'location', 'financials',
+                                                                         'oracle_data')))
+    nav = tasks.market_engine().run_stages(records).outputs['nav']
+    assert nav['condition'].tolist() == [1.0, 0.8]
+    np.testing.assert_allclose(nav['min'][1] / nav['min'][0], 0.8)
+    np.testing.assert_allclose(nav['max'][1] / nav['max'][0], 0.8)
+
+
+@pytest.mark.parametrize('estimated, fires', [(1000, False), (800, False), (799, True), (None, False)])
+def test_satellite_size_mismatch_fires_above_the_ratio(estimated, fires):
+    import tasks
+
+    request = make_assets(1)[0]
+    request['asset_data']['specifications']['size'] = 1000.0
+    satellite = request['oracle_data']['existence']['satellite']
+    if estimated is None:
+        del satellite['estimated_size']
+    else:
+        satellite['estimated_size'] = float(estimated)
+    results, _, _ = tasks.detect_fraud_batch([request['asset_data']], [request['financials']],
+                                             [request['oracle_data']])
+    flagged = [a for a in results[0]['anomalies'] if a['type'] == 'satellite_size_mismatch']
+    assert bool(flagged) == fires    # 1000 / 800 is exactly 1.25, which is not above it
+    if fires:
+        assert flagged[0]['detail'] == 'Claimed size is 1.25x the satellite estimate'
@@ -0,0 +1,57 @@
+"""
+Train the fraud anomaly model offline from a submissions export.
+
+    python train_anomaly_model.py --input submissions.parquet --output models/isolation_forest
+
+The fitted IsolationForest is compiled into flat arrays (see
+engines/anomaly_model.py) and written as .npy files that the engine memory-maps
+at startup. Point ABM_ANOMALY_MODEL_PATH at the output directory. Training
+needs scikit-learn (pip install -r requirements-train.txt); serving does not.
+"""
+import argparse
+import time
+import numpy as np
+
+from engines.anomaly_model import IsolationForestScorer, compile_isolation_forest, feature_matrix
+from engines.records import RecordBatch
+from submissions import analysis_inputs, read_submissions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the ABM fraud anomaly model')
+    parser.add_argument('--input', required=True, help='CSV/Parquet export with a submissions `data` column')
+    parser.add_argument('--output', default='models/isolation_forest', help='model directory to write')
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--max-samples', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from sklearn.ensemble import IsolationForest
+
+    blocks = []
+    for chunk in read_submissions(args.input):
+        batch = RecordBatch.from_dicts(*(list(column) for column in zip(*map(analysis_inputs, chunk))))
+        blocks.append(feature_matrix(batch))
+    X = np.vstack(blocks) if blocks else np.empty((0, 0))
+    if len(X) < 2:
+        raise SystemExit(f'Need at least 2 submissions to train, found {len(X)}')
+
+    started = time.perf_counter()
+    model = IsolationForest(
+        n_estimators=args.trees,
+        max_samples=min(args.max_samples, len(X)),
+        random_state=args.seed
+    ).fit(X)
+    arrays, meta = compile_isolation_forest(model)
+    meta.update({'trained_on': len(X), 'seed': args.seed, 'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())})
+
+    scorer = IsolationForestScorer(arrays, meta)
+    drift = np.abs(scorer.score(X) + model.score_samples(X)).max()
+    if drift > 1e-9:
+        raise SystemExit(f'Compiled forest disagrees with sklearn (max abs diff {drift:g})')
+    scorer.save(args.output)
+    print(f'Trained on {len(X)} submissions in {time.perf_counter() - started:.2f}s -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
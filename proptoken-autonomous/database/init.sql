@@ -115,3 +115,17 @@ CREATE TABLE IF NOT EXISTS workflow_state (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
+
+-- ABM engine results, versioned: one row per submission, analysis kind ('market',
+-- 'fraud'), input hash (sha256 of the engine inputs) and data/config version
+CREATE TABLE IF NOT EXISTS analysis_results (
+  submission_id VARCHAR(100) NOT NULL,
+  kind VARCHAR(32) NOT NULL,
+  input_hash CHAR(64) NOT NULL,
+  version VARCHAR(64) NOT NULL,
+  result JSONB NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (submission_id, kind, input_hash, version)
+);
+
+CREATE INDEX IF NOT EXISTS analysis_results_submission ON analysis_results (submission_id, kind, created_at DESC);